@@ -0,0 +1,6 @@
+'''
+project1 / project2 / project3가 같이 쓰는 module들
+
+각 project의 실행 script(main.py, render.py, bench_*.py)가 repo 최상위를 sys.path에 넣고
+`from common.shader_cache import ShaderCache`처럼 import한다.
+'''
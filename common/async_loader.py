@@ -0,0 +1,83 @@
+'''
+background asset loader
+
+drop_callback에서 파일을 바로 파싱하면 파싱이 끝날 때까지 render loop가 멈춘다.
+그래서
+    1. 파싱(CPU 작업)은 worker thread에서 하고
+    2. 끝난 결과는 queue에 넣어두고
+    3. main loop가 매 frame마다 poll()로 queue를 비우면서 GL upload(VAO/VBO 생성)를 한다.
+GL 함수는 context가 있는 main thread에서만 호출해야 하기 때문에 upload는 worker에서 하지 않는다.
+'''
+import os
+import queue
+import threading
+import time
+
+
+class AsyncLoader:
+    def __init__(self):
+        self.__results = queue.Queue()
+        self.__lock = threading.Lock()
+        # 진행 중인 작업: job id -> [파일 이름, 시작 시각, 진행률(0~1 또는 None)]
+        self.__jobs = {}
+        self.__next_job_id = 0
+
+    @property
+    def is_loading(self):
+        with self.__lock:
+            return len(self.__jobs) > 0
+
+    def submit(self, filepath, load_func):
+        '''
+        load_func(filepath, progress)를 worker thread에서 실행한다.
+        progress(done, total)를 호출하면 진행률이 갱신된다.
+        '''
+        with self.__lock:
+            job_id = self.__next_job_id
+            self.__next_job_id += 1
+            self.__jobs[job_id] = [os.path.basename(filepath), time.perf_counter(), None]
+
+        def progress(done, total):
+            with self.__lock:
+                if job_id in self.__jobs and total > 0:
+                    self.__jobs[job_id][2] = done / total
+
+        def run():
+            try:
+                result, error = load_func(filepath, progress), None
+            except Exception as e:
+                result, error = None, e
+            self.__results.put((job_id, filepath, result, error))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def poll(self):
+        '''
+        끝난 작업들을 [(filepath, result, error), ...]로 돌려준다. 기다리지 않는다.
+        '''
+        finished = []
+        while True:
+            try:
+                job_id, filepath, result, error = self.__results.get_nowait()
+            except queue.Empty:
+                break
+            with self.__lock:
+                self.__jobs.pop(job_id, None)
+            finished.append((filepath, result, error))
+        return finished
+
+    def progress_text(self):
+        '''
+        ex) 'loading zubat.obj 42% (1.3s)'
+        '''
+        with self.__lock:
+            jobs = list(self.__jobs.values())
+
+        texts = []
+        now = time.perf_counter()
+        for name, start, ratio in jobs:
+            if ratio is None:
+                texts.append('loading %s (%.1fs)' % (name, now - start))
+            else:
+                texts.append('loading %s %d%% (%.1fs)' % (name, int(ratio * 100), now - start))
+        return ', '.join(texts)
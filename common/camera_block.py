@@ -0,0 +1,61 @@
+'''
+per-frame camera uniform buffer object
+
+P, V, VP와 카메라 위치를 frame마다 한 번 UBO(std140)에 올려두고 모든 shader program이 같이 쓴다.
+object마다는 M만 보내고 vertex shader가 VP * M을 계산하므로, Python에서 object마다 하던 VP * M 곱셈과
+MVP 업로드가 없어진다.
+
+shader에는 CAMERA_BLOCK_SRC를 넣고, program을 만든 뒤 CameraBlock.attach(program)으로 binding point를 연결한다.
+'''
+from OpenGL.GL import *
+import glm
+
+CAMERA_BLOCK_NAME = 'Camera'
+CAMERA_BLOCK_BINDING = 0
+
+# std140: mat4는 16바이트 열 4개, vec3는 vec4 크기로 정렬 -> 64 * 3 + 16 = 208바이트
+CAMERA_BLOCK_SRC = '''
+layout (std140) uniform Camera {
+    mat4 P;
+    mat4 V;
+    mat4 VP;
+    vec3 view_pos;
+};
+'''
+CAMERA_BLOCK_SIZE = 64 * 3 + 16
+
+
+class CameraBlock:
+    def __init__(self, binding=CAMERA_BLOCK_BINDING):
+        self.__binding = binding
+        self.__ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.__ubo)
+        glBufferData(GL_UNIFORM_BUFFER, CAMERA_BLOCK_SIZE, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.__binding, self.__ubo)
+
+    @property
+    def binding(self):
+        return self.__binding
+
+    def attach(self, shader_program):
+        '''
+        shader_program(ShaderProgram)의 Camera block을 이 UBO의 binding point에 연결 (block이 없으면 무시)
+        '''
+        index = glGetUniformBlockIndex(shader_program.id, CAMERA_BLOCK_NAME)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(shader_program.id, index, self.__binding)
+
+    def update(self, P, V, view_pos):
+        '''
+        frame마다 한 번: P, V (glm.mat4), view_pos (glm.vec3)
+        '''
+        VP = P * V
+        # glm 행렬의 bytes는 열 우선이라 std140 mat4 배치와 같다
+        data = P.to_bytes() + V.to_bytes() + VP.to_bytes() + glm.vec4(view_pos, 1).to_bytes()
+        glBindBuffer(GL_UNIFORM_BUFFER, self.__ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, CAMERA_BLOCK_SIZE, data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def delete(self):
+        glDeleteBuffers(1, [self.__ubo])
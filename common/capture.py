@@ -0,0 +1,282 @@
+'''
+asynchronous frame capture
+
+매 frame glReadPixels로 바로 읽으면 GPU가 그 frame을 다 그릴 때까지 CPU가 기다린다.
+여기서는 PBO N개의 ring과 fence를 쓴다.
+    1. frame k: ring의 k % N번째 PBO로 glReadPixels (PBO가 bind되어 있으면 바로 return) + glFenceSync
+    2. 그 뒤의 frame들: fence가 signal된 PBO부터 순서대로 map해서, 복사 없이 mapped memory 위의 numpy view를
+       background writer thread에 넘긴다. (PNG 압축 / 파일 쓰기 / pipe는 그 thread에서)
+    3. frame k + N: 같은 PBO를 다시 쓰기 전에 writer가 끝났는지 확인하고 unmap
+즉 frame k의 readback은 frame k+1 ... k+N-1을 그리는 동안 끝나고, writer는 그동안 이전 frame을 저장한다.
+writer가 느리면 (N frame 넘게 밀리면) capture()가 기다리므로 memory는 PBO N개를 넘지 않는다.
+
+출력: PNG / PPM 이미지 sequence, 또는 raw RGB video stream (stdout이나 ffmpeg 같은 command의 stdin)
+'''
+from OpenGL.GL import *
+import os
+import sys
+import ctypes
+import queue
+import struct
+import subprocess
+import threading
+import time
+import zlib
+import numpy as np
+
+# 출력 이미지는 RGB 8bit
+PIXEL_CHANNELS = 3
+# PBO ring 크기 기본값
+DEFAULT_BUFFER_CNT = 3
+# fence를 한 번에 기다리는 시간 (ns). 넘기면 signal될 때까지 다시 기다린다
+FENCE_TIMEOUT = 1000 * 1000 * 1000
+
+
+def encode_png(image):
+    '''
+    (height, width, 3) uint8 -> PNG bytes (외부 library 없이 zlib만 사용, filter 없음)
+    '''
+    height, width = image.shape[:2]
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    # 행마다 filter type 0
+    rows = np.zeros((height, 1 + width * PIXEL_CHANNELS), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, -1)
+    return b'\x89PNG\r\n\x1a\n' + \
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + \
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 1)) + \
+        chunk(b'IEND', b'')
+
+
+class ImageSequenceWriter:
+    '''
+    pattern: 'out/frame_%05d.png' 처럼 frame 번호가 들어갈 경로. 확장자가 .ppm이면 압축 없는 PPM
+    '''
+    def __init__(self, pattern):
+        self.pattern = pattern
+        directory = os.path.dirname(pattern % 0)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, index, image):
+        filepath = self.pattern % index
+        with open(filepath, 'wb') as f:
+            if filepath.lower().endswith('.ppm'):
+                f.write(b'P6\n%d %d\n255\n' % (image.shape[1], image.shape[0]))
+                f.write(image.tobytes())
+            else:
+                f.write(encode_png(image))
+
+    def close(self):
+        pass
+
+
+class RawVideoWriter:
+    '''
+    raw rgb24 frame을 이어서 쓴다.
+    command가 '-'이면 stdout, 아니면 shell command의 stdin (ex. 'ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - out.mp4')
+    '''
+    def __init__(self, command, width, height, fps):
+        self.__process = None
+        if command == '-':
+            self.__stream = sys.stdout.buffer
+        else:
+            command = command.format(width=width, height=height, fps=fps)
+            self.__process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE)
+            self.__stream = self.__process.stdin
+
+    def write(self, index, image):
+        self.__stream.write(image.tobytes())
+
+    def close(self):
+        self.__stream.flush()
+        if self.__process is not None:
+            self.__stream.close()
+            self.__process.wait()
+
+
+class NullWriter:
+    '''
+    아무것도 저장하지 않음 (readback 비용만 잴 때)
+    '''
+    def write(self, index, image):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_writer(output, width, height, fps):
+    '''
+    output: '%'가 들어간 이미지 경로 pattern, '-' (stdout), 또는 '|command' (raw video pipe)
+    '''
+    if output == '-':
+        return RawVideoWriter('-', width, height, fps)
+    if output.startswith('|'):
+        return RawVideoWriter(output[1:], width, height, fps)
+    if '%' not in output:
+        output = os.path.join(output, 'frame_%05d.png')
+    return ImageSequenceWriter(output)
+
+
+class FrameCapture:
+    '''
+    width x height framebuffer를 PBO ring으로 비동기 readback해서 writer(write(index, image), close())에 넘긴다.
+    read_buffer: 읽을 color buffer (offscreen FBO면 GL_COLOR_ATTACHMENT0, window면 GL_BACK)
+    writer가 받는 image는 mapped PBO 위의 (height, width, 3) view(위아래 뒤집힌 stride)이므로 write가 끝난 뒤에는 쓰면 안 된다.
+    '''
+    def __init__(self, width, height, writer, buffer_cnt=DEFAULT_BUFFER_CNT, read_buffer=GL_COLOR_ATTACHMENT0):
+        self.width = width
+        self.height = height
+        self.nbytes = width * height * PIXEL_CHANNELS
+        self.read_buffer = read_buffer
+        self.__writer = writer
+
+        self.__buffers = list(np.atleast_1d(glGenBuffers(buffer_cnt)))
+        for buffer in self.__buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.nbytes, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        # slot마다: readback fence, frame index, map 여부, writer가 다 썼는지
+        self.__fences = [None] * buffer_cnt
+        self.__indices = [0] * buffer_cnt
+        self.__is_mapped = [False] * buffer_cnt
+        self.__written = [threading.Event() for _ in range(buffer_cnt)]
+        # readback을 걸어두고 아직 map하지 않은 slot (오래된 순서)
+        self.__in_flight = []
+        self.__next = 0
+
+        self.__queue = queue.Queue()
+        self.__error = None
+        self.__thread = threading.Thread(target=self.__write_loop, daemon=True)
+        self.__thread.start()
+
+        # 통계 (초): main thread에서 capture()에 쓴 시간 / 그중 fence나 writer를 기다린 시간 / writer thread 시간
+        self.frame_cnt = 0
+        self.capture_time = 0.
+        self.stall_time = 0.
+        self.write_time = 0.
+
+    @property
+    def buffer_cnt(self):
+        return len(self.__buffers)
+
+    def capture(self, index=None):
+        '''
+        지금 bind된 framebuffer의 readback을 건다. index: writer에 넘길 frame 번호 (기본: capture 순서)
+        '''
+        start = time.perf_counter()
+        if self.__error is not None:
+            raise self.__error
+
+        slot = self.__next
+        self.__next = (self.__next + 1) % len(self.__buffers)
+        self.__release(slot)
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.__buffers[slot])
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadBuffer(self.read_buffer)
+        # PBO가 bind되어 있으면 마지막 인자는 buffer 안의 offset이고 GPU 작업을 기다리지 않고 return 된다
+        glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.__fences[slot] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.__indices[slot] = self.frame_cnt if index is None else index
+        self.__in_flight.append(slot)
+        self.frame_cnt += 1
+
+        # 이미 끝난 readback은 바로 writer에 넘긴다
+        while self.__in_flight and self.__map(self.__in_flight[0], False):
+            pass
+
+        self.capture_time += time.perf_counter() - start
+
+    def __map(self, slot, wait):
+        '''
+        slot의 readback이 끝났으면 (wait이면 끝날 때까지 기다려서) map하고 writer에 넘긴다.
+        return: map 했는지 (wait이면 항상 True)
+        '''
+        timeout = FENCE_TIMEOUT if wait else 0
+        start = time.perf_counter()
+        while True:
+            result = glClientWaitSync(self.__fences[slot], GL_SYNC_FLUSH_COMMANDS_BIT, timeout)
+            if result in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            if result == GL_WAIT_FAILED:
+                raise RuntimeError('glClientWaitSync failed')
+            if not wait:
+                return False
+            # GL_TIMEOUT_EXPIRED: 느린 driver(llvmpipe 등)에서는 FENCE_TIMEOUT을 넘길 수 있다.
+            # 여기서 포기하면 readback 중인 slot을 다시 쓰게 되므로 끝날 때까지 계속 기다린다
+        if wait:
+            self.stall_time += time.perf_counter() - start
+        glDeleteSync(self.__fences[slot])
+        self.__fences[slot] = None
+        self.__in_flight.remove(slot)
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.__buffers[slot])
+        address = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.nbytes, GL_MAP_READ_BIT)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.__is_mapped[slot] = True
+
+        # 복사 없이 mapped memory를 그대로 보는 배열. OpenGL은 아래 행부터 저장하므로 행 순서만 뒤집은 view
+        mapped = np.ctypeslib.as_array((ctypes.c_ubyte * self.nbytes).from_address(address))
+        image = mapped.reshape(self.height, self.width, PIXEL_CHANNELS)[::-1]
+        self.__written[slot].clear()
+        self.__queue.put((slot, self.__indices[slot], image))
+        return True
+
+    def __release(self, slot):
+        '''
+        slot을 다시 쓰기 전에: 아직 map 안 했으면 map해서 넘기고, writer가 끝나면 unmap
+        '''
+        if slot in self.__in_flight:
+            while self.__in_flight[0] != slot:
+                self.__map(self.__in_flight[0], True)
+            self.__map(slot, True)
+        if self.__is_mapped[slot]:
+            start = time.perf_counter()
+            self.__written[slot].wait()
+            self.stall_time += time.perf_counter() - start
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, self.__buffers[slot])
+            glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+            self.__is_mapped[slot] = False
+
+    def __write_loop(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            slot, index, image = item
+            start = time.perf_counter()
+            try:
+                if self.__error is None:
+                    self.__writer.write(index, image)
+            except Exception as error:
+                self.__error = error
+            self.write_time += time.perf_counter() - start
+            self.__written[slot].set()
+
+    def close(self):
+        '''
+        남은 readback을 모두 저장하고 PBO와 writer thread를 정리한다.
+        '''
+        for slot in range(len(self.__buffers)):
+            self.__release((self.__next + slot) % len(self.__buffers))
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__writer.close()
+
+        glDeleteBuffers(len(self.__buffers), self.__buffers)
+        self.__buffers = []
+        if self.__error is not None:
+            raise self.__error
+
+    def report(self):
+        frame_cnt = max(self.frame_cnt, 1)
+        return 'captured %d frames: %.2f ms/frame on the render thread (%.2f ms waiting), %.2f ms/frame in the writer thread' % (
+            self.frame_cnt, 1000 * self.capture_time / frame_cnt, 1000 * self.stall_time / frame_cnt,
+            1000 * self.write_time / frame_cnt)
@@ -0,0 +1,120 @@
+'''
+view-frustum culling
+
+frame마다 P * V에서 frustum의 평면 6개를 뽑아두고 (Gribb / Hartmann), object들의 bounding volume을
+numpy로 한 번에 검사해서 화면에 안 보이는 object의 draw call을 건너뛴다.
+    - sphere: 중심이 어떤 평면의 바깥쪽으로 반지름보다 멀리 있으면 보이지 않음
+    - AABB: 평면 normal 방향으로 가장 안쪽 꼭짓점(p-vertex)이 평면 바깥이면 보이지 않음
+두 검사 모두 보수적이라 (보이는 object를 버리지는 않음) 둘 다 통과한 object만 그린다.
+
+FrustumCuller는 검사한 object 수를 세어둔다: drawn_cnt / culled_cnt (update() 이후 이번 frame), total_*
+'''
+import numpy as np
+
+
+def frustum_planes(PV):
+    '''
+    PV(glm.mat4)의 clip space에서 -w <= x, y, z <= w 인 영역을 world 좌표계의 평면 6개로.
+    return: (6, 4) 배열, 평면 (a, b, c, d)는 a x + b y + c z + d >= 0 이 안쪽이고 (a, b, c)는 단위 벡터
+    '''
+    m = np.array(PV, dtype=np.float64)
+    planes = np.array([
+        m[3] + m[0], m[3] - m[0],   # left, right
+        m[3] + m[1], m[3] - m[1],   # bottom, top
+        m[3] + m[2], m[3] - m[2],   # near, far
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def transform_bounds(Ms, centers, radii, lows, highs):
+    '''
+    object 좌표계의 bounding sphere / AABB를 world 좌표계로 (object마다 하나씩, 모두 배열로)
+    Ms: (N, 4, 4) model matrix (행 우선), centers: (N, 3), radii: (N,), lows / highs: (N, 3)
+    return: world의 centers, radii, lows, highs
+        sphere의 반지름은 가장 큰 축의 scale만큼, AABB는 회전된 box를 다시 감싸는 AABB
+    '''
+    Ms = np.asarray(Ms, dtype=np.float64).reshape(-1, 4, 4)
+    A = Ms[:, :3, :3]
+    t = Ms[:, :3, 3]
+
+    world_centers = np.einsum('nij,nj->ni', A, centers) + t
+    world_radii = np.asarray(radii) * np.linalg.norm(A, axis=1).max(axis=1)
+
+    box_centers = np.einsum('nij,nj->ni', A, (lows + highs) / 2) + t
+    box_extents = np.einsum('nij,nj->ni', np.abs(A), (highs - lows) / 2)
+    return world_centers, world_radii, box_centers - box_extents, box_centers + box_extents
+
+
+def spheres_in_frustum(planes, centers, radii):
+    '''
+    centers: (..., 3), radii: (...) -> (...) bool
+    '''
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -np.asarray(radii)[..., None], axis=-1)
+
+
+def aabbs_in_frustum(planes, lows, highs):
+    '''
+    lows / highs: (..., 3) -> (...) bool
+    '''
+    normals = planes[:, :3]
+    # 평면마다 normal 방향으로 가장 멀리 있는 꼭짓점
+    p_vertices = np.where(normals > 0, highs[..., None, :], lows[..., None, :])
+    distances = np.sum(p_vertices * normals, axis=-1) + planes[:, 3]
+    return np.all(distances >= 0, axis=-1)
+
+
+class FrustumCuller:
+    def __init__(self):
+        self.__planes = None
+        self.is_enabled = True
+
+        # 이번 frame (update 이후)
+        self.drawn_cnt = 0
+        self.culled_cnt = 0
+        # 처음부터
+        self.frame_cnt = 0
+        self.total_drawn_cnt = 0
+        self.total_culled_cnt = 0
+
+    @property
+    def planes(self):
+        return self.__planes
+
+    def update(self, P, V):
+        '''
+        frame마다 한 번: P, V (glm.mat4)
+        '''
+        self.__planes = frustum_planes(P * V)
+        self.drawn_cnt = 0
+        self.culled_cnt = 0
+        self.frame_cnt += 1
+
+    def visible(self, centers, radii, lows=None, highs=None):
+        '''
+        world 좌표계의 bounding volume들 -> 보이는지 bool 배열
+        centers: (N, 3) 또는 (N, K, 3), radii: centers[..., 0]과 같은 모양.
+        (N, K, ...)이면 object n의 volume K개 중 하나라도 보이면 보이는 것으로 본다. (ex. skeleton의 bone들)
+        lows / highs: centers와 같은 모양의 AABB (없으면 sphere만 검사)
+        '''
+        centers = np.asarray(centers, dtype=np.float64)
+        if not self.is_enabled or self.__planes is None:
+            is_visible = np.ones(centers.shape[0], dtype=bool)
+        else:
+            is_visible = spheres_in_frustum(self.__planes, centers, radii)
+            if lows is not None:
+                is_visible &= aabbs_in_frustum(self.__planes, np.asarray(lows), np.asarray(highs))
+            if is_visible.ndim > 1:
+                is_visible = is_visible.reshape(len(is_visible), -1).any(axis=1)
+
+        drawn_cnt = int(np.count_nonzero(is_visible))
+        self.drawn_cnt += drawn_cnt
+        self.culled_cnt += len(is_visible) - drawn_cnt
+        self.total_drawn_cnt += drawn_cnt
+        self.total_culled_cnt += len(is_visible) - drawn_cnt
+        return is_visible
+
+    def report(self):
+        frame_cnt = max(self.frame_cnt, 1)
+        return 'frustum culling: %.1f drawn, %.1f culled per frame' % (
+            self.total_drawn_cnt / frame_cnt, self.total_culled_cnt / frame_cnt)
@@ -0,0 +1,219 @@
+'''
+point light manager
+
+조명을 fragment shader에 hardcode하는 대신 data로 관리한다.
+    - scene의 모든 point light는 UBO(std140 "Lights" block, 최대 MAX_LIGHTS개)에 들어있다.
+      light가 바뀔 때만 다시 upload한다.
+    - object(draw call)마다 CPU에서 culling: object의 bounding sphere와 light의 영향 반경(attenuation radius)이
+      겹치는 light만 골라서 그 index 목록을 uniform(object_lights, object_light_cnt)으로 보낸다.
+      fragment shader는 그 light들만 계산하므로 shading 비용이 scene 전체 light 수가 아니라
+      그 object에 닿는 light 수에 비례한다.
+
+shader에는 LIGHT_BLOCK_SRC를 넣고, program을 만든 뒤 LightManager.attach(program)으로 binding point를 연결한다.
+'''
+from OpenGL.GL import *
+import glm
+import numpy as np
+
+LIGHT_BLOCK_NAME = 'Lights'
+LIGHT_BLOCK_BINDING = 1
+MAX_LIGHTS = 16
+
+# 밝기(attenuation * 가장 밝은 채널)가 이 값 아래로 떨어지는 거리를 light의 영향 반경으로 본다 (8bit 한 단계)
+LIGHT_CUTOFF = 1 / 256
+
+# std140: struct 안의 vec4 3개 -> light 하나에 48바이트
+LIGHT_BLOCK_SRC = '''
+#define MAX_LIGHTS %d
+
+struct PointLight {
+    vec4 position;      // xyz, w: 영향 반경
+    vec4 color;         // rgb
+    vec4 attenuation;   // constant, linear, quadratic
+};
+
+layout (std140) uniform Lights {
+    PointLight lights[MAX_LIGHTS];
+};
+
+// 이 object에 닿는 light들의 index (LightManager.bind_object)
+uniform int object_light_cnt;
+uniform int object_lights[MAX_LIGHTS];
+''' % MAX_LIGHTS
+LIGHT_SIZE = 48
+
+
+class PointLight:
+    '''
+    attenuation = 1 / (constant + linear * d + quadratic * d^2)
+    '''
+    def __init__(self, position, color, constant=1.0, linear=0.0, quadratic=0.0):
+        self.position = glm.vec3(*(float(value) for value in position))
+        self.color = glm.vec3(*(float(value) for value in color))
+        self.constant = constant
+        self.linear = linear
+        self.quadratic = quadratic
+
+    def radius(self):
+        '''
+        color * 1 / (constant + linear * d + quadratic * d^2) < LIGHT_CUTOFF 가 되는 거리 d (감쇠가 없으면 inf)
+        '''
+        brightness = max(self.color.x, self.color.y, self.color.z)
+        target = brightness / LIGHT_CUTOFF - self.constant
+        if target <= 0:
+            return 0.
+        if self.quadratic > 0:
+            return (-self.linear + np.sqrt(self.linear * self.linear + 4 * self.quadratic * target)) / (2 * self.quadratic)
+        if self.linear > 0:
+            return target / self.linear
+        return np.inf
+
+
+def transform_sphere(M, center, radius):
+    '''
+    object 좌표계의 bounding sphere를 M(glm.mat4)으로 옮긴 world 좌표계의 sphere (scale은 가장 큰 축 기준)
+    '''
+    M = np.array(M, dtype=np.float64)
+    world_center = M[:3, :3] @ center + M[:3, 3]
+    scale = np.linalg.norm(M[:3, :3], axis=0).max()
+    return world_center, radius * scale
+
+
+def points_bounding_sphere(points, margin=0.):
+    '''
+    points: (..., 3) -> 그 점들을 다 포함하는 sphere (AABB의 중심, 반 대각선 + margin)
+    '''
+    points = points.reshape(-1, 3)
+    low, high = points.min(axis=0), points.max(axis=0)
+    return (low + high) / 2, float(np.linalg.norm(high - low)) / 2 + margin
+
+
+class LightManager:
+    def __init__(self, lights=(), binding=LIGHT_BLOCK_BINDING):
+        if len(lights) > MAX_LIGHTS:
+            raise ValueError('at most %d lights are supported' % MAX_LIGHTS)
+        self.__binding = binding
+        self.__lights = list(lights)
+        self.__is_dirty = True
+
+        # culling용: (L, 3) 위치, (L,) 반경
+        self.__positions = np.zeros((0, 3))
+        self.__radii = np.zeros(0)
+
+        self.__ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.__ubo)
+        glBufferData(GL_UNIFORM_BUFFER, MAX_LIGHTS * LIGHT_SIZE, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.__binding, self.__ubo)
+
+        # 통계: bind_object 호출 수, 그때 골라진 light 수의 합
+        self.object_cnt = 0
+        self.object_light_sum = 0
+
+    @property
+    def lights(self):
+        return list(self.__lights)
+
+    @property
+    def light_cnt(self):
+        return len(self.__lights)
+
+    def add(self, light):
+        if len(self.__lights) >= MAX_LIGHTS:
+            raise ValueError('at most %d lights are supported' % MAX_LIGHTS)
+        self.__lights.append(light)
+        self.__is_dirty = True
+        return len(self.__lights) - 1
+
+    def remove(self, light):
+        self.__lights.remove(light)
+        self.__is_dirty = True
+
+    def set_lights(self, lights):
+        if len(lights) > MAX_LIGHTS:
+            raise ValueError('at most %d lights are supported' % MAX_LIGHTS)
+        self.__lights = list(lights)
+        self.__is_dirty = True
+
+    def mark_dirty(self):
+        '''
+        light의 위치 / 색 / 감쇠를 직접 바꾼 뒤에 호출
+        '''
+        self.__is_dirty = True
+
+    def attach(self, shader_program):
+        '''
+        shader_program(ShaderProgram)의 Lights block을 이 UBO의 binding point에 연결 (block이 없으면 무시)
+        '''
+        index = glGetUniformBlockIndex(shader_program.id, LIGHT_BLOCK_NAME)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(shader_program.id, index, self.__binding)
+
+    def update(self):
+        '''
+        frame마다: light가 바뀌었으면 UBO와 culling용 배열을 다시 만든다.
+        '''
+        if not self.__is_dirty:
+            return
+        self.__is_dirty = False
+
+        data = np.zeros((MAX_LIGHTS, LIGHT_SIZE // 4), dtype=np.float32)
+        radii = np.array([light.radius() for light in self.__lights], dtype=np.float64)
+        for i, light in enumerate(self.__lights):
+            # shader의 영향 반경은 참고용 (inf는 큰 값으로)
+            data[i, 0:4] = (*light.position, min(radii[i], np.finfo(np.float32).max))
+            data[i, 4:7] = light.color
+            data[i, 8:11] = (light.constant, light.linear, light.quadratic)
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self.__ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+        self.__positions = np.array([light.position for light in self.__lights], dtype=np.float64).reshape(-1, 3)
+        self.__radii = radii
+
+    def cull(self, centers, radii):
+        '''
+        centers: (N, 3), radii: (N,) bounding sphere들 -> 그중 하나라도 닿는 light의 index 배열
+        (instanced draw처럼 한 draw call에 여러 object가 있으면 합집합)
+        '''
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        radii = np.asarray(radii, dtype=np.float64).reshape(-1)
+        distances = np.linalg.norm(centers[:, None, :] - self.__positions[None, :, :], axis=2)
+        is_affected = distances <= radii[:, None] + self.__radii[None, :]
+        return np.flatnonzero(is_affected.any(axis=0))
+
+    def bind_object(self, shader_program, centers, radii):
+        '''
+        사용 중인 shader_program에 이 object(들)에 닿는 light 목록을 보낸다.
+        return: 골라진 light 수
+        '''
+        indices = self.cull(centers, radii)
+        glUniform1i(shader_program.location('object_light_cnt'), len(indices))
+        if len(indices) > 0:
+            glUniform1iv(shader_program.location('object_lights'), len(indices), indices.astype(np.int32))
+        self.object_cnt += 1
+        self.object_light_sum += len(indices)
+        return len(indices)
+
+    def bind_all(self, shader_program):
+        '''
+        culling 없이 scene의 모든 light를 보낸다.
+        '''
+        indices = np.arange(len(self.__lights), dtype=np.int32)
+        glUniform1i(shader_program.location('object_light_cnt'), len(indices))
+        if len(indices) > 0:
+            glUniform1iv(shader_program.location('object_lights'), len(indices), indices)
+        self.object_cnt += 1
+        self.object_light_sum += len(indices)
+        return len(indices)
+
+    def report(self):
+        '''
+        bind_object 한 번에 평균 몇 개의 light가 골라졌는지
+        '''
+        average = self.object_light_sum / max(self.object_cnt, 1)
+        return 'lights: %d in scene, %.2f per object' % (len(self.__lights), average)
+
+    def delete(self):
+        glDeleteBuffers(1, [self.__ubo])
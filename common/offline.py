@@ -0,0 +1,136 @@
+'''
+headless offline rendering
+
+화면에 window를 띄우지 않고 frame을 그려서 파일이나 pipe로 내보낸다.
+    - context: 보이지 않는 glfw window, 또는 EGL(surfaceless, Mesa llvmpipe 등 CPU-only 환경)
+    - 그리는 대상: window의 default framebuffer 대신 offscreen FBO (color + depth renderbuffer)
+    - readback / 출력: capture.FrameCapture (PBO ring + fence + writer thread)
+
+EGL을 쓰려면 OpenGL을 import하기 전에 PYOPENGL_PLATFORM=egl이어야 한다. (render.py의 --egl)
+'''
+from OpenGL.GL import *
+from glfw.GLFW import *
+import os
+import ctypes
+from .capture import FrameCapture
+
+
+def create_context(width, height, title='offline'):
+    '''
+    OpenGL 3.3 core context를 만들고 current로 한다.
+    PYOPENGL_PLATFORM=egl이면 EGL, 아니면 보이지 않는 glfw window
+    return: 나중에 destroy_context에 넘길 값 (실패하면 None)
+    '''
+    if os.environ.get('PYOPENGL_PLATFORM') == 'egl':
+        return create_egl_context()
+
+    if not glfwInit():
+        return None
+    glfwWindowHint(GLFW_CONTEXT_VERSION_MAJOR, 3)
+    glfwWindowHint(GLFW_CONTEXT_VERSION_MINOR, 3)
+    glfwWindowHint(GLFW_OPENGL_PROFILE, GLFW_OPENGL_CORE_PROFILE)
+    glfwWindowHint(GLFW_OPENGL_FORWARD_COMPAT, GLFW_TRUE)
+    glfwWindowHint(GLFW_VISIBLE, GLFW_FALSE)
+    window = glfwCreateWindow(width, height, title, None, None)
+    if not window:
+        glfwTerminate()
+        return None
+    glfwMakeContextCurrent(window)
+    return ('glfw', window)
+
+
+def create_egl_context():
+    from OpenGL import EGL
+
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        return None
+
+    # offscreen FBO에 그리므로 surface는 만들지 않는다
+    config_attribs = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                      EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+    config = EGL.EGLConfig()
+    config_cnt = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(config_cnt)) \
+            or config_cnt.value == 0:
+        return None
+
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context_attribs = (EGL.EGLint * 7)(EGL.EGL_CONTEXT_MAJOR_VERSION, 3, EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+                                       EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+                                       EGL.EGL_NONE)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, context_attribs)
+    if not context or not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context):
+        return None
+    return ('egl', (display, context))
+
+
+def destroy_context(handle):
+    if handle is None:
+        return
+    kind, value = handle
+    if kind == 'glfw':
+        glfwDestroyWindow(value)
+        glfwTerminate()
+    else:
+        from OpenGL import EGL
+        display, context = value
+        EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(display, context)
+        EGL.eglTerminate(display)
+
+
+class OffscreenTarget:
+    '''
+    color(RGBA8) + depth renderbuffer를 붙인 framebuffer object
+    '''
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        self.__fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.__fbo)
+
+        self.__renderbuffers = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.__renderbuffers[0])
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.__renderbuffers[0])
+
+        glBindRenderbuffer(GL_RENDERBUFFER, self.__renderbuffers[1])
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH24_STENCIL8, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, self.__renderbuffers[1])
+
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError('offscreen framebuffer is incomplete')
+        self.bind()
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.__fbo)
+        glViewport(0, 0, self.width, self.height)
+
+    def delete(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glDeleteFramebuffers(1, [self.__fbo])
+        glDeleteRenderbuffers(2, self.__renderbuffers)
+
+
+def render_frames(frame_cnt, draw, writer, width, height, progress=None):
+    '''
+    offscreen FBO에 draw(i)로 frame i를 그리고, FrameCapture로 비동기로 읽어서 writer에 넘긴다.
+    draw는 시간 대신 frame 번호만 보고 그려야 한다. (결과가 렌더링 속도와 상관없이 항상 같도록)
+    return: 사용한 FrameCapture (통계는 report())
+    '''
+    target = OffscreenTarget(width, height)
+    capture = FrameCapture(width, height, writer, read_buffer=GL_COLOR_ATTACHMENT0)
+    try:
+        for i in range(frame_cnt):
+            target.bind()
+            draw(i)
+            capture.capture(i)
+            if progress is not None:
+                progress(i + 1, frame_cnt)
+    finally:
+        capture.close()
+        target.delete()
+    return capture
@@ -0,0 +1,221 @@
+'''
+shader program cache
+
+vertex / fragment shader source를 hash해서 program을 관리한다.
+    - 같은 source로 다시 요청하면 compile 없이 이미 만든 program을 돌려준다. (memory)
+    - driver가 program binary를 지원하면 (GL_NUM_PROGRAM_BINARY_FORMATS > 0, GL 4.1 / ARB_get_program_binary)
+      link된 binary를 cache 디렉토리에 저장해두고, 다음 실행에서는 compile / link 대신 glProgramBinary로 읽는다.
+    - uniform location은 program마다 한 번만 glGetUniformLocation으로 묻고 저장해둔다.
+
+binary는 driver가 바뀌면 쓸 수 없으므로 파일 이름(key)에 GL_VENDOR / GL_RENDERER / GL_VERSION도 넣는다.
+그래도 glProgramBinary가 실패하면 (driver 업데이트 등) source에서 다시 compile하고 binary를 덮어쓴다.
+
+파일 구조 (little endian): header(magic, version, binary format, binary 길이) + binary
+'''
+from OpenGL.GL import *
+import ctypes
+import hashlib
+import os
+import struct
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.shader_cache')
+CACHE_SUFFIX = '.glbin'
+CACHE_MAGIC = b'GLPROG\0\0'
+CACHE_VERSION = 1
+
+_HEADER = struct.Struct('<8sIIQ')
+
+
+def compile_shader(kind, source, name):
+    shader = glCreateShader(kind)       # create an empty shader object
+    glShaderSource(shader, source)      # provide shader source code
+    glCompileShader(shader)             # compile the shader object
+
+    # check for shader compile errors
+    success = glGetShaderiv(shader, GL_COMPILE_STATUS)
+    if (not success):
+        infoLog = glGetShaderInfoLog(shader)
+        print("ERROR::SHADER::" + name + "::COMPILATION_FAILED\n" + infoLog.decode())
+    return shader
+
+
+def link_program(vertex_shader_source, fragment_shader_source, retrievable=False):
+    '''
+    source에서 compile / link. retrievable이면 나중에 glGetProgramBinary로 binary를 꺼낼 수 있게 한다.
+    return: (program, link 성공 여부)
+    '''
+    vertex_shader = compile_shader(GL_VERTEX_SHADER, vertex_shader_source, 'VERTEX')
+    fragment_shader = compile_shader(GL_FRAGMENT_SHADER, fragment_shader_source, 'FRAGMENT')
+
+    # link shaders
+    shader_program = glCreateProgram()               # create an empty program object
+    glAttachShader(shader_program, vertex_shader)    # attach the shader objects to the program object
+    glAttachShader(shader_program, fragment_shader)
+    if retrievable:
+        glProgramParameteri(shader_program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    glLinkProgram(shader_program)                    # link the program object
+
+    # check for linking errors
+    success = glGetProgramiv(shader_program, GL_LINK_STATUS)
+    if (not success):
+        infoLog = glGetProgramInfoLog(shader_program)
+        print("ERROR::SHADER::PROGRAM::LINKING_FAILED\n" + infoLog.decode())
+
+    glDetachShader(shader_program, vertex_shader)
+    glDetachShader(shader_program, fragment_shader)
+    glDeleteShader(vertex_shader)
+    glDeleteShader(fragment_shader)
+
+    return shader_program, bool(success)
+
+
+def is_binary_supported():
+    try:
+        return bool(glProgramBinary) and glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+    except GLError:
+        return False
+
+
+class ShaderProgram:
+    '''
+    link된 program과 uniform location cache
+    '''
+    def __init__(self, program, key):
+        self.__program = program
+        self.__key = key
+        self.__locations = {}
+
+    @property
+    def id(self):
+        return self.__program
+
+    @property
+    def key(self):
+        return self.__key
+
+    def use(self):
+        glUseProgram(self.__program)
+
+    def location(self, name):
+        loc = self.__locations.get(name)
+        if loc is None:
+            loc = glGetUniformLocation(self.__program, name)
+            self.__locations[name] = loc
+        return loc
+
+    def delete(self):
+        glDeleteProgram(self.__program)
+        self.__locations = {}
+
+
+class ShaderCache:
+    '''
+    cache_dir: program binary를 저장할 디렉토리. None이면 disk cache 없이 memory에서만 재사용
+    '''
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.__cache_dir = cache_dir
+        self.__programs = {}
+        # GL context가 생긴 뒤에 처음 program을 만들 때 정한다
+        self.__driver = None
+        self.__is_binary_supported = False
+
+        # 통계: source에서 compile한 수 / binary에서 읽은 수 / memory에서 재사용한 수, program 준비에 쓴 시간(초)
+        self.compiled_cnt = 0
+        self.binary_cnt = 0
+        self.reused_cnt = 0
+        self.load_time = 0.
+
+    @property
+    def programs(self):
+        return list(self.__programs.values())
+
+    def program(self, vertex_shader_source, fragment_shader_source):
+        '''
+        두 source로 만든 ShaderProgram (이미 있으면 그대로)
+        '''
+        key = hashlib.sha1((vertex_shader_source + '\0' + fragment_shader_source).encode()).hexdigest()
+        shader_program = self.__programs.get(key)
+        if shader_program is not None:
+            self.reused_cnt += 1
+            return shader_program
+
+        start = time.perf_counter()
+        if self.__driver is None:
+            self.__driver = b'\0'.join(glGetString(name) or b'' for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+            self.__is_binary_supported = self.__cache_dir is not None and is_binary_supported()
+
+        program = None
+        path = None
+        if self.__is_binary_supported:
+            path = os.path.join(self.__cache_dir, hashlib.sha1(self.__driver + key.encode()).hexdigest() + CACHE_SUFFIX)
+            program = self.__load_binary(path)
+        if program is not None:
+            self.binary_cnt += 1
+        else:
+            program, success = link_program(vertex_shader_source, fragment_shader_source, self.__is_binary_supported)
+            self.compiled_cnt += 1
+            if success and path is not None:
+                self.__save_binary(program, path)
+
+        shader_program = ShaderProgram(program, key)
+        self.__programs[key] = shader_program
+        self.load_time += time.perf_counter() - start
+        return shader_program
+
+    def __load_binary(self, path):
+        '''
+        저장된 binary로 program을 만든다. 없거나 driver가 받아주지 않으면 None
+        '''
+        try:
+            with open(path, 'rb') as f:
+                magic, version, binary_format, length = _HEADER.unpack(f.read(_HEADER.size))
+                binary = f.read()
+        except (OSError, struct.error):
+            return None
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or len(binary) != length:
+            return None
+
+        program = glCreateProgram()
+        glProgramBinary(program, binary_format, binary, length)
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            glDeleteProgram(program)
+            return None
+        return program
+
+    def __save_binary(self, program, path):
+        '''
+        program의 binary를 저장한다. 쓸 수 없는 위치라면 조용히 넘어간다.
+        '''
+        length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+        if length <= 0:
+            return False
+        binary = (ctypes.c_ubyte * length)()
+        written = GLsizei()
+        binary_format = GLenum()
+        glGetProgramBinary(program, length, ctypes.byref(written), ctypes.byref(binary_format), binary)
+
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(self.__cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, binary_format.value, written.value))
+                f.write(bytes(binary)[:written.value])
+            # 쓰는 도중에 실패한 binary를 읽지 않도록 다 쓴 뒤에 교체
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def clear(self):
+        for shader_program in self.__programs.values():
+            shader_program.delete()
+        self.__programs = {}
+
+    def report(self):
+        return 'shaders: %d programs in %.1f ms (%d compiled, %d from binary cache, %d reused)' % (
+            len(self.__programs), 1000 * self.load_time, self.compiled_cnt, self.binary_cnt, self.reused_cnt)
@@ -1,8 +1,18 @@
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from OpenGL.GL import *
 from glfw.GLFW import *
 import glm
 import ctypes
 import numpy as np
+from common.shader_cache import ShaderCache
+
+# shader program cache: source hash -> program, 지원되면 link된 binary를 common/.shader_cache/에 저장
+g_shader_cache = ShaderCache()
 
 g_azimuth = 0.
 g_elevation = 0.
@@ -61,47 +71,9 @@ void main()
 '''
 
 def load_shaders(vertex_shader_source, fragment_shader_source):
-    # build and compile our shader program
-    # ------------------------------------
-    
-    # vertex shader 
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)    # create an empty shader object
-    glShaderSource(vertex_shader, vertex_shader_source) # provide shader source code
-    glCompileShader(vertex_shader)                      # compile the shader object
-    
-    # check for shader compile errors
-    success = glGetShaderiv(vertex_shader, GL_COMPILE_STATUS)
-    if (not success):
-        infoLog = glGetShaderInfoLog(vertex_shader)
-        print("ERROR::SHADER::VERTEX::COMPILATION_FAILED\n" + infoLog.decode())
-        
-    # fragment shader
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)    # create an empty shader object
-    glShaderSource(fragment_shader, fragment_shader_source) # provide shader source code
-    glCompileShader(fragment_shader)                        # compile the shader object
-    
-    # check for shader compile errors
-    success = glGetShaderiv(fragment_shader, GL_COMPILE_STATUS)
-    if (not success):
-        infoLog = glGetShaderInfoLog(fragment_shader)
-        print("ERROR::SHADER::FRAGMENT::COMPILATION_FAILED\n" + infoLog.decode())
-
-    # link shaders
-    shader_program = glCreateProgram()               # create an empty program object
-    glAttachShader(shader_program, vertex_shader)    # attach the shader objects to the program object
-    glAttachShader(shader_program, fragment_shader)
-    glLinkProgram(shader_program)                    # link the program object
-
-    # check for linking errors
-    success = glGetProgramiv(shader_program, GL_LINK_STATUS)
-    if (not success):
-        infoLog = glGetProgramInfoLog(shader_program)
-        print("ERROR::SHADER::PROGRAM::LINKING_FAILED\n" + infoLog.decode())
-        
-    glDeleteShader(vertex_shader)
-    glDeleteShader(fragment_shader)
-
-    return shader_program    # return the shader program
+    # 같은 source의 program은 한 번만 만든다 (memory / disk의 program binary, common/shader_cache.py)
+    # return: ShaderProgram (glUseProgram에는 .id, uniform location은 .location(name))
+    return g_shader_cache.program(vertex_shader_source, fragment_shader_source)
 
 def key_callback(window, key, scancode, action, mods):
     global g_P, g_projection_is_ortho, g_screen_width, g_screen_height, g_camera_pos, g_camera_front, g_camera_up, g_show_frame
@@ -296,7 +268,10 @@ def main():
     shader_program = load_shaders(g_vertex_shader_src, g_fragment_shader_src)
 
     # get uniform locations
-    MVP_loc = glGetUniformLocation(shader_program, 'MVP')
+    MVP_loc = shader_program.location('MVP')
+
+    # shader 준비에 걸린 시간 (cache가 비어있으면 compile, 있으면 program binary)
+    print(g_shader_cache.report())
     
     vao_frame = prepare_vao_frame()
     vao_grid = prepare_vao_grid()
@@ -313,7 +288,7 @@ def main():
         # render in "wireframe mode"
         glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
 
-        glUseProgram(shader_program)
+        glUseProgram(shader_program.id)
 
         V = glm.lookAt(g_camera_pos, g_camera_pos + g_camera_front, g_camera_up)
         
@@ -0,0 +1,99 @@
+'''
+headless batch renderer: grid + world frame을 도는 카메라 -> 이미지 sequence / raw video
+
+window 없이 offscreen FBO에 그리고 PBO ring으로 읽어서 내보낸다. (common/offline.py, common/capture.py)
+카메라 위치는 wall clock이 아니라 출력 frame 번호로 정한다: 출력 전체에 걸쳐 azimuth가 한 바퀴
+
+usage:
+    python render.py -o out                              # out/frame_00000.png ...
+    python render.py -o out/%04d.ppm --frames 120        # PPM
+    python render.py -o - > a.rgb                        # raw rgb24 stream을 stdout으로
+    python render.py -o "|ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - a.mp4"
+    python render.py --egl ...                           # display 없는 CPU-only 환경 (EGL / Mesa)
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import argparse
+import time
+import glm
+import numpy as np
+from OpenGL.GL import *
+import main as viewer
+from common import offline, capture
+
+# 카메라가 도는 원의 반지름과 높이 (elevation)
+ORBIT_DISTANCE = 5.0
+ORBIT_ELEVATION = glm.radians(30.0)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='render the project1 scene without a window')
+    parser.add_argument('-o', '--output', default='frames',
+                        help="image directory / pattern with %%d, '-' for raw rgb24 on stdout, '|command' for a raw video pipe")
+    parser.add_argument('--size', default='800x800', help='WIDTHxHEIGHT')
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--egl', action='store_true', help='use an EGL context instead of a hidden glfw window')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    width, height = (int(value) for value in args.size.lower().split('x'))
+
+    context = offline.create_context(width, height, 'render')
+    if context is None:
+        print('failed to create an OpenGL context', file=sys.stderr)
+        return 1
+
+    shader_program = viewer.load_shaders(viewer.g_vertex_shader_src, viewer.g_fragment_shader_src)
+    MVP_loc = shader_program.location('MVP')
+
+    vao_frame = viewer.prepare_vao_frame()
+    vao_grid = viewer.prepare_vao_grid()
+
+    P = glm.perspective(glm.radians(45.0), width / height, 0.5, 20)
+
+    def draw(i):
+        azimuth = 2 * np.pi * i / args.frames
+        eye = glm.vec3(np.sin(azimuth) * np.cos(ORBIT_ELEVATION), np.sin(ORBIT_ELEVATION),
+                       np.cos(azimuth) * np.cos(ORBIT_ELEVATION)) * ORBIT_DISTANCE
+        V = glm.lookAt(eye, glm.vec3(0, 0, 0), glm.vec3(0, 1, 0))
+        MVP = P * V * glm.mat4()
+
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glEnable(GL_DEPTH_TEST)
+        glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+
+        glUseProgram(shader_program.id)
+        viewer.draw_grid(vao_grid, MVP, MVP_loc)
+        viewer.draw_frame(vao_frame, MVP, MVP_loc)
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            print('rendered %d / %d frames' % (done, total), file=sys.stderr)
+
+    writer = capture.open_writer(args.output, width, height, args.fps)
+    start = time.perf_counter()
+    frame_capture = offline.render_frames(args.frames, draw, writer, width, height, progress)
+    elapsed = time.perf_counter() - start
+    print('%d frames (%dx%d) in %.2f s, %.2f ms/frame' % (args.frames, width, height, elapsed, 1000 * elapsed / args.frames),
+          file=sys.stderr)
+    print(frame_capture.report(), file=sys.stderr)
+
+    offline.destroy_context(context)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+'''
+normal matrix benchmark (vertex throughput)
+
+vertex shader에서 vertex마다 mat3(transpose(inverse(M)))를 계산하는 방식과,
+object마다 CPU에서 한 번 계산한 normal matrix를 넘기는 방식(uniform N / instance attribute vin_N)을 비교한다.
+합성 grid mesh를 회전 + scale이 다른 model matrix로 여러 번 그린다.
+화면은 아주 작게 잡아서 fragment 비용은 빼고 vertex 단계만 본다.
+    - uniform: Mesh.draw_mesh로 object마다 draw call 하나
+    - instanced: Mesh.draw_instanced로 draw call 하나 (normal matrix는 numpy로 한 번에 계산)
+
+usage:
+    python bench_normals.py                  # 합성 grid mesh (200000 faces)
+    python bench_normals.py --faces 1000000
+    python bench_normals.py a.obj            # 지정한 obj 파일
+    python bench_normals.py --egl            # display 없는 환경 (EGL / Mesa)
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import tempfile
+import time
+import glm
+import numpy as np
+from OpenGL.GL import *
+import main as viewer
+from common import offline
+from load_obj import Mesh
+from common.camera_block import CameraBlock
+from common.lights import LightManager
+from bench_obj import write_grid_obj
+
+OBJECT_CNT = 16
+FRAME_CNT = 20
+# fragment shader 비용이 거의 없도록 작은 framebuffer에 그린다
+WIDTH, HEIGHT = 16, 16
+DEFAULT_FACES = 200000
+
+# 비교용: 예전처럼 vertex마다 inverse를 계산하는 vertex shader
+PER_VERTEX_SHADERS = {
+    'uniform': viewer.g_vertex_shader_src.replace(
+        'normalize(N * vin_normal)', 'normalize( mat3(transpose(inverse(M))) * vin_normal)'),
+    'instanced': viewer.g_vertex_shader_instanced_src.replace(
+        'normalize(vin_N * vin_normal)', 'normalize( mat3(transpose(inverse(vin_M))) * vin_normal)'),
+}
+
+
+def model_matrices(cnt):
+    '''
+    회전과 (균등하지 않은) scale이 다른 model matrix cnt개
+    '''
+    Ms = []
+    for i in range(cnt):
+        angle = 2 * np.pi * i / cnt
+        Ms.append(glm.rotate(angle, glm.vec3(0, 1, 0)) * glm.translate(glm.vec3(2, 0, 0))
+                  * glm.scale(glm.vec3(1, 1 + 0.1 * i, 0.5)))
+    return Ms
+
+
+def ms_per_frame(draw):
+    draw()
+    glFinish()
+
+    start = time.perf_counter()
+    for _ in range(FRAME_CNT):
+        draw()
+    glFinish()
+    return 1000 * (time.perf_counter() - start) / FRAME_CNT
+
+
+def run(filepath):
+    mesh = Mesh()
+    mesh.parse_obj_str(filepath, show_face_cnt=False, use_cache=False)
+    mesh.prepare_vao_mesh()
+    Ms = model_matrices(OBJECT_CNT)
+
+    camera_block = CameraBlock()
+    lights = LightManager(viewer.SCENE_LIGHTS)
+    camera_block.update(glm.perspective(glm.radians(45.0), 1, 0.5, 20), glm.lookAt(glm.vec3(0, 4, 6), glm.vec3(0), glm.vec3(0, 1, 0)),
+                        glm.vec3(0, 4, 6))
+    lights.update()
+
+    # rasterization을 끄고 vertex shader만 돌린다
+    glEnable(GL_RASTERIZER_DISCARD)
+
+    print('%s  vertices drawn per frame: %d (%d objects)' % (os.path.basename(filepath), mesh.draw_vertex_cnt() * OBJECT_CNT, OBJECT_CNT))
+    print('%-10s %-12s %10s %14s' % ('draw', 'normal', 'ms/frame', 'Mvertices/s'))
+    for mode in ('uniform', 'instanced'):
+        results = {}
+        for normal_mode in ('per vertex', 'per object'):
+            if mode == 'uniform':
+                vertex_src = PER_VERTEX_SHADERS['uniform'] if normal_mode == 'per vertex' else viewer.g_vertex_shader_src
+            else:
+                vertex_src = PER_VERTEX_SHADERS['instanced'] if normal_mode == 'per vertex' else viewer.g_vertex_shader_instanced_src
+            program = viewer.load_shaders(vertex_src, viewer.g_fragment_shader_src)
+            camera_block.attach(program)
+            lights.attach(program)
+            glUseProgram(program.id)
+            lights.bind_all(program)
+            M_loc, N_loc = program.location('M'), program.location('N')
+
+            def draw():
+                if mode == 'uniform':
+                    for M in Ms:
+                        mesh.draw_mesh(M, M_loc, N_loc)
+                else:
+                    mesh.draw_instanced(Ms)
+
+            ms = ms_per_frame(draw)
+            results[normal_mode] = ms
+            throughput = mesh.draw_vertex_cnt() * OBJECT_CNT / (ms / 1000) / 1e6
+            print('%-10s %-12s %10.2f %14.1f' % (mode, normal_mode, ms, throughput))
+        print('%-10s %-12s %10s %14s' % (mode, 'speedup', 'x%.2f' % (results['per vertex'] / results['per object']), ''))
+
+    glDisable(GL_RASTERIZER_DISCARD)
+    lights.delete()
+    camera_block.delete()
+    mesh.delete_vao_mesh()
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != '--egl']
+    faces = DEFAULT_FACES
+    if '--faces' in args:
+        i = args.index('--faces')
+        faces = int(args[i + 1])
+        del args[i:i + 2]
+
+    context = offline.create_context(WIDTH, HEIGHT, 'bench_normals')
+    if context is None:
+        print('failed to create an OpenGL context', file=sys.stderr)
+        return 1
+    target = offline.OffscreenTarget(WIDTH, HEIGHT)
+
+    if args:
+        for filepath in args:
+            run(filepath)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, 'grid.obj')
+            write_grid_obj(filepath, faces)
+            run(filepath)
+
+    target.delete()
+    offline.destroy_context(context)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
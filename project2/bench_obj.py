@@ -0,0 +1,189 @@
+'''
+obj parser benchmark
+
+기존 줄 단위 parser(obj_parser.parse_obj_file_naive)와
+vectorized parser(obj_parser.parse_obj_file), streaming parser(obj_parser.parse_obj_file_streaming)의
+결과가 같은지 확인하고 속도를 비교한다.
+합성 mesh에 대해서는 parser별로 별도 process를 띄워 peak RSS도 비교한다.
+
+usage:
+    python bench_obj.py                 # 샘플 obj 파일들 + 합성 grid mesh
+    python bench_obj.py a.obj b.obj     # 지정한 파일들
+    python bench_obj.py --faces 1000000 # 합성 mesh의 face 개수 지정
+    python bench_obj.py --parallel      # 합성 mesh로 parallel parser의 worker 수별 처리량 비교
+'''
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import obj_parser
+
+
+def write_grid_obj(filepath, faces):
+    '''
+    quad/triangle이 섞인 n x n grid mesh를 v//vn 형식으로 쓴다.
+    '''
+    n = max(int(np.sqrt(faces)), 2)
+    xs, zs = np.meshgrid(np.linspace(-1, 1, n + 1), np.linspace(-1, 1, n + 1))
+    ys = 0.1 * np.sin(4 * xs) * np.cos(4 * zs)
+
+    with open(filepath, 'w') as f:
+        for x, y, z in zip(xs.ravel(), ys.ravel(), zs.ravel()):
+            f.write('v %.6f %.6f %.6f\n' % (x, y, z))
+        f.write('vn 0.000000 1.000000 0.000000\n')
+
+        for i in range(n):
+            for j in range(n):
+                a = i * (n + 1) + j + 1
+                b, c, d = a + 1, a + n + 2, a + n + 1
+                if (i + j) % 2 == 0:
+                    f.write('f %d//1 %d//1 %d//1 %d//1\n' % (a, b, c, d))
+                else:
+                    f.write('f %d//1 %d//1 %d//1\n' % (a, b, c))
+                    f.write('f %d//1 %d//1 %d//1\n' % (a, c, d))
+
+
+def write_mixed_obj(filepath):
+    '''
+    corner 형식(v, v/vt, v//vn, v/vt/vn)과 v / vn 줄의 값 개수가 섞인 작은 mesh.
+    '/'나 값의 전체 개수는 형식이 하나일 때와 우연히 같아지도록 골랐다.
+    '''
+    with open(filepath, 'w') as f:
+        # 값 7 + 7 + 7 + 3 + 6 = 30개 = 6 * 5
+        f.write('v 0 0 0 1 2 3 4\nv 1 0 0 1 2 3 4\nv 1 1 0 1 2 3 4\nv 0 1 0\nv 0 0 1 0.5 0.5 0.5\n')
+        f.write('vt 0 0\nvt 1 0\n')
+        f.write('vn 0 0 1 0\nvn 0 1 0\nvn 1 0 0\n')
+        # (v//vn을 v/0/vn으로 바꾼 뒤) '/' 4 + 4 + 3 = 11개 = corner 개수
+        f.write('f 1//1 2//2 3 4\n')
+        f.write('f 1/1 2/2/2 3 5/1\n')
+        f.write('f 2/1 3/2 4/1\n')
+
+
+def bench(func, filepath, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(filepath)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+PARSERS = {
+    'naive': obj_parser.parse_obj_file_naive,
+    'vectorized': obj_parser.parse_obj_file,
+    'streaming': obj_parser.parse_obj_file_streaming,
+    'streaming-indexed': lambda path: obj_parser.parse_obj_file_streaming(path, indexed=True),
+    'parallel': obj_parser.parse_obj_file_parallel,
+}
+
+
+def same_result(a, b):
+    return np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1]) and a[2] == b[2]
+
+
+def compare(filepath, repeat=3):
+    naive_time, naive = bench(obj_parser.parse_obj_file_naive, filepath, repeat)
+    fast_time, fast = bench(obj_parser.parse_obj_file, filepath, repeat)
+    stream_time, stream = bench(obj_parser.parse_obj_file_streaming, filepath, repeat)
+
+    same = same_result(naive, fast) and same_result(naive, stream)
+
+    print('%-28s faces: %9d  naive: %8.3fs  vectorized: %8.3fs (x%5.1f)  streaming: %8.3fs (x%5.1f)  same output: %s' % (
+        os.path.basename(filepath), sum(fast[2].values()), naive_time,
+        fast_time, naive_time / max(fast_time, 1e-9),
+        stream_time, naive_time / max(stream_time, 1e-9), same))
+
+    # indexed: streaming은 block 단위로 중복 제거를 하므로 한 번에 하는 vectorized와 결과가 같은지도 확인
+    fast_indexed_time, fast_indexed = bench(lambda path: obj_parser.parse_obj_file(path, indexed=True), filepath, repeat)
+    stream_indexed_time, stream_indexed = bench(PARSERS['streaming-indexed'], filepath, repeat)
+    same_indexed = same_result(fast_indexed, stream_indexed)
+
+    print('%-28s indexed vertices: %9d  vectorized: %8.3fs  streaming: %8.3fs  same output: %s' % (
+        '', len(fast_indexed[0]) // obj_parser.VERTEX_STRIDE, fast_indexed_time, stream_indexed_time, same_indexed))
+    return same and same_indexed
+
+
+def bench_parallel(filepath):
+    '''
+    worker 수를 1, 2, 4, ... cpu 개수까지 늘리면서 parse_obj_file_parallel의 처리량(MB/s)을 잰다.
+    '''
+    size_mb = os.path.getsize(filepath) / (1024 * 1024)
+    reference = obj_parser.parse_obj_file(filepath)
+    base_time, _ = bench(obj_parser.parse_obj_file, filepath, 1)
+    print('file size: %.1f MB, single process vectorized: %.3fs (%.1f MB/s)' % (size_mb, base_time, size_mb / base_time))
+
+    cpu_cnt = os.cpu_count() or 1
+    worker_counts = sorted({min(2 ** i, cpu_cnt) for i in range(cpu_cnt.bit_length() + 1)})
+    all_same = True
+    for use_threads in (False, True):
+        for workers in worker_counts:
+            elapsed, result = bench(lambda path: obj_parser.parse_obj_file_parallel(path, workers=workers, use_threads=use_threads), filepath, 1)
+            same = same_result(reference, result)
+            all_same &= same
+            print('%-8s workers: %3d  %8.3fs  %8.1f MB/s  speedup x%5.2f  same output: %s' % (
+                'threads' if use_threads else 'process', workers, elapsed, size_mb / elapsed, base_time / elapsed, same))
+    return all_same
+
+
+def peak_rss(parser, filepath):
+    # parser 하나만 실행하는 process를 띄워서 그 process의 peak RSS를 잰다
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--rss-only', parser, filepath],
+                            capture_output=True, text=True).stdout.strip()
+    return output or 'n/a'
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--rss-only']:
+        PARSERS[args[1]](args[2])
+        rss = obj_parser.peak_rss_mb()
+        print('%.1f MB' % rss if rss is not None else 'n/a')
+        return 0
+
+    faces = 200000
+    if '--faces' in args:
+        i = args.index('--faces')
+        faces = int(args[i + 1])
+        del args[i:i + 2]
+
+    if '--parallel' in args:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, 'grid-%d.obj' % faces)
+            write_grid_obj(filepath, faces)
+            return 0 if bench_parallel(filepath) else 1
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    files = args or [
+        os.path.join(current_dir, 'Project2-sample-objs', name)
+        for name in sorted(os.listdir(os.path.join(current_dir, 'Project2-sample-objs'))) if name.endswith('.obj')
+    ] + [
+        os.path.join(current_dir, 'animating-models', name)
+        for name in sorted(os.listdir(os.path.join(current_dir, 'animating-models'))) if name.endswith('.obj')
+    ]
+
+    all_same = True
+    for filepath in files:
+        all_same &= compare(filepath)
+
+    if not args:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, 'mixed-formats.obj')
+            write_mixed_obj(filepath)
+            all_same &= compare(filepath, repeat=1)
+
+            filepath = os.path.join(tmp_dir, 'grid-%d.obj' % faces)
+            write_grid_obj(filepath, faces)
+            all_same &= compare(filepath, repeat=1)
+
+            print('file size: %.1f MB' % (os.path.getsize(filepath) / (1024 * 1024)))
+            for parser in PARSERS:
+                print('peak RSS %-17s: %s' % (parser, peak_rss(parser, filepath)))
+
+    return 0 if all_same else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
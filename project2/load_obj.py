@@ -13,6 +13,38 @@ import glm
 import ctypes
 import numpy as np
 import os
+import obj_parser
+import mesh_cache
+from common.lights import transform_sphere
+from common.frustum import transform_bounds
+
+# 이 크기(byte) 이상의 obj 파일은 streaming mode로 읽는다
+STREAMING_THRESHOLD = 64 * 1024 * 1024
+
+# instance buffer: instance마다 model matrix(mat4, location 3 ~ 6) + normal matrix(mat3, location 7 ~ 9)
+INSTANCE_FLOATS = 16 + 9
+
+
+def normal_matrix(M):
+    '''
+    M(glm.mat4)의 normal matrix: mat3(M)의 inverse transpose.
+    vertex shader에서 vertex마다 inverse(M)을 계산하지 않도록 object마다 한 번 CPU에서 계산한다.
+    '''
+    return glm.transpose(glm.inverse(glm.mat3(M)))
+
+
+def instance_data(model_matrices):
+    '''
+    model_matrices(glm.mat4 list) -> (N, INSTANCE_FLOATS) float32, 행렬은 열 우선 (M, normal matrix 순)
+    normal matrix는 instance 전체를 numpy로 한 번에 계산한다.
+    '''
+    Ms = np.array([np.array(M) for M in model_matrices], dtype=np.float64).reshape(-1, 4, 4)
+    data = np.empty((len(Ms), INSTANCE_FLOATS), dtype=np.float32)
+    data[:, :16] = Ms.transpose(0, 2, 1).reshape(-1, 16)
+    # normal matrix = inverse(A)^T 이므로 열 우선으로 쓰면 inverse(A)를 행 우선으로 쓴 것과 같다
+    data[:, 16:] = np.linalg.inv(Ms[:, :3, :3]).reshape(-1, 9)
+    return data
+
 class Mesh:
     def __init__(self):
         self.__is_animating = False
@@ -20,12 +52,24 @@ class Mesh:
         self.__filepath = ""
         self.__vertices = []
         self.__vertex_indices = []
+        self.__is_indexed = False
+        self.__faces_cnt = {}
+        # object 좌표계의 bounding volume (파싱할 때 계산): AABB (min, max), sphere (center, radius)
+        self.__aabb = None
+        self.__bounding_sphere = None
 
         self.__vao = None
+        self.__vbo = None
+        self.__ebo = None
+        self.__instance_vbo = None
 
     @property
     def vao(self):
         return self.__vao
+
+    @property
+    def filepath(self):
+        return self.__filepath
     
     @property
     def is_animating(self):
@@ -34,110 +78,119 @@ class Mesh:
     def change_animating_mode(self, flag):
         self.__is_animating = flag
 
-    def parse_obj_str(self, filepath, show_face_cnt = True):
-        faces_cnt = {}
+    def parse_obj_str(self, filepath, show_face_cnt = True, streaming = None, indexed = True, use_cache = True, parallel = False, progress = None):
+        '''
+        streaming: True면 파일을 chunk 단위로 읽는 streaming parser를 사용한다.
+                   None이면 파일 크기가 STREAMING_THRESHOLD 이상일 때만 streaming
+        indexed: True면 (v, vn) 쌍이 같은 vertex를 합치고 EBO + glDrawElements로 그린다.
+                 False면 triangle corner마다 vertex를 펼쳐서 glDrawArrays로 그린다.
+        use_cache: True면 .mesh_cache/의 cache 파일에서 파싱 결과를 읽고, 없으면 파싱 후 저장한다.
+        parallel: True면 파일을 byte 구간으로 나눠서 여러 process에서 파싱한다. (1GB 이상의 큰 파일용)
+        progress: (읽은 byte 수, 전체 byte 수)를 받는 callback. 주어지면 streaming parser를 사용한다.
+        '''
+        if streaming is None:
+            streaming = progress is not None or os.path.getsize(filepath) >= STREAMING_THRESHOLD
 
-        with open(filepath, 'r') as f:
-            lines = f.readlines()
+        result = mesh_cache.load(filepath, indexed) if use_cache else None
+        from_cache = result is not None
+        # process 전체의 최대 RSS(VmHWM)라서 이번 파싱이 그 최대치를 얼마나 올렸는지만 본다
+        peak_before = obj_parser.peak_rss_mb()
 
-            tmp_vertex_pos = []
-            tmp_vertex_colors = []
-            tmp_vnormals = []
-            
-            face_vertex_indices = []
-            face_vnormal_indices = []
-
-            for line in lines:
-                words = line.split()
-                if len(words) < 1:
-                    continue
-
-                # 'v': parse the vertex data
-                if words[0] == 'v':
-                    vertex = [float(words[1]), float(words[2]), float(words[3])]
-                    tmp_vertex_pos.append(vertex)
-
-                    if(len(words) == 7):
-                        color = [float(words[4]), float(words[5]), float(words[6])]
-                        tmp_vertex_colors.append(color)
-                    else:
-                        tmp_vertex_colors.append([1., 1., 1.])
-                
-                # 'vn': parse the vertex normal vector data
-                elif words[0] == 'vn':
-                    vnormal = [float(words[1]), float(words[2]), float(words[3])]
-                    tmp_vnormals.append(vnormal)
-                
-                # 'f': parse the face data
-                elif words[0] == 'f':
-                    # only parse v//vn, v/vt/vn type face
-                    vertex_len = len(words) - 1
-                    for i in range(1, vertex_len - 1):
-                        # 삼각형 하나의 index가 i, j, k로 결정됨
-
-                        # +1을 하는 이유: 0번째 요소는 'f'이기 때문
-                        parsed_face_data = words[1].split('/')
-                        # -1을 하는 이유: obj 파일에서 첫번째 인덱스는 0이 아닌 1부터 시작하는데,
-                        # array에는 0부터 접근가능하기 때문
-                        face_vertex_indices.append(int(parsed_face_data[0]) - 1) 
-                        if len(parsed_face_data) == 3:
-                            face_vnormal_indices.append(int(parsed_face_data[2]) - 1)
-                        else:
-                            face_vnormal_indices.append(int(-1))
-
-                        parsed_face_data = words[i + 1].split('/')                            
-                        face_vertex_indices.append(int(parsed_face_data[0]) - 1)
-                        if len(parsed_face_data) == 3:
-                            face_vnormal_indices.append(int(parsed_face_data[2]) - 1)
-                        else:
-                            face_vnormal_indices.append(int(-1))
-
-                        parsed_face_data = words[i + 2].split('/')
-                        face_vertex_indices.append(int(parsed_face_data[0]) - 1)
-                        if len(parsed_face_data) == 3:
-                            face_vnormal_indices.append(int(parsed_face_data[2]) - 1)
-                        else:
-                            face_vnormal_indices.append(int(-1))
-
-                    if faces_cnt.get(vertex_len) is None:
-                        faces_cnt[vertex_len] = 0
-
-                    faces_cnt[vertex_len] = faces_cnt[vertex_len] + 1
-
-                # ignore other input options, continue
-                else:
-                    continue
-            
-            vbo_arr_data = []
-            used_vertices_len = len(face_vertex_indices)
-            for idx in range(used_vertices_len):
-                vbo_arr_data.append(tmp_vertex_pos[face_vertex_indices[idx]])
-                vbo_arr_data.append(tmp_vertex_colors[face_vertex_indices[idx]])
+        # 줄 단위 loop 대신 obj_parser의 vectorized bulk parser를 사용
+        if result is None and parallel:
+            result = obj_parser.parse_obj_file_parallel(filepath, indexed)
+        elif result is None and streaming:
+            result = obj_parser.parse_obj_file_streaming(filepath, indexed, progress=progress)
+        elif result is None:
+            result = obj_parser.parse_obj_file(filepath, indexed)
 
-                if face_vnormal_indices[idx] == -1:
-                    vbo_arr_data.append([float(0), float(0), float(0)])
-                else:
-                    vbo_arr_data.append(tmp_vnormals[face_vnormal_indices[idx]])
+        if use_cache and not from_cache:
+            mesh_cache.save(filepath, indexed, result)
 
-            self.__filepath = filepath
-            self.__vertices = np.concatenate(np.array(vbo_arr_data, dtype='f4'))
-            self.__vertex_indices = np.array(face_vertex_indices, dtype='u4')
+        vertices, vertex_indices, faces_cnt = result
 
+        self.__filepath = filepath
+        self.__vertices = vertices
+        self.__vertex_indices = vertex_indices
+        self.__is_indexed = indexed
+        self.__faces_cnt = faces_cnt
+        self.compute_bounds()
+
+        if show_face_cnt:
+            self.print_face_cnt()
+            if from_cache:
+                print('loaded from cache: ' + os.path.basename(mesh_cache.cache_path(filepath, indexed)))
+            elif streaming and peak_before is not None:
+                print('process peak RSS increase (streaming mode): %.1f MB' % (obj_parser.peak_rss_mb() - peak_before))
+
+    def compute_bounds(self):
+        '''
+        모든 vertex position으로 AABB와 bounding sphere(AABB의 중심, 반 대각선)를 계산해둔다.
+        '''
+        if len(self.__vertices) == 0:
+            self.__aabb = None
+            self.__bounding_sphere = None
+            return
+        positions = np.asarray(self.__vertices).reshape(-1, obj_parser.VERTEX_STRIDE)[:, :3]
+        low, high = positions.min(axis=0).astype(np.float64), positions.max(axis=0).astype(np.float64)
+        self.__aabb = (low, high)
+        self.__bounding_sphere = ((low + high) / 2, float(np.linalg.norm(high - low)) / 2)
+
+    def position_bounds(self):
+        '''
+        모든 vertex position의 (min, max) (3,) 배열 (파싱 전이면 None)
+        '''
+        return self.__aabb
+
+    def bounding_sphere(self):
+        '''
+        object 좌표계에서 mesh를 다 포함하는 sphere (center (3,), radius). position_bounds의 중심과 반 대각선
+        '''
+        if self.__bounding_sphere is None:
+            return np.zeros(3), 0.
+        return self.__bounding_sphere
+
+    def local_bounds(self):
+        '''
+        frustum.transform_bounds에 넘길 object 좌표계의 (center, radius, low, high)
+        '''
+        center, radius = self.bounding_sphere()
+        low, high = self.__aabb if self.__aabb is not None else (np.zeros(3), np.zeros(3))
+        return center, radius, low, high
+
+    def world_bounds(self, model_matrices):
+        '''
+        model_matrices(glm.mat4 list)로 옮긴 world 좌표계의 bounding volume들 (frustum.transform_bounds)
+        '''
+        Ms = np.array([np.array(M) for M in model_matrices], dtype=np.float64).reshape(-1, 4, 4)
+        center, radius, low, high = self.local_bounds()
+        n = len(Ms)
+        return transform_bounds(Ms, np.tile(center, (n, 1)), np.full(n, radius), np.tile(low, (n, 1)), np.tile(high, (n, 1)))
+
+    def print_face_cnt(self):
+        faces_cnt = self.__faces_cnt
         total_faces_cnt = sum(faces_cnt.values())
         faces_3 = int(faces_cnt.get(3) or 0)
         faces_4 = int(faces_cnt.get(4) or 0)
 
-        if show_face_cnt:
-            print("------------------------")
-            print('obj file name: ' + os.path.basename(self.__filepath))
-            print('total number of faces: ' + str(total_faces_cnt)) # TODO: total number of 'f'
-            print('number of faces with 3 vertices: ' + str(faces_3))
-            print('number of faces with 4 vertices: ' + str(faces_4))
-            print('number of faces with more than 4 vertices: ' + str(total_faces_cnt - faces_4 - faces_3))
-    
+        print("------------------------")
+        print('obj file name: ' + os.path.basename(self.__filepath))
+        print('total number of faces: ' + str(total_faces_cnt)) # TODO: total number of 'f'
+        print('number of faces with 3 vertices: ' + str(faces_3))
+        print('number of faces with 4 vertices: ' + str(faces_4))
+        print('number of faces with more than 4 vertices: ' + str(total_faces_cnt - faces_4 - faces_3))
+        if self.__is_indexed:
+            corner_cnt = len(self.__vertex_indices)
+            vertex_cnt = len(self.__vertices) // obj_parser.VERTEX_STRIDE
+            print('number of unique vertices: %d / %d (dedup ratio: %.2fx)' % (vertex_cnt, corner_cnt, corner_cnt / max(vertex_cnt, 1)))
+
     def prepare_vao_mesh(self):
-        vertices = glm.array(self.__vertices)
-        
+        # glm.array로 한 번 더 복사하지 않고 numpy 배열을 그대로 upload
+        vertices = self.__vertices
+
+        # 이전에 drop된 파일의 GPU buffer 해제
+        self.delete_vao_mesh()
+
         # create and activate VAO (vertex array object)
         VAO = glGenVertexArrays(1)  # create a vertex array object ID and store it to VAO variable
         glBindVertexArray(VAO)      # activate VAO
@@ -147,7 +200,16 @@ class Mesh:
         glBindBuffer(GL_ARRAY_BUFFER, VBO)  # activate VBO as a vertex buffer object
 
         # copy vertex data to VBO
-        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices.ptr, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
+
+        # create and activate EBO (element buffer object)
+        EBO = None
+        if self.__is_indexed:
+            EBO = glGenBuffers(1)   # create a buffer object ID and store it to EBO variable
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, EBO)  # activate EBO as an element buffer object
+
+            # copy index data to EBO
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.__vertex_indices.nbytes, self.__vertex_indices, GL_STATIC_DRAW) # allocate GPU memory for and copy index data to the currently bound element buffer
 
         # configure vertex positions
         glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 9 * glm.sizeof(glm.float32), None)
@@ -162,18 +224,105 @@ class Mesh:
         glEnableVertexAttribArray(2)
 
         self.__vao = VAO
+        self.__vbo = VBO
+        self.__ebo = EBO
 
         return VAO
+
+    def prepare_instance_buffer(self):
+        '''
+        instance마다 model matrix(mat4)와 normal matrix(mat3)를 넘겨주는 buffer를 VAO에 붙인다.
+        mat4 attribute는 vec4 4개(location 3 ~ 6), mat3 attribute는 vec3 3개(location 7 ~ 9)로 나눠서 설정하고, divisor를 1로 둔다.
+        '''
+        glBindVertexArray(self.__vao)
+
+        VBO = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, VBO)
+
+        stride = INSTANCE_FLOATS * glm.sizeof(glm.float32)
+        vec4_size = glm.sizeof(glm.vec4)
+        vec3_size = glm.sizeof(glm.vec3)
+        for i in range(4):
+            glVertexAttribPointer(3 + i, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(i * vec4_size))
+            glEnableVertexAttribArray(3 + i)
+            glVertexAttribDivisor(3 + i, 1)
+        for i in range(3):
+            glVertexAttribPointer(7 + i, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(4 * vec4_size + i * vec3_size))
+            glEnableVertexAttribArray(7 + i)
+            glVertexAttribDivisor(7 + i, 1)
+
+        self.__instance_vbo = VBO
+
+    def delete_vao_mesh(self):
+        if self.__instance_vbo is not None:
+            glDeleteBuffers(1, [self.__instance_vbo])
+            self.__instance_vbo = None
+        if self.__vbo is not None:
+            glDeleteBuffers(1, [self.__vbo])
+            self.__vbo = None
+        if self.__ebo is not None:
+            glDeleteBuffers(1, [self.__ebo])
+            self.__ebo = None
+        if self.__vao is not None:
+            glDeleteVertexArrays(1, [self.__vao])
+            self.__vao = None
     
-    def draw_mesh(self, MVP, MVP_loc):
+    def draw_vertex_cnt(self):
+        '''
+        draw call 한 번이 처리하는 vertex 수 (indexed면 index 수)
+        '''
+        return len(self.__vertex_indices)
+
+    def draw_elements(self):
+        if self.__is_indexed:
+            glDrawElements(GL_TRIANGLES, len(self.__vertex_indices), GL_UNSIGNED_INT, None)
+        else:
+            glDrawArrays(GL_TRIANGLES, 0, len(self.__vertex_indices))
+
+    def draw_instanced(self, model_matrices, bind_lights=None, culler=None):
+        '''
+        model_matrices(glm.mat4 list)의 개수만큼 instance를 한 번의 draw call로 그린다.
+        bind_lights: (centers, radii)를 받는 callback (LightManager.bind_object). instance 중 하나라도 닿는 light를 쓴다.
+        culler: frustum.FrustumCuller. 보이지 않는 instance는 빼고 그린다.
+        '''
+        if culler is not None:
+            is_visible = culler.visible(*self.world_bounds(model_matrices))
+            model_matrices = [M for M, visible in zip(model_matrices, is_visible) if visible]
+        if len(model_matrices) == 0:
+            return
+
+        if self.__instance_vbo is None:
+            self.prepare_instance_buffer()
+
+        if bind_lights is not None:
+            spheres = [transform_sphere(M, *self.bounding_sphere()) for M in model_matrices]
+            bind_lights([center for center, _ in spheres], [radius for _, radius in spheres])
+
+        instances = instance_data(model_matrices)
+
         glBindVertexArray(self.__vao)
-        glUniformMatrix4fv(MVP_loc, 1, GL_FALSE, glm.value_ptr(MVP))
-        glDrawArrays(GL_TRIANGLES, 0, len(self.__vertex_indices))
-            
-    def draw_node(self, node, VP, MVP_loc, M_loc):
-        M = node.get_global_transform() * glm.scale(node.get_scale())
-        MVP = VP * M
+        glBindBuffer(GL_ARRAY_BUFFER, self.__instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances, GL_STREAM_DRAW)
+
+        if self.__is_indexed:
+            glDrawElementsInstanced(GL_TRIANGLES, len(self.__vertex_indices), GL_UNSIGNED_INT, None, len(instances))
+        else:
+            glDrawArraysInstanced(GL_TRIANGLES, 0, len(self.__vertex_indices), len(instances))
+
+    def draw_mesh(self, M, M_loc, N_loc, bind_lights=None, culler=None):
+        # VP는 camera UBO에 있으므로 object마다 M과 normal matrix N만 보낸다
+        # bind_lights가 있으면 M으로 옮긴 bounding sphere에 닿는 light만 쓴다
+        # culler(frustum.FrustumCuller)가 있으면 화면 밖일 때 그리지 않는다
+        if culler is not None and not culler.visible(*self.world_bounds([M]))[0]:
+            return
+        if bind_lights is not None:
+            bind_lights(*transform_sphere(M, *self.bounding_sphere()))
+        N = normal_matrix(M)
         glBindVertexArray(self.__vao)
-        glUniformMatrix4fv(MVP_loc, 1, GL_FALSE, glm.value_ptr(MVP))
         glUniformMatrix4fv(M_loc, 1, GL_FALSE, glm.value_ptr(M))
-        glDrawArrays(GL_TRIANGLES, 0, len(self.__vertex_indices))
\ No newline at end of file
+        glUniformMatrix3fv(N_loc, 1, GL_FALSE, glm.value_ptr(N))
+        self.draw_elements()
+            
+    def draw_node(self, node, M_loc, N_loc, bind_lights=None):
+        M = node.get_global_transform() * glm.scale(node.get_scale())
+        self.draw_mesh(M, M_loc, N_loc, bind_lights)
\ No newline at end of file
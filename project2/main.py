@@ -1,3 +1,9 @@
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from OpenGL.GL import *
 from glfw.GLFW import *
 import glm
@@ -6,14 +12,34 @@ import numpy as np
 from camera import Camera as cam
 from load_obj import Mesh as mesh
 from model_loader import ModelLoader
-import os
+from mesh_registry import MeshRegistry
+from common.async_loader import AsyncLoader
+from common.capture import FrameCapture, ImageSequenceWriter
+import time
+from common.shader_cache import ShaderCache
+from common.camera_block import CameraBlock, CAMERA_BLOCK_SRC
+from common.lights import LightManager, PointLight, LIGHT_BLOCK_SRC
+from common.frustum import FrustumCuller
+import functools
+
+# shader program cache: source hash -> program, 지원되면 link된 binary를 common/.shader_cache/에 저장
+g_shader_cache = ShaderCache()
 
 g_cam = cam()
 g_mesh = mesh()
-g_animator = ModelLoader()
+g_registry = MeshRegistry()
+g_animator = ModelLoader(g_registry)
+g_async_loader = AsyncLoader()
+
+g_window_title = 'project2: Obj viewer & Hierarchical Model'
+g_is_title_changed = False
 
 g_screen_width, g_screen_height = 800, 800
 
+# R키로 녹화: 매 frame back buffer를 capture/<시각>/frame_%05d.png로 (PBO ring + writer thread, common/capture.py)
+CAPTURE_DIR = 'capture'
+g_capture = None
+
 # define mouse properties
 last_mouse_x_pos, last_mouse_y_pos = 400, 400
 mouse_pressed = {'left': False, 'right': False}
@@ -24,9 +50,22 @@ g_P = glm.mat4()
 # show frame
 g_show_frame = False
 
+# hierarchical model을 instanced rendering으로 그릴지
+g_use_instancing = True
+
+# 화면 밖의 mesh / node는 그리지 않는다 (K키로 on/off)
+g_culler = FrustumCuller()
+
+# scene의 point light들 (LightManager가 UBO로 올린다)
+SCENE_LIGHTS = [
+    PointLight((6, 6, 6), (1, 1, 1), 1.0, 0.015, 0.007),
+    PointLight((0, 20, 0), (0.52, 0.81, 0.92), 1.0, 0.015, 0.007),
+    PointLight((-16, 2, 20), (1, 0, 0), 1.0, 0.015, 0.007),
+]
+
 g_vertex_shader_src = '''
 #version 330 core
-
+''' + CAMERA_BLOCK_SRC + '''
 layout (location = 0) in vec3 vin_pos;
 layout (location = 1) in vec3 vin_material_color;
 layout (location = 2) in vec3 vin_normal; 
@@ -35,15 +74,15 @@ out vec3 vout_surface_pos;
 out vec3 vout_material_color;
 out vec3 vout_normal;
 
-uniform mat4 MVP;
 uniform mat4 M;
+uniform mat3 N;     // normal matrix: transpose(inverse(mat3(M))), object마다 CPU에서 계산
 
 void main()
 {
     // 3D points in homogeneous coordinates
     vec4 p3D_in_hcoord = vec4(vin_pos.xyz, 1.0);
 
-    gl_Position = MVP * p3D_in_hcoord;
+    gl_Position = VP * M * p3D_in_hcoord;
 
     vout_surface_pos = vec3(M * vec4(vin_pos, 1));
     vout_material_color = vin_material_color;
@@ -51,26 +90,58 @@ void main()
     if(vin_normal.x == 0 && vin_normal.y == 0 && vin_normal.z == 0) {
         vout_normal = vec3(0,0,0);
     } else {
-        vout_normal = normalize( mat3(transpose(inverse(M))) * vin_normal);
+        vout_normal = normalize(N * vin_normal);
     }
 }
 '''
 
-g_fragment_shader_src = '''
+# instanced rendering용 vertex shader: model matrix와 normal matrix를 uniform 대신 instance attribute로 받는다
+g_vertex_shader_instanced_src = '''
 #version 330 core
+''' + CAMERA_BLOCK_SRC + '''
+layout (location = 0) in vec3 vin_pos;
+layout (location = 1) in vec3 vin_material_color;
+layout (location = 2) in vec3 vin_normal; 
+layout (location = 3) in mat4 vin_M;
+layout (location = 7) in mat3 vin_N;    // normal matrix (instance마다 CPU에서 계산)
+
+out vec3 vout_surface_pos;
+out vec3 vout_material_color;
+out vec3 vout_normal;
+
+void main()
+{
+    // 3D points in homogeneous coordinates
+    vec4 p3D_in_hcoord = vec4(vin_pos.xyz, 1.0);
+
+    gl_Position = VP * vin_M * p3D_in_hcoord;
+
+    vout_surface_pos = vec3(vin_M * vec4(vin_pos, 1));
+    vout_material_color = vin_material_color;
+
+    if(vin_normal.x == 0 && vin_normal.y == 0 && vin_normal.z == 0) {
+        vout_normal = vec3(0,0,0);
+    } else {
+        vout_normal = normalize(vin_N * vin_normal);
+    }
+}
+'''
 
+g_fragment_shader_src = '''
+#version 330 core
+''' + CAMERA_BLOCK_SRC + LIGHT_BLOCK_SRC + '''
 in vec3 vout_surface_pos;
 in vec3 vout_material_color;
 in vec3 vout_normal;
 
 out vec4 FragColor;
 
-uniform vec3 view_pos;
-
-vec3 calcPointLight(vec3 light_pos, vec3 light_color, vec3 normal, vec3 surface_pos, vec3 view_dir, vec3 material_color, float material_shininess){
-    float constant = 1.0f;
-    float linear = 0.015f;
-    float quadratic = 0.007f;
+vec3 calcPointLight(PointLight light, vec3 normal, vec3 surface_pos, vec3 view_dir, vec3 material_color, float material_shininess){
+    vec3 light_pos = light.position.xyz;
+    vec3 light_color = light.color.rgb;
+    float constant = light.attenuation.x;
+    float linear = light.attenuation.y;
+    float quadratic = light.attenuation.z;
     
     // light components
     vec3 light_ambient = 0.1 * light_color;
@@ -114,17 +185,13 @@ void main()
     }
 
     else {
-        // light and material properties
-        int light_cnt = 3;
-        vec3 light_pos[3] = {vec3(6, 6, 6), vec3(0, 20, 0), vec3(-16, 2, 20)};
-        vec3 light_color[3] = {vec3(1, 1, 1), vec3(0.52, 0.81, 0.92), vec3(1, 0, 0)};
-
         vec3 normal = normalize(vout_normal);    
         vec3 view_dir = normalize(view_pos - vout_surface_pos);
-        vec3 color = calcPointLight(light_pos[0], light_color[0], normal, vout_surface_pos, view_dir, vout_material_color, 32.0);
-        
-        for(int i = 1; i < light_cnt; i++){
-            color += calcPointLight(light_pos[i], light_color[i], normal, vout_surface_pos, view_dir, vout_material_color, 32.0);
+        vec3 color = vec3(0);
+
+        // light는 LightManager가 UBO로, 그중 이 object에 닿는 것들의 index만 object_lights로 넘어온다
+        for(int i = 0; i < object_light_cnt; i++){
+            color += calcPointLight(lights[object_lights[i]], normal, vout_surface_pos, view_dir, vout_material_color, 32.0);
         }
 
         FragColor = vec4(color, 1.); //TODO: change to (color, 1.);
@@ -133,50 +200,12 @@ void main()
 '''
 
 def load_shaders(vertex_shader_source, fragment_shader_source):
-    # build and compile our shader program
-    # ------------------------------------
-    
-    # vertex shader 
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)    # create an empty shader object
-    glShaderSource(vertex_shader, vertex_shader_source) # provide shader source code
-    glCompileShader(vertex_shader)                      # compile the shader object
-    
-    # check for shader compile errors
-    success = glGetShaderiv(vertex_shader, GL_COMPILE_STATUS)
-    if (not success):
-        infoLog = glGetShaderInfoLog(vertex_shader)
-        print("ERROR::SHADER::VERTEX::COMPILATION_FAILED\n" + infoLog.decode())
-        
-    # fragment shader
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)    # create an empty shader object
-    glShaderSource(fragment_shader, fragment_shader_source) # provide shader source code
-    glCompileShader(fragment_shader)                        # compile the shader object
-    
-    # check for shader compile errors
-    success = glGetShaderiv(fragment_shader, GL_COMPILE_STATUS)
-    if (not success):
-        infoLog = glGetShaderInfoLog(fragment_shader)
-        print("ERROR::SHADER::FRAGMENT::COMPILATION_FAILED\n" + infoLog.decode())
-
-    # link shaders
-    shader_program = glCreateProgram()               # create an empty program object
-    glAttachShader(shader_program, vertex_shader)    # attach the shader objects to the program object
-    glAttachShader(shader_program, fragment_shader)
-    glLinkProgram(shader_program)                    # link the program object
-
-    # check for linking errors
-    success = glGetProgramiv(shader_program, GL_LINK_STATUS)
-    if (not success):
-        infoLog = glGetProgramInfoLog(shader_program)
-        print("ERROR::SHADER::PROGRAM::LINKING_FAILED\n" + infoLog.decode())
-        
-    glDeleteShader(vertex_shader)
-    glDeleteShader(fragment_shader)
-
-    return shader_program    # return the shader program
+    # 같은 source의 program은 한 번만 만든다 (memory / disk의 program binary, common/shader_cache.py)
+    # return: ShaderProgram (glUseProgram에는 .id, uniform location은 .location(name))
+    return g_shader_cache.program(vertex_shader_source, fragment_shader_source)
 
 def key_callback(window, key, scancode, action, mods):
-    global g_P, g_cam, g_screen_width, g_screen_height, g_show_frame, g_mesh, g_animator
+    global g_P, g_cam, g_screen_width, g_screen_height, g_show_frame, g_mesh, g_animator, g_use_instancing
     if key==GLFW_KEY_ESCAPE and action==GLFW_PRESS:
         glfwSetWindowShouldClose(window, GLFW_TRUE)
     elif key == GLFW_KEY_V and action == GLFW_PRESS:
@@ -194,6 +223,12 @@ def key_callback(window, key, scancode, action, mods):
     
     elif key == GLFW_KEY_F and action == GLFW_PRESS:
         g_show_frame = not g_show_frame
+
+    elif key == GLFW_KEY_R and action == GLFW_PRESS:
+        if g_capture is None:
+            start_capture(window)
+        else:
+            stop_capture(window)
     
     elif key == GLFW_KEY_H and action == GLFW_PRESS:
         g_animator.change_animating_mode(not g_animator.is_animating)
@@ -203,11 +238,23 @@ def key_callback(window, key, scancode, action, mods):
     elif key == GLFW_KEY_Z and action == GLFW_PRESS:
         g_animator.change_fill_mode()
 
+    elif key == GLFW_KEY_I and action == GLFW_PRESS:
+        g_use_instancing = not g_use_instancing
+        print('instanced rendering: ' + ('on' if g_use_instancing else 'off'))
+
+    elif key == GLFW_KEY_K and action == GLFW_PRESS:
+        g_culler.is_enabled = not g_culler.is_enabled
+        print('frustum culling: ' + ('on' if g_culler.is_enabled else 'off'))
+
 def framebuffer_size_callback(window, width, height):
     global g_P, g_cam, g_screen_width, g_screen_height
 
     glViewport(0, 0, width, height)
 
+    # 녹화 중에는 frame 크기가 바뀌면 안 되므로 멈춘다
+    if g_capture is not None and (width, height) != (g_capture.width, g_capture.height):
+        stop_capture(window)
+
     g_screen_width, g_screen_height = width, height
     if height == 0:
         return
@@ -262,12 +309,78 @@ def scroll_callback(window, x_scroll, y_scroll):
     global g_cam
     g_cam.scroll(0.05, y_scroll)
 
+def load_mesh(filepath, progress):
+    # worker thread에서 실행: 파싱까지만 하고 GL upload는 main thread의 finish_loading에서
+    key = g_registry.content_key(filepath)
+    if g_registry.get(key) is not None:
+        return key, None
+
+    new_mesh = mesh()
+    new_mesh.parse_obj_str(filepath, True, progress = progress)
+    return key, new_mesh
+
+def finish_loading(window):
+    global g_mesh, g_animator, g_registry, g_async_loader, g_is_title_changed
+
+    for filepath, result, error in g_async_loader.poll():
+        if error is not None:
+            print('failed to load ' + filepath + ': ' + str(error))
+            continue
+
+        # 이전에 열었던 파일(또는 animating model과 같은 파일)이면 registry의 Mesh를 그대로 재사용
+        key, new_mesh = result
+        if new_mesh is None:
+            new_mesh = g_registry.get(key)
+            if new_mesh is None:
+                # 파싱하는 동안 registry에서 해제된 경우
+                new_mesh = mesh()
+                new_mesh.parse_obj_str(filepath, True)
+            else:
+                new_mesh.print_face_cnt()
+        new_mesh = g_registry.acquire_parsed(key, new_mesh)
+
+        g_registry.release(g_mesh)
+        g_mesh = new_mesh
+        # 새 model로 바뀌므로 animating model의 mesh들도 돌려준다 (new_mesh와 같은 파일이면 registry에 남는다)
+        g_animator.release_animating()
+
+    # 진행 상황은 window title에 표시
+    if g_async_loader.is_loading:
+        glfwSetWindowTitle(window, g_window_title + ' - ' + g_async_loader.progress_text())
+        g_is_title_changed = True
+    elif g_is_title_changed:
+        glfwSetWindowTitle(window, g_window_title)
+        g_is_title_changed = False
+
+def start_capture(window):
+    global g_capture
+
+    width, height = glfwGetFramebufferSize(window)
+    if width == 0 or height == 0:
+        return
+    directory = os.path.join(CAPTURE_DIR, time.strftime('%Y%m%d-%H%M%S'))
+    g_capture = FrameCapture(width, height, ImageSequenceWriter(os.path.join(directory, 'frame_%05d.png')), read_buffer=GL_BACK)
+    print('recording to ' + directory)
+
+def stop_capture(window):
+    global g_capture
+
+    capture, g_capture = g_capture, None
+    capture.close()
+    print(capture.report())
+    glfwSetWindowTitle(window, g_window_title)
+
+def show_capture_status(window):
+    # 30 frame마다 title에 녹화한 frame 수와 capture 비용 표시
+    if g_capture.frame_cnt % 30 == 0:
+        glfwSetWindowTitle(window, g_window_title + ' - recording %d frames, capture %.2f ms/frame' % (
+            g_capture.frame_cnt, 1000 * g_capture.capture_time / g_capture.frame_cnt))
+
 def drop_callback(window, filepath):
-    global g_mesh, g_animator
+    global g_async_loader
 
-    g_animator.change_animating_mode(False)
-    g_mesh.parse_obj_str(os.path.join(filepath[0]))
-    g_mesh.prepare_vao_mesh()
+    # 파싱은 background에서, 그동안 이전 model은 계속 그려진다
+    g_async_loader.submit(os.path.join(filepath[0]), load_mesh)
 
 def prepare_vao_frame():
     # prepare vertex data (in main memory)
@@ -343,7 +456,7 @@ def draw_grid(vao):
     glDrawArrays(GL_LINES, 0, 84)
 
 def main():
-    global g_P, g_cam, g_show_frame, g_mesh, g_animator
+    global g_P, g_cam, g_show_frame, g_mesh, g_animator, g_use_instancing
 
     # initialize glfw
     if not glfwInit():
@@ -354,7 +467,7 @@ def main():
     glfwWindowHint(GLFW_OPENGL_FORWARD_COMPAT, GL_TRUE) # for macOS
 
     # create a window and OpenGL context
-    window = glfwCreateWindow(800, 800, 'project2: Obj viewer & Hierarchical Model', None, None)
+    window = glfwCreateWindow(800, 800, g_window_title, None, None)
     if not window:
         glfwTerminate()
         return
@@ -370,11 +483,24 @@ def main():
 
     # load shaders
     shader_program = load_shaders(g_vertex_shader_src, g_fragment_shader_src)
+    shader_program_instanced = load_shaders(g_vertex_shader_instanced_src, g_fragment_shader_src)
+
+    # get uniform locations (P, V, VP, view_pos는 camera UBO로)
+    M_loc = shader_program.location('M')
+    N_loc = shader_program.location('N')
+
+    # 모든 program이 같이 쓰는 per-frame camera UBO
+    camera_block = CameraBlock()
+    for program in (shader_program, shader_program_instanced):
+        camera_block.attach(program)
 
-    # get uniform locations
-    MVP_loc = glGetUniformLocation(shader_program, 'MVP')
-    M_loc = glGetUniformLocation(shader_program, 'M')
-    view_pos_loc = glGetUniformLocation(shader_program, 'view_pos')
+    # point light UBO, object마다 닿는 light만 고른다
+    lights = LightManager(SCENE_LIGHTS)
+    for program in (shader_program, shader_program_instanced):
+        lights.attach(program)
+
+    # shader 준비에 걸린 시간 (cache가 비어있으면 compile, 있으면 program binary)
+    print(g_shader_cache.report())
 
     # prepare vao
     vao_grid = prepare_vao_grid()
@@ -398,16 +524,18 @@ def main():
         else:
             glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
             
-        glUseProgram(shader_program)
-
-        M = glm.mat4()
+        # P, V, VP, 카메라 위치는 frame마다 한 번 UBO로
         V = glm.lookAt(g_cam.pos, g_cam.pos + g_cam.front, g_cam.up)
+        camera_block.update(g_P, V, g_cam.pos)
+        lights.update()
+        g_culler.update(g_P, V)
 
-        MVP = g_P * V * M
+        glUseProgram(shader_program.id)
 
-        glUniformMatrix4fv(MVP_loc, 1, GL_FALSE, glm.value_ptr(MVP))
+        M = glm.mat4()
+        N = glm.mat3()
         glUniformMatrix4fv(M_loc, 1, GL_FALSE, glm.value_ptr(M))
-        glUniform3f(view_pos_loc, g_cam.pos.x, g_cam.pos.y, g_cam.pos.z)
+        glUniformMatrix3fv(N_loc, 1, GL_FALSE, glm.value_ptr(N))
         
         # draw grid
         draw_grid(vao_grid)
@@ -415,16 +543,34 @@ def main():
 
         # draw obj file
         if g_mesh.vao is not None and not g_animator.is_animating:
-            g_mesh.draw_mesh(g_P*V*M, MVP_loc)
+            g_mesh.draw_mesh(M, M_loc, N_loc, functools.partial(lights.bind_object, shader_program), g_culler)
+        elif g_animator.is_animating and g_use_instancing:
+            glUseProgram(shader_program_instanced.id)
+            g_animator.draw_hierarchical_instanced(bind_lights=functools.partial(lights.bind_object, shader_program_instanced), culler=g_culler)
         elif g_animator.is_animating:
-            g_animator.draw_hierarchical(MVP, MVP_loc, M_loc)
+            g_animator.draw_hierarchical(M_loc, N_loc, bind_lights=functools.partial(lights.bind_object, shader_program), culler=g_culler)
         
+        # 녹화 중이면 swap 전에 back buffer의 readback을 건다
+        if g_capture is not None:
+            g_capture.capture()
+            show_capture_status(window)
+
         # swap front and back buffers
         glfwSwapBuffers(window)
 
+        # background에서 파싱이 끝난 model을 upload
+        finish_loading(window)
+
         # poll events
         glfwPollEvents()
 
+    if g_capture is not None:
+        stop_capture(window)
+
+    # object마다 평균 몇 개의 light를 계산했는지
+    print(lights.report())
+    print(g_culler.report())
+
     # terminate glfw
     glfwTerminate()
 
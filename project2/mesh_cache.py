@@ -0,0 +1,136 @@
+'''
+파싱된 obj mesh의 binary cache
+
+CACHE_DIR(.mesh_cache/)에 obj 파일과 mode마다 '<파일명>-<경로 hash>.idx.meshcache' (indexed) /
+'.flat.meshcache' (indexed=False) 파일로
+파싱 결과(vertex / index 배열, face 통계)를 저장해두고, 원본이 바뀌지 않았으면 텍스트 파싱 없이 np.fromfile 한 번으로 읽어온다.
+asset 폴더에는 아무것도 쓰지 않는다.
+
+파일 구조 (little endian)
+    header: magic, version, indexed, 원본 크기, 원본 mtime, 원본 sha1, vertex float 개수, index 개수, face 통계 개수
+    face 통계: (face의 vertex 개수, face 개수) 쌍
+    payload: PAYLOAD_ALIGN 단위로 정렬된 위치부터 vertices(f4), indices(u4)
+
+원본의 크기/mtime이 같으면 바로 사용하고,
+다르면 원본의 sha1을 다시 계산해서 내용이 같을 때만 사용한다 (header의 mtime은 갱신).
+'''
+import hashlib
+import os
+import struct
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.mesh_cache')
+CACHE_SUFFIX = '.meshcache'
+CACHE_MAGIC = b'OBJMESH\0'
+CACHE_VERSION = 1
+
+_HEADER = struct.Struct('<8sIIQq20sQQI')
+_FACE_ENTRY = struct.Struct('<IQ')
+PAYLOAD_ALIGN = 64
+
+
+def cache_path(filepath, indexed, cache_dir=CACHE_DIR):
+    # 이름이 같은 다른 폴더의 obj 파일과 겹치지 않도록 절대 경로의 hash를 붙인다
+    # indexed / non-indexed는 파일을 따로 써서 번갈아 읽어도 서로의 cache를 덮어쓰지 않는다
+    path_hash = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()[:16]
+    mode = 'idx' if indexed else 'flat'
+    return os.path.join(cache_dir, '%s-%s.%s%s' % (os.path.basename(filepath), path_hash, mode, CACHE_SUFFIX))
+
+
+def file_hash(filepath, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.digest()
+
+
+def _payload_offset(face_entry_cnt):
+    size = _HEADER.size + face_entry_cnt * _FACE_ENTRY.size
+    return (size + PAYLOAD_ALIGN - 1) // PAYLOAD_ALIGN * PAYLOAD_ALIGN
+
+
+def _read_header(f):
+    data = f.read(_HEADER.size)
+    if len(data) != _HEADER.size:
+        return None
+    header = _HEADER.unpack(data)
+    if header[0] != CACHE_MAGIC or header[1] != CACHE_VERSION:
+        return None
+    return header
+
+
+def load(filepath, indexed):
+    '''
+    cache가 유효하면 (vertices, vertex_indices, faces_cnt), 아니면 None
+    '''
+    path = cache_path(filepath, indexed)
+    try:
+        stat = os.stat(filepath)
+        with open(path, 'rb') as f:
+            header = _read_header(f)
+            if header is None:
+                return None
+            _, _, cached_indexed, size, mtime_ns, digest, vertex_cnt, index_cnt, face_entry_cnt = header
+            if bool(cached_indexed) != indexed:
+                return None
+
+            if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                # touch 등으로 mtime만 바뀐 경우: 내용이 같으면 header만 갱신해서 계속 사용
+                if size != stat.st_size or digest != file_hash(filepath):
+                    return None
+                _touch(path, stat)
+
+            faces_cnt = {}
+            for _ in range(face_entry_cnt):
+                face_size, cnt = _FACE_ENTRY.unpack(f.read(_FACE_ENTRY.size))
+                faces_cnt[face_size] = cnt
+
+            payload = np.fromfile(f, dtype=np.uint8, offset=_payload_offset(face_entry_cnt) - f.tell())
+    except (OSError, struct.error, ValueError):
+        return None
+
+    if payload.nbytes != 4 * (vertex_cnt + index_cnt):
+        return None
+    vertices = payload[:4 * vertex_cnt].view('f4')
+    vertex_indices = payload[4 * vertex_cnt:].view('u4')
+    return vertices, vertex_indices, faces_cnt
+
+
+def _touch(path, stat):
+    with open(path, 'r+b') as f:
+        header = list(_read_header(f))
+        header[4] = stat.st_mtime_ns
+        f.seek(0)
+        f.write(_HEADER.pack(*header))
+
+
+def save(filepath, indexed, result):
+    '''
+    파싱 결과를 CACHE_DIR의 cache 파일에 쓴다. 쓸 수 없는 위치라면 조용히 넘어간다.
+    return: 저장에 성공했는지
+    '''
+    vertices, vertex_indices, faces_cnt = result
+    path = cache_path(filepath, indexed)
+    tmp_path = path + '.tmp'
+    try:
+        stat = os.stat(filepath)
+        digest = file_hash(filepath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, int(indexed), stat.st_size, stat.st_mtime_ns,
+                                 digest, len(vertices), len(vertex_indices), len(faces_cnt)))
+            for face_size, cnt in sorted(faces_cnt.items()):
+                f.write(_FACE_ENTRY.pack(face_size, cnt))
+            f.write(b'\0' * (_payload_offset(len(faces_cnt)) - f.tell()))
+            np.ascontiguousarray(vertices, dtype='<f4').tofile(f)
+            np.ascontiguousarray(vertex_indices, dtype='<u4').tofile(f)
+        # 쓰는 도중에 실패한 cache를 읽지 않도록 다 쓴 뒤에 교체
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+    return True
@@ -0,0 +1,85 @@
+'''
+obj mesh registry
+
+같은 obj 파일을 여러 node에서 쓰는 경우(ex. pokeball.obj x 4),
+파싱 / VBO / VAO를 한 번만 만들고 하나의 Mesh를 reference count로 공유한다.
+
+- key: 원본 내용의 sha1. 경로가 달라도 내용이 같으면 같은 Mesh를 돌려준다.
+- 경로 -> sha1은 (크기, mtime)이 바뀌지 않는 동안 다시 계산하지 않는다.
+'''
+import os
+from load_obj import Mesh
+import mesh_cache
+
+
+class MeshRegistry:
+    def __init__(self):
+        # content hash -> [Mesh, reference count]
+        self.__entries = {}
+        # canonical path -> (size, mtime_ns, content hash)
+        self.__path_hashes = {}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def content_key(self, filepath):
+        path = os.path.realpath(filepath)
+        stat = os.stat(path)
+        cached = self.__path_hashes.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        digest = mesh_cache.file_hash(path)
+        self.__path_hashes[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    def get(self, key):
+        entry = self.__entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def acquire(self, filepath, show_face_cnt = False):
+        '''
+        filepath의 Mesh를 돌려주고 reference count를 1 올린다.
+        처음 요청된 내용이면 파싱하고 VAO까지 준비한다. (GL context가 있는 thread에서 호출)
+        '''
+        key = self.content_key(filepath)
+        mesh = self.get(key)
+        if mesh is None:
+            mesh = Mesh()
+            mesh.parse_obj_str(filepath, show_face_cnt)
+        elif show_face_cnt:
+            mesh.print_face_cnt()
+
+        return self.acquire_parsed(key, mesh)
+
+    def acquire_parsed(self, key, mesh):
+        '''
+        다른 thread에서 파싱만 끝난 mesh를 등록한다. (GL context가 있는 thread에서 호출)
+        같은 key가 이미 등록되어 있으면 그 Mesh를 공유한다.
+        '''
+        entry = self.__entries.get(key)
+        if entry is None:
+            mesh.prepare_vao_mesh()
+            entry = [mesh, 0]
+            self.__entries[key] = entry
+
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, mesh):
+        '''
+        reference count를 1 내리고, 아무도 쓰지 않으면 GPU buffer를 해제한다.
+        '''
+        for key, entry in self.__entries.items():
+            if entry[0] is mesh:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    mesh.delete_vao_mesh()
+                    del self.__entries[key]
+                return
+
+    def ref_count(self, mesh):
+        for entry in self.__entries.values():
+            if entry[0] is mesh:
+                return entry[1]
+        return 0
@@ -4,16 +4,18 @@ import glm
 import ctypes
 import numpy as np
 from node import Node
-from load_obj import Mesh
+from mesh_registry import MeshRegistry
+from common.frustum import transform_bounds
 import os
 
 class ModelLoader:
-    def __init__(self):
+    def __init__(self, registry=None):
         self.__is_animating = False
         self.__is_fill = False
 
         self.__filepath = []
-        self.__meshes = []
+        # 같은 obj 파일을 쓰는 node들은 registry를 통해 하나의 Mesh(VAO)를 공유
+        self.__registry = registry if registry is not None else MeshRegistry()
 
         current_dir, file = os.path.split(os.path.abspath(__file__))
 
@@ -68,16 +70,29 @@ class ModelLoader:
         self.__animating_nodes.append(child2_1)
         self.__animating_nodes.append(child2_2)
 
-        for file in self.__animating_files:
-            mesh = Mesh()
-            mesh.parse_obj_str(file, False)
-            mesh.prepare_vao_mesh()
-            self.__meshes.append(mesh)
+        for node, file in zip(self.__animating_nodes, self.__animating_files):
+            node.mesh = self.__registry.acquire(file)
 
         return self.__animating_nodes
+
+    def release_animating(self):
+        '''
+        prepare_animating에서 가져온 mesh들을 registry에 돌려주고 animating mode를 끈다. (다른 model을 열 때)
+        다른 곳에서 쓰지 않는 mesh는 GPU buffer가 해제되고, 다시 animating mode로 들어가면 prepare_animating부터 한다.
+        '''
+        for node in self.__animating_nodes:
+            if node.mesh is not None:
+                self.__registry.release(node.mesh)
+                node.mesh = None
+        self.__animating_nodes = []
+        self.__is_animating = False
         
-    def draw_hierarchical(self, MVP, MVP_loc, M_loc):
-        t = glfwGetTime()
+    def update_hierarchical(self, t=None):
+        '''
+        t: animation 시간(초). None이면 glfwGetTime() (offline rendering에서는 frame 번호로 정한 시간을 넘긴다)
+        '''
+        if t is None:
+            t = glfwGetTime()
 
         self.__animating_nodes[0].set_transform(glm.translate(glm.vec3(0.4 * glm.sin(t), -0.04, 0.4 * glm.cos(t))))
         self.__animating_nodes[1].set_transform(glm.rotate(t, glm.vec3(0, 1, 0)) * glm.translate(glm.vec3(0, 1.0 + 0.05 * glm.sin(t), -2.5)))
@@ -89,12 +104,46 @@ class ModelLoader:
 
         self.__animating_nodes[0].update_tree_global_transform()
 
-        self.draw_nodes(MVP, MVP_loc, M_loc)
+    def draw_hierarchical(self, M_loc, N_loc, t=None, bind_lights=None, culler=None):
+        self.update_hierarchical(t)
+        self.draw_nodes(M_loc, N_loc, bind_lights, culler)
 
-    def draw_nodes(self, MVP, MVP_loc, M_loc):        
-        nodes_cnt = len(self.__meshes)
-        for idx in range(nodes_cnt):
-            self.__meshes[idx].draw_node(self.__animating_nodes[idx], MVP, MVP_loc, M_loc)
+    def draw_hierarchical_instanced(self, t=None, bind_lights=None, culler=None):
+        self.update_hierarchical(t)
+        self.draw_nodes_instanced(bind_lights, culler)
 
+    def visible_nodes(self, culler=None):
+        '''
+        mesh가 있는 node와 그 model matrix 목록. culler(frustum.FrustumCuller)가 있으면
+        모든 node의 bounding volume을 한 번에 검사해서 화면에 보이는 node만 남긴다.
+        '''
+        nodes = [node for node in self.__animating_nodes if node.mesh is not None]
+        model_matrices = [node.get_global_transform() * glm.scale(node.get_scale()) for node in nodes]
+        if culler is None or not nodes:
+            return nodes, model_matrices
+
+        Ms = np.array([np.array(M) for M in model_matrices], dtype=np.float64)
+        centers, radii, lows, highs = (np.array(values) for values in zip(*(node.mesh.local_bounds() for node in nodes)))
+        is_visible = culler.visible(*transform_bounds(Ms, centers, radii, lows, highs))
+        return ([node for node, visible in zip(nodes, is_visible) if visible],
+                [M for M, visible in zip(model_matrices, is_visible) if visible])
+
+    def draw_nodes(self, M_loc, N_loc, bind_lights=None, culler=None):
+        '''
+        bind_lights: (centers, radii)를 받는 callback (LightManager.bind_object). node마다 닿는 light만 쓴다.
+        culler: frustum.FrustumCuller. 화면 밖의 node는 draw call을 하지 않는다.
+        '''
+        for node, M in zip(*self.visible_nodes(culler)):
+            node.mesh.draw_mesh(M, M_loc, N_loc, bind_lights)
 
+    def draw_nodes_instanced(self, bind_lights=None, culler=None):
+        '''
+        같은 Mesh를 쓰는 node들을 묶어서, Mesh마다 한 번의 instanced draw call로 그린다.
+        (instanced shader program이 사용 중이어야 함, VP는 camera UBO에서)
+        '''
+        model_matrices = {}
+        for node, M in zip(*self.visible_nodes(culler)):
+            model_matrices.setdefault(node.mesh, []).append(M)
 
+        for mesh, Ms in model_matrices.items():
+            mesh.draw_instanced(Ms, bind_lights)
@@ -5,7 +5,7 @@ import ctypes
 import numpy as np
 
 class Node:
-    def __init__(self, parent, scale):
+    def __init__(self, parent, scale, mesh=None):
         # hierarchy
         self.parent = parent
         self.children = []
@@ -18,6 +18,8 @@ class Node:
 
         # shape
         self.scale = scale
+        # node는 Mesh를 소유하지 않고 MeshRegistry가 공유하는 Mesh를 참조만 한다
+        self.mesh = mesh
 
     def set_transform(self, transform):
         self.transform = transform
@@ -0,0 +1,636 @@
+'''
+obj 파일 bulk parser
+
+줄 단위로 split()/float()를 호출하는 대신,
+1. 파일 전체를 bytes로 읽어서 줄의 prefix('v', 'vn', 'f')별로 분류하고
+2. 각 그룹을 하나의 문자열로 합쳐 np.fromstring으로 한 번에 숫자로 변환한다.
+
+결과는 Mesh.parse_obj_str이 만들던 것과 같은 interleaved (pos, color, normal) 배열이다.
+'''
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+_V_KEYS = (b'v ', b'v\t')
+_VN_KEYS = (b'vn ', b'vn\t')
+_F_KEYS = (b'f ', b'f\t')
+
+# obj vertex 하나당 float 개수: position(3) + color(3) + normal(3)
+VERTEX_STRIDE = 9
+
+# streaming mode에서 한 번에 읽는 byte 수
+STREAMING_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _to_array(text, dtype):
+    # sep=' '는 줄바꿈을 포함한 모든 whitespace를 구분자로 취급한다
+    if len(text) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.fromstring(text, dtype=dtype, sep=' ')
+
+
+def _token_starts(buf):
+    # token의 시작 위치: 공백이 아닌 문자 중 바로 앞이 공백인 것
+    is_space = (buf == ord(' ')) | (buf == ord('\t')) | (buf == ord('\n')) | (buf == ord('\r'))
+    token_starts = ~is_space
+    token_starts[1:] &= is_space[:-1]
+    return token_starts
+
+
+def _tokens_per_line(text, line_cnt):
+    '''
+    줄마다 whitespace로 구분된 token 개수를 센다.
+    token의 시작 위치(공백이 아닌 문자 중 바로 앞이 공백인 것)를 그 위치까지의 줄바꿈 개수로 묶어서 센다.
+    '''
+    buf = np.frombuffer(text, dtype=np.uint8)
+    token_starts = _token_starts(buf)
+    line_ids = np.cumsum(buf == ord('\n'))
+    return np.bincount(line_ids[token_starts], minlength=line_cnt)[:line_cnt].astype(np.int64)
+
+
+def _slashes_per_token(text, token_cnt):
+    '''
+    token(face의 corner)마다 '/' 개수를 센다. '/'는 공백이 아니므로 항상 어떤 token 안에 있다.
+    '''
+    buf = np.frombuffer(text, dtype=np.uint8)
+    token_starts = _token_starts(buf)
+    token_ids = np.cumsum(token_starts) - 1
+    return np.bincount(token_ids[buf == ord('/')], minlength=token_cnt)[:token_cnt]
+
+
+def _check_widths(widths, kind):
+    # 값이 3개보다 적은 줄은 다음 줄의 값을 읽게 되므로 조용히 넘어가지 않는다
+    if (widths < 3).any():
+        raise ValueError("'%s' record %d has fewer than 3 components" % (kind, int(np.argmax(widths < 3)) + 1))
+
+
+def split_lines(data):
+    '''
+    bytes를 줄 단위로 나눈다.
+    들여쓰기 된 줄이 있을 때만 lstrip을 해서 대부분의 파일은 추가 비용이 없다.
+    '''
+    lines = data.split(b'\n')
+    if data.startswith((b' ', b'\t')) or b'\n ' in data or b'\n\t' in data:
+        lines = [line.lstrip() for line in lines]
+    return lines
+
+
+def split_obj_records(lines):
+    '''
+    prefix별로 줄을 분류하고, prefix를 떼어낸 body만 남긴다.
+    'vn'은 'vn ' 뒤의 body, 'v'/'f'는 'v '/'f ' 뒤의 body.
+    '''
+    v_bodies = [line[2:] for line in lines if line[:2] in _V_KEYS]
+    vn_bodies = [line[3:] for line in lines if line[:3] in _VN_KEYS]
+    f_bodies = [line[2:] for line in lines if line[:2] in _F_KEYS]
+    return v_bodies, vn_bodies, f_bodies
+
+
+def parse_vertices(v_bodies):
+    '''
+    'v x y z' 또는 'v x y z r g b'를 (n, 3) position, (n, 3) color로 변환한다.
+    color가 없는 vertex는 흰색(1, 1, 1)이다.
+    '''
+    n = len(v_bodies)
+    positions = np.zeros((n, 3), dtype='f4')
+    colors = np.ones((n, 3), dtype='f4')
+    if n == 0:
+        return positions, colors
+
+    # float()와 같은 결과를 얻기 위해 double로 파싱한 뒤 f4로 변환
+    text = b'\n'.join(v_bodies)
+    values = _to_array(text, np.float64)
+    # 전체 값 개수만 보면 줄마다 개수가 다른데 합이 우연히 3n / 6n인 경우를 놓치므로 줄마다 센다
+    widths = _tokens_per_line(text, n)
+    _check_widths(widths, 'v')
+
+    if (widths == 3).all() and values.size == 3 * n:
+        positions[:] = values.reshape(n, 3)
+    elif (widths == 6).all() and values.size == 6 * n:
+        values = values.reshape(n, 6)
+        positions[:] = values[:, 0:3]
+        colors[:] = values[:, 3:6]
+    else:
+        # 줄마다 component 개수가 다른 경우 (x y z w, 일부만 color 등)
+        starts = np.cumsum(widths) - widths
+        positions[:] = values[starts[:, None] + np.arange(3)]
+        has_color = widths == 6
+        colors[has_color] = values[starts[has_color, None] + np.arange(3, 6)]
+
+    return positions, colors
+
+
+def parse_vnormals(vn_bodies):
+    n = len(vn_bodies)
+    if n == 0:
+        return np.zeros((0, 3), dtype='f4')
+    text = b'\n'.join(vn_bodies)
+    values = _to_array(text, np.float64)
+    widths = _tokens_per_line(text, n)
+    _check_widths(widths, 'vn')
+    if (widths == 3).all() and values.size == 3 * n:
+        return values.reshape(n, 3).astype('f4')
+
+    # 줄마다 component 개수가 다른 경우 (뒤에 값이 더 붙은 줄 등): 줄마다 앞의 3개만 사용
+    starts = np.cumsum(widths) - widths
+    return values[starts[:, None] + np.arange(3)].astype('f4')
+
+
+def _parse_face_corners_slow(text, corner_cnt):
+    # v, v/vt, v//vn, v/vt/vn 형식이 섞여있는 파일을 위한 fallback
+    v_raw = np.zeros(corner_cnt, dtype=np.int64)
+    vn_raw = np.zeros(corner_cnt, dtype=np.int64)
+    for i, corner in enumerate(text.split()):
+        parsed_face_data = corner.split(b'/')
+        v_raw[i] = int(parsed_face_data[0])
+        if len(parsed_face_data) == 3:
+            vn_raw[i] = int(parsed_face_data[2])
+    return v_raw, vn_raw
+
+
+def parse_faces(f_bodies):
+    '''
+    face 데이터를 corner 단위의 raw index 배열로 변환한다.
+    return: (v_raw, vn_raw, corner_counts)
+        - v_raw, vn_raw: obj 파일에 적힌 그대로의 index (1부터 시작, 음수는 상대 index, vn이 없으면 0)
+        - corner_counts: face마다 vertex 개수
+    '''
+    text = b'\n'.join(f_bodies)
+    corner_counts = _tokens_per_line(text, len(f_bodies))
+    corner_cnt = int(corner_counts.sum())
+    if corner_cnt == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, corner_counts
+
+    # v//vn을 v/0/vn으로 바꾸면 모든 corner의 '/' 개수가 형식별로 일정해진다
+    text = text.replace(b'//', b'/0/')
+    # 형식이 섞인 파일은 '/'의 전체 개수가 우연히 맞을 수 있으므로 corner마다 센다
+    slashes = _slashes_per_token(text, corner_cnt)
+    component_cnt = int(slashes[0]) + 1
+    if component_cnt > 3 or (slashes != slashes[0]).any():
+        component_cnt = 0
+
+    values = None
+    if component_cnt > 0:
+        values = _to_array(text.replace(b'/', b' '), np.int64)
+
+    if values is None or values.size != component_cnt * corner_cnt:
+        v_raw, vn_raw = _parse_face_corners_slow(text.replace(b'/0/', b'//'), corner_cnt)
+        return v_raw, vn_raw, corner_counts
+
+    values = values.reshape(corner_cnt, component_cnt)
+    v_raw = values[:, 0]
+    if component_cnt == 3:
+        vn_raw = values[:, 2]
+    else:
+        vn_raw = np.zeros(corner_cnt, dtype=np.int64)
+    return v_raw, vn_raw, corner_counts
+
+
+def records_before_faces(lines, keys):
+    '''
+    각 'f' 줄 이전에 나온 keys 레코드('v' 또는 'vn')의 개수.
+    음수(상대) index를 풀 때만 필요하다.
+    '''
+    is_record = np.fromiter((line[:len(keys[0])] in keys for line in lines), dtype=bool, count=len(lines))
+    is_face = np.fromiter((line[:2] in _F_KEYS for line in lines), dtype=bool, count=len(lines))
+    return np.cumsum(is_record)[is_face]
+
+
+def resolve_indices(raw, corner_counts, before=None, missing=-1):
+    '''
+    obj index를 0부터 시작하는 배열 index로 바꾼다.
+    - 양수: 1부터 시작하므로 -1
+    - 음수: 해당 face 이전까지 나온 레코드 개수 기준의 상대 index
+    - 0: 값이 없음 (missing)
+    '''
+    resolved = raw - 1
+    negative = raw < 0
+    if negative.any():
+        before_per_corner = np.repeat(before, corner_counts)
+        resolved[negative] = before_per_corner[negative] + raw[negative]
+    resolved[raw == 0] = missing
+    return resolved
+
+
+def triangulate(corner_counts):
+    '''
+    polygon을 첫 vertex 기준의 triangle fan (0, i+1, i+2)으로 나눈다.
+    return: triangle corner들의 index (corner 배열 기준), 길이는 3 * triangle 개수
+    '''
+    tri_counts = np.maximum(corner_counts - 2, 0)
+    tri_cnt = int(tri_counts.sum())
+    starts = np.cumsum(corner_counts) - corner_counts
+
+    tri_starts = np.cumsum(tri_counts) - tri_counts
+    face_of_tri = np.repeat(np.arange(len(corner_counts)), tri_counts)
+    k = np.arange(tri_cnt) - np.repeat(tri_starts, tri_counts)
+    base = starts[face_of_tri]
+
+    corners = np.empty((tri_cnt, 3), dtype=np.int64)
+    corners[:, 0] = base
+    corners[:, 1] = base + k + 1
+    corners[:, 2] = base + k + 2
+    return corners.ravel()
+
+
+def count_faces(corner_counts):
+    '''
+    {face의 vertex 개수: face 개수}
+    '''
+    sizes, cnts = np.unique(corner_counts, return_counts=True)
+    return {int(size): int(cnt) for size, cnt in zip(sizes, cnts)}
+
+
+def build_vbo_data(positions, colors, vnormals, v_idx, vn_idx, out=None):
+    '''
+    triangle corner마다 (pos, color, normal) 9개의 float을 갖는 flat 배열을 만든다.
+    normal이 없는 corner(vn_idx == -1)는 (0, 0, 0)
+    out이 주어지면 (len(v_idx), 9) 크기의 out에 바로 채운다.
+    '''
+    vertices = out if out is not None else np.empty((len(v_idx), VERTEX_STRIDE), dtype='f4')
+    vertices[:, 0:3] = positions[v_idx]
+    vertices[:, 3:6] = colors[v_idx]
+    vertices[:, 6:9] = 0.
+
+    has_normal = vn_idx >= 0
+    vertices[has_normal, 6:9] = vnormals[vn_idx[has_normal]]
+    return vertices.ravel()
+
+
+def build_indexed_vbo_data(positions, colors, vnormals, v_idx, vn_idx):
+    '''
+    (v, vn) 쌍이 같은 corner들을 하나의 vertex로 합친 indexed mesh를 만든다.
+    return: (vertices, indices)
+        - vertices: 중복이 제거된 interleaved (pos, color, normal) f4 배열
+        - indices: triangle corner마다 vertices의 index (u4, EBO용)
+    '''
+    # (v, vn) 쌍을 int64 key 하나로 합친 뒤 np.unique로 중복 제거. vn이 없으면(-1) 0번 slot 사용
+    keys = v_idx.astype(np.int64) * (len(vnormals) + 1) + (vn_idx.astype(np.int64) + 1)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    vertices = build_vbo_data(positions, colors, vnormals, v_idx[first], vn_idx[first])
+    return vertices, inverse.reshape(-1).astype('u4')
+
+
+def build_indexed_vbo_data_blocked(positions, colors, vnormals, v_idx, vn_idx, build_block):
+    '''
+    build_indexed_vbo_data와 같은 결과를 build_block개의 corner씩 나눠서 만든다. (streaming mode용)
+    corner 전체 크기의 int64 key 배열이나 np.unique의 임시 배열을 만들지 않고,
+    1. block마다 unique key를 구해서 지금까지의 (정렬된) unique key들과 합치고
+    2. block마다 searchsorted로 index를 채운다.
+    vertex는 key에서 (v, vn)을 다시 풀어서 만들기 때문에 unique vertex 개수만큼만 메모리를 쓴다.
+    '''
+    slot_cnt = len(vnormals) + 1
+    corner_cnt = len(v_idx)
+
+    def block_keys(start):
+        end = min(start + build_block, corner_cnt)
+        return v_idx[start:end].astype(np.int64) * slot_cnt + (vn_idx[start:end].astype(np.int64) + 1)
+
+    unique_keys = np.zeros(0, dtype=np.int64)
+    for start in range(0, corner_cnt, build_block):
+        unique_keys = np.union1d(unique_keys, block_keys(start))
+
+    indices = np.empty(corner_cnt, dtype='u4')
+    for start in range(0, corner_cnt, build_block):
+        indices[start:start + build_block] = np.searchsorted(unique_keys, block_keys(start))
+
+    vertices = np.empty((len(unique_keys), VERTEX_STRIDE), dtype='f4')
+    for start in range(0, len(unique_keys), build_block):
+        keys = unique_keys[start:start + build_block]
+        build_vbo_data(positions, colors, vnormals, keys // slot_cnt, keys % slot_cnt - 1,
+                       vertices[start:start + build_block])
+    return vertices.ravel(), indices
+
+
+def parse_obj_block(data, v_offset=0, vn_offset=0):
+    '''
+    줄 단위로 끊긴 obj 텍스트 한 덩어리를 파싱한다.
+    v_offset, vn_offset: 이 덩어리 이전에 나온 'v', 'vn' 레코드 개수 (음수 index를 풀 때 사용)
+    return: (positions, colors, vnormals, v_idx, vn_idx, corner_counts)
+        - v_idx, vn_idx: triangle corner마다의 0부터 시작하는 전역 index
+    '''
+    lines = split_lines(data)
+    v_bodies, vn_bodies, f_bodies = split_obj_records(lines)
+
+    positions, colors = parse_vertices(v_bodies)
+    vnormals = parse_vnormals(vn_bodies)
+    v_raw, vn_raw, corner_counts = parse_faces(f_bodies)
+
+    v_before = vn_before = None
+    if (v_raw < 0).any():
+        v_before = records_before_faces(lines, _V_KEYS) + v_offset
+    if (vn_raw < 0).any():
+        vn_before = records_before_faces(lines, _VN_KEYS) + vn_offset
+
+    v_idx = resolve_indices(v_raw, corner_counts, v_before)
+    vn_idx = resolve_indices(vn_raw, corner_counts, vn_before)
+
+    tri_corners = triangulate(corner_counts)
+    return positions, colors, vnormals, v_idx[tri_corners], vn_idx[tri_corners], corner_counts
+
+
+def _finish(positions, colors, vnormals, v_idx, vn_idx, corner_counts, indexed, build_block=None):
+    if indexed:
+        if build_block is None:
+            vertices, indices = build_indexed_vbo_data(positions, colors, vnormals, v_idx, vn_idx)
+        else:
+            vertices, indices = build_indexed_vbo_data_blocked(positions, colors, vnormals, v_idx, vn_idx, build_block)
+        return vertices, indices, count_faces(corner_counts)
+
+    if build_block is None:
+        vertices = build_vbo_data(positions, colors, vnormals, v_idx, vn_idx)
+    else:
+        # 큰 임시 배열이 생기지 않도록 build_block개의 corner씩 채운다
+        corner_cnt = len(v_idx)
+        vertices = np.empty((corner_cnt, VERTEX_STRIDE), dtype='f4')
+        for start in range(0, corner_cnt, build_block):
+            end = min(start + build_block, corner_cnt)
+            build_vbo_data(positions, colors, vnormals, v_idx[start:end], vn_idx[start:end], vertices[start:end])
+        vertices = vertices.ravel()
+    return vertices, v_idx.astype('u4'), count_faces(corner_counts)
+
+
+def parse_obj_bytes(data, indexed=False):
+    '''
+    return: (vertices, vertex_indices, faces_cnt)
+        - vertices: interleaved (pos, color, normal) f4 배열
+        - vertex_indices: triangle corner마다의 vertex index (u4)
+            indexed=False: obj 파일의 vertex index, vertices는 corner마다 펼쳐진 배열
+            indexed=True: 중복 제거된 vertices의 index (EBO용)
+        - faces_cnt: {face의 vertex 개수: face 개수}
+    '''
+    positions, colors, vnormals, v_idx, vn_idx, corner_counts = parse_obj_block(data)
+    return _finish(positions, colors, vnormals, v_idx, vn_idx, corner_counts, indexed)
+
+
+def parse_obj_file(filepath, indexed=False):
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    return parse_obj_bytes(data, indexed)
+
+
+class GrowableArray:
+    '''
+    미리 할당해두고 부족하면 2배씩 늘리는 typed numpy buffer.
+    python list에 원소를 하나씩 append하는 대신 block 단위로 extend한다.
+    '''
+    def __init__(self, dtype, width=1, capacity=1024):
+        self.__width = width
+        self.__size = 0
+        self.__buffer = np.empty((capacity, width), dtype=dtype)
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def nbytes(self):
+        return self.__buffer.nbytes
+
+    def extend(self, block):
+        block = np.asarray(block).reshape(-1, self.__width)
+        required = self.__size + len(block)
+        if required > len(self.__buffer):
+            capacity = max(required, 2 * len(self.__buffer))
+            grown = np.empty((capacity, self.__width), dtype=self.__buffer.dtype)
+            grown[:self.__size] = self.__buffer[:self.__size]
+            self.__buffer = grown
+        self.__buffer[self.__size:required] = block
+        self.__size = required
+
+    def view(self):
+        # 복사하지 않고 채워진 부분만 보여준다
+        if self.__width == 1:
+            return self.__buffer[:self.__size, 0]
+        return self.__buffer[:self.__size]
+
+
+def iter_chunks(f, chunk_size):
+    '''
+    파일을 chunk_size byte씩 읽되, 항상 줄의 끝에서 끊어서 yield한다.
+    '''
+    remainder = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        cut = chunk.rfind(b'\n') + 1
+        if cut == 0:
+            remainder = chunk
+            continue
+        remainder = chunk[cut:]
+        yield chunk[:cut]
+    if remainder:
+        yield remainder
+
+
+def iter_progress(chunks, total_bytes, progress):
+    read_bytes = 0
+    for chunk in chunks:
+        read_bytes += len(chunk)
+        yield chunk
+        progress(read_bytes, total_bytes)
+
+
+def iter_obj_blocks(chunks):
+    '''
+    chunk마다 parse_obj_block을 호출하면서, 지금까지 나온 'v'/'vn' 개수를 offset으로 넘겨준다.
+    '''
+    v_offset = 0
+    vn_offset = 0
+    for chunk in chunks:
+        block = parse_obj_block(chunk, v_offset, vn_offset)
+        v_offset += len(block[0])
+        vn_offset += len(block[2])
+        yield block
+
+
+def peak_rss_mb():
+    '''
+    프로세스의 최대 RSS (MB). 알 수 없는 플랫폼(Windows)에서는 None
+    '''
+    # linux: ru_maxrss는 exec 이전 process의 값을 물려받으므로 VmHWM을 우선 사용
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 byte, 그 외는 KB 단위
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def parse_obj_file_streaming(filepath, indexed=False, chunk_size=STREAMING_CHUNK_SIZE, progress=None, build_block=1 << 20):
+    '''
+    파일 전체를 메모리에 올리지 않고 chunk_size 단위로 읽으면서 파싱한다.
+    파싱 결과는 GrowableArray에 모아두고, 마지막에 build_block개의 corner씩 vbo 배열을 채운다.
+    progress: (읽은 byte 수, 전체 byte 수)를 받는 callback
+    return: parse_obj_file과 같음
+    '''
+    positions = GrowableArray('f4', 3)
+    colors = GrowableArray('f4', 3)
+    vnormals = GrowableArray('f4', 3)
+    v_idx = GrowableArray('i4')
+    vn_idx = GrowableArray('i4')
+    corner_counts = GrowableArray('i4')
+
+    total_bytes = os.path.getsize(filepath)
+
+    with open(filepath, 'rb') as f:
+        chunks = iter_chunks(f, chunk_size)
+        if progress is not None:
+            chunks = iter_progress(chunks, total_bytes, progress)
+
+        for block in iter_obj_blocks(chunks):
+            positions.extend(block[0])
+            colors.extend(block[1])
+            vnormals.extend(block[2])
+            v_idx.extend(block[3])
+            vn_idx.extend(block[4])
+            corner_counts.extend(block[5])
+
+    return _finish(positions.view(), colors.view(), vnormals.view(), v_idx.view(), vn_idx.view(),
+                   corner_counts.view(), indexed, build_block)
+
+
+def split_byte_ranges(filepath, parts):
+    '''
+    파일을 parts개의 byte 구간으로 나눈다. 각 구간은 줄의 시작에서 시작해서 줄의 끝에서 끝난다.
+    '''
+    total_bytes = os.path.getsize(filepath)
+    bounds = [0]
+    with open(filepath, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(total_bytes * i // parts, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), total_bytes))
+    bounds.append(total_bytes)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _read_range(filepath, start, end):
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def count_records(data):
+    '''
+    텍스트 덩어리 안의 'v', 'vn' 레코드 개수
+    '''
+    if data.startswith((b' ', b'\t')) or b'\n ' in data or b'\n\t' in data:
+        lines = split_lines(data)
+        return (sum(1 for line in lines if line[:2] in _V_KEYS),
+                sum(1 for line in lines if line[:3] in _VN_KEYS))
+
+    data = b'\n' + data
+    return (data.count(b'\nv ') + data.count(b'\nv\t'),
+            data.count(b'\nvn ') + data.count(b'\nvn\t'))
+
+
+def _count_range(args):
+    filepath, start, end = args
+    return count_records(_read_range(filepath, start, end))
+
+
+def _parse_range(args):
+    filepath, start, end, v_offset, vn_offset = args
+    return parse_obj_block(_read_range(filepath, start, end), v_offset, vn_offset)
+
+
+def parse_obj_file_parallel(filepath, indexed=False, workers=None, use_threads=False, parts=None):
+    '''
+    파일을 줄 경계에서 byte 구간으로 나눠서 여러 process(또는 thread)에서 동시에 파싱한다.
+    1. 구간마다 'v', 'vn' 레코드 개수를 세어서 각 구간의 전역 offset을 구하고
+    2. offset을 넘겨서 구간마다 parse_obj_block을 실행 (음수 index도 전역 index로 풀림)
+    3. 결과를 구간 순서대로 이어붙인다.
+    return: parse_obj_file과 같음
+    '''
+    workers = workers or os.cpu_count() or 1
+    ranges = split_byte_ranges(filepath, parts or workers)
+
+    executor_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        counts = list(executor.map(_count_range, [(filepath, start, end) for start, end in ranges]))
+
+        v_offsets = np.cumsum([0] + [cnt[0] for cnt in counts])
+        vn_offsets = np.cumsum([0] + [cnt[1] for cnt in counts])
+        jobs = [(filepath, start, end, int(v_offsets[i]), int(vn_offsets[i])) for i, (start, end) in enumerate(ranges)]
+        blocks = list(executor.map(_parse_range, jobs))
+
+    if not blocks:
+        blocks = [parse_obj_block(b'')]
+
+    positions, colors, vnormals, v_idx, vn_idx, corner_counts = [
+        np.concatenate([block[i] for block in blocks]) for i in range(6)
+    ]
+    return _finish(positions, colors, vnormals, v_idx, vn_idx, corner_counts, indexed)
+
+
+def parse_obj_file_naive(filepath):
+    '''
+    기존의 줄 단위 파서. bench_obj.py에서 결과 비교 및 성능 비교용으로만 사용한다.
+    '''
+    faces_cnt = {}
+
+    with open(filepath, 'r') as f:
+        lines = f.readlines()
+
+    tmp_vertex_pos = []
+    tmp_vertex_colors = []
+    tmp_vnormals = []
+
+    face_vertex_indices = []
+    face_vnormal_indices = []
+
+    for line in lines:
+        words = line.split()
+        if len(words) < 1:
+            continue
+
+        if words[0] == 'v':
+            tmp_vertex_pos.append([float(words[1]), float(words[2]), float(words[3])])
+            if len(words) == 7:
+                tmp_vertex_colors.append([float(words[4]), float(words[5]), float(words[6])])
+            else:
+                tmp_vertex_colors.append([1., 1., 1.])
+
+        elif words[0] == 'vn':
+            tmp_vnormals.append([float(words[1]), float(words[2]), float(words[3])])
+
+        elif words[0] == 'f':
+            vertex_len = len(words) - 1
+            for i in range(1, vertex_len - 1):
+                for word in (words[1], words[i + 1], words[i + 2]):
+                    parsed_face_data = word.split('/')
+                    face_vertex_indices.append(int(parsed_face_data[0]) - 1)
+                    if len(parsed_face_data) == 3:
+                        face_vnormal_indices.append(int(parsed_face_data[2]) - 1)
+                    else:
+                        face_vnormal_indices.append(int(-1))
+
+            faces_cnt[vertex_len] = faces_cnt.get(vertex_len, 0) + 1
+
+    vbo_arr_data = []
+    for idx in range(len(face_vertex_indices)):
+        vbo_arr_data.append(tmp_vertex_pos[face_vertex_indices[idx]])
+        vbo_arr_data.append(tmp_vertex_colors[face_vertex_indices[idx]])
+        if face_vnormal_indices[idx] == -1:
+            vbo_arr_data.append([float(0), float(0), float(0)])
+        else:
+            vbo_arr_data.append(tmp_vnormals[face_vnormal_indices[idx]])
+
+    vertices = np.concatenate(np.array(vbo_arr_data, dtype='f4')) if vbo_arr_data else np.zeros(0, dtype='f4')
+    return vertices, np.array(face_vertex_indices, dtype='u4'), faces_cnt
@@ -0,0 +1,160 @@
+'''
+headless batch renderer: hierarchical model animation / obj 파일 -> 이미지 sequence / raw video
+
+window 없이 offscreen FBO에 그리고 PBO ring으로 읽어서 내보낸다. (common/offline.py, common/capture.py)
+시간은 wall clock이 아니라 출력 frame 번호로 정한다: 출력 frame i = 시간 i / fps
+    - obj 파일을 주지 않으면 hierarchical model animation (ModelLoader.draw_hierarchical의 t = i / fps)
+    - obj 파일을 주면 그 mesh를 카메라가 한 바퀴 돌면서 그린다
+
+usage:
+    python render.py -o out                              # hierarchical animation -> out/frame_00000.png ...
+    python render.py a.obj -o out/%04d.ppm --fill        # obj, PPM, fill mode
+    python render.py -o - > a.rgb                        # raw rgb24 stream을 stdout으로
+    python render.py -o "|ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - a.mp4"
+    python render.py --egl ...                           # display 없는 CPU-only 환경 (EGL / Mesa)
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import argparse
+import time
+import glm
+import numpy as np
+from OpenGL.GL import *
+import main as viewer
+from common import offline, capture
+from mesh_registry import MeshRegistry
+from model_loader import ModelLoader
+from common.camera_block import CameraBlock
+from common.lights import LightManager
+from common.frustum import FrustumCuller
+import functools
+
+# 카메라 시야각 (main.py와 같음)
+FOV = 45.0
+# grid(main.prepare_vao_grid)가 다 보이도록 far plane은 이 거리 이상
+GRID_EXTENT = 30.0
+# hierarchical animation을 보는 카메라
+ANIMATION_EYE = glm.vec3(3.5, 2.5, 4.5)
+ANIMATION_CENTER = glm.vec3(0, 0.5, 0)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='render project2 scenes without a window')
+    parser.add_argument('obj', nargs='?', default=None, help='obj file (default: the hierarchical model animation)')
+    parser.add_argument('-o', '--output', default='frames',
+                        help="image directory / pattern with %%d, '-' for raw rgb24 on stdout, '|command' for a raw video pipe")
+    parser.add_argument('--size', default='800x800', help='WIDTHxHEIGHT')
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fill', action='store_true', help='fill mode instead of wireframe')
+    parser.add_argument('--no-instancing', action='store_true', help='draw the hierarchical model node by node')
+    parser.add_argument('--egl', action='store_true', help='use an EGL context instead of a hidden glfw window')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    width, height = (int(value) for value in args.size.lower().split('x'))
+
+    context = offline.create_context(width, height, 'render')
+    if context is None:
+        print('failed to create an OpenGL context', file=sys.stderr)
+        return 1
+
+    shader_program = viewer.load_shaders(viewer.g_vertex_shader_src, viewer.g_fragment_shader_src)
+    shader_program_instanced = viewer.load_shaders(viewer.g_vertex_shader_instanced_src, viewer.g_fragment_shader_src)
+    M_loc = shader_program.location('M')
+    N_loc = shader_program.location('N')
+
+    camera_block = CameraBlock()
+    camera_block.attach(shader_program)
+    camera_block.attach(shader_program_instanced)
+
+    lights = LightManager(viewer.SCENE_LIGHTS)
+    lights.attach(shader_program)
+    lights.attach(shader_program_instanced)
+    lights.update()
+
+    vao_grid = viewer.prepare_vao_grid()
+    vao_frame = viewer.prepare_vao_frame()
+
+    registry = MeshRegistry()
+    animator = ModelLoader(registry)
+    mesh = None
+    if args.obj is not None:
+        mesh = registry.acquire(args.obj)
+        low, high = mesh.position_bounds()
+        center = glm.vec3(*((low + high) / 2))
+        radius = max(float(np.linalg.norm(high - low)) / 2, 1e-3)
+        distance = radius / np.sin(np.radians(FOV) / 2) * 1.1
+    else:
+        animator.prepare_animating()
+        center = ANIMATION_CENTER
+        distance = glm.length(ANIMATION_EYE - ANIMATION_CENTER)
+        radius = distance
+    P = glm.perspective(glm.radians(FOV), width / height, distance * 0.01, max(distance + radius * 2, GRID_EXTENT))
+
+    culler = FrustumCuller()
+
+    def draw(i):
+        t = i / args.fps
+
+        if mesh is not None:
+            # 출력 전체에 걸쳐 한 바퀴
+            angle = 2 * np.pi * i / args.frames
+            eye = center + glm.vec3(np.sin(angle), 0.5, np.cos(angle)) * distance / np.sqrt(1.25)
+        else:
+            eye = ANIMATION_EYE
+        V = glm.lookAt(eye, center, glm.vec3(0, 1, 0))
+        M = glm.mat4()
+        N = glm.mat3()
+        camera_block.update(P, V, eye)
+        culler.update(P, V)
+
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glEnable(GL_DEPTH_TEST)
+        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL if args.fill else GL_LINE)
+
+        glUseProgram(shader_program.id)
+        glUniformMatrix4fv(M_loc, 1, GL_FALSE, glm.value_ptr(M))
+        glUniformMatrix3fv(N_loc, 1, GL_FALSE, glm.value_ptr(N))
+        viewer.draw_grid(vao_grid)
+        viewer.draw_frame(vao_frame)
+
+        if mesh is not None:
+            mesh.draw_mesh(M, M_loc, N_loc, functools.partial(lights.bind_object, shader_program), culler)
+        elif args.no_instancing:
+            animator.draw_hierarchical(M_loc, N_loc, t, functools.partial(lights.bind_object, shader_program), culler)
+        else:
+            glUseProgram(shader_program_instanced.id)
+            animator.draw_hierarchical_instanced(t, functools.partial(lights.bind_object, shader_program_instanced), culler)
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            print('rendered %d / %d frames' % (done, total), file=sys.stderr)
+
+    writer = capture.open_writer(args.output, width, height, args.fps)
+    start = time.perf_counter()
+    frame_capture = offline.render_frames(args.frames, draw, writer, width, height, progress)
+    elapsed = time.perf_counter() - start
+    print('%d frames (%dx%d) in %.2f s, %.2f ms/frame' % (args.frames, width, height, elapsed, 1000 * elapsed / args.frames),
+          file=sys.stderr)
+    print(frame_capture.report(), file=sys.stderr)
+    print(culler.report(), file=sys.stderr)
+
+    offline.destroy_context(context)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+'''
+animation clip 저장소
+
+joint마다 frame마다 glm.mat4 객체를 만들어 list에 쌓아두는 대신,
+clip 하나의 모든 joint 회전을 (frames, joints, 4) float32 quaternion 배열 하나에 연속으로 저장한다.
+Euler angle -> quaternion 변환은 파싱할 때 모든 frame에 대해 한 번에 하고,
+joint의 local transform은 필요할 때 quaternion에서 다시 만들고, 최근에 만든 것은 LRU cache에 둔다.
+'''
+import sys
+import glm
+import numpy as np
+import quaternion
+
+# joint마다 cache해둘 local transform 개수
+# (멈춰있거나 render FPS가 clip FPS보다 높아서 같은 frame을 여러 번 그릴 때, scrub할 때 재사용됨)
+LOCAL_TRANSFORM_CACHE_SIZE = 256
+
+# joint 하나의 회전 channel 최대 개수 (Euler angle)
+MAX_ROTATION_CHANNELS = 3
+# Euler -> quaternion 변환을 한 번에 할 frame 수 (중간 배열 크기 제한)
+EULER_CHUNK_FRAMES = 4096
+
+
+
+def euler_order_axes(order):
+    '''
+    Node.euler_order(회전 channel의 축 순서 code, ex. 'ZXY') -> 축 index 배열 (ex. [2, 0, 1])
+    '''
+    return np.array(['XYZ'.index(axis) for axis in order], dtype=np.int64)
+
+
+class AnimationClip:
+    '''
+    rotations: (frames, joints, 4) float32 joint 회전 quaternion (w, x, y, z)
+    translations: (frames, position channel이 있는 joint 수, 3) float32 (보통 root만)
+    translation_joints: translations의 각 column이 어느 joint의 것인지 (joint index 배열)
+    joint index는 Node.index (파일에 나온 순서 = DFS 순서)
+    '''
+    def __init__(self, rotations, translations, translation_joints, frame_time, channel_cnt=0):
+        self.rotations = np.ascontiguousarray(rotations, dtype=np.float32)
+        self.translations = np.ascontiguousarray(translations, dtype=np.float32)
+        self.translation_joints = np.asarray(translation_joints, dtype=np.int64)
+        self.frame_time = frame_time
+        # 원본 MOTION 한 줄의 channel 수 (메모리 비교용)
+        self.channel_cnt = channel_cnt
+
+    @classmethod
+    def from_channels(cls, motion, joints, frame_time, chunk_frames=EULER_CHUNK_FRAMES):
+        '''
+        motion: (frames, channels) float32 MOTION 값
+        joints: Node list (index 순서). compile_channels()로 channel 순서가 이미 해석되어 있어야 한다.
+        모든 frame의 Euler angle을 joint별 회전 순서대로 quaternion으로 바꾼다. (frame 축으로 vectorized)
+        '''
+        frame_cnt = len(motion)
+        joint_cnt = len(joints)
+
+        # joint마다 (회전 channel의 motion column, 회전축). 회전 channel이 3개보다 적으면 0도 회전으로 채운다
+        columns = np.full((joint_cnt, MAX_ROTATION_CHANNELS), -1, dtype=np.int64)
+        axes = np.zeros((joint_cnt, MAX_ROTATION_CHANNELS), dtype=np.int64)
+        for joint in joints:
+            order = euler_order_axes(joint.euler_order)
+            columns[joint.index, :len(order)] = joint.rotation_columns
+            axes[joint.index, :len(order)] = order
+        has_rotation = columns >= 0
+
+        rotations = np.empty((frame_cnt, joint_cnt, 4), dtype=np.float32)
+        for start in range(0, frame_cnt, chunk_frames):
+            values = motion[start:start + chunk_frames]
+            radians = np.radians(np.where(has_rotation, values[:, columns], 0))
+            rotations[start:start + chunk_frames] = quaternion.from_euler(radians, axes)
+
+        # position channel은 있는 joint만 저장 (없는 축은 0)
+        translation_joints = [joint for joint in joints if any(column is not None for column in joint.translation_columns)]
+        translations = np.zeros((frame_cnt, len(translation_joints), 3), dtype=np.float32)
+        for k, joint in enumerate(translation_joints):
+            for axis, column in enumerate(joint.translation_columns):
+                if column is not None:
+                    translations[:, k, axis] = motion[:, column]
+
+        return cls(rotations, translations, [joint.index for joint in translation_joints], frame_time,
+                   motion.shape[1] if motion.ndim == 2 else 0)
+
+    @property
+    def frame_cnt(self):
+        return len(self.rotations)
+
+    @property
+    def joint_cnt(self):
+        return self.rotations.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.rotations.nbytes + self.translations.nbytes
+
+    def joint_translation(self, frame, joint_index):
+        '''
+        joint 하나의 position channel 값 (3,). position channel이 없으면 0
+        '''
+        slots = np.flatnonzero(self.translation_joints == joint_index)
+        if len(slots) == 0:
+            return np.zeros(3, dtype=np.float32)
+        return self.translations[frame, slots[0]]
+
+    def local_translations(self, frames):
+        '''
+        frames: frame index 배열 / slice
+        return: (F, joints, 3) 모든 joint의 position channel 값 (없으면 0)
+        '''
+        translations = self.translations[frames]
+        T = np.zeros(translations.shape[:1] + (self.joint_cnt, 3), dtype=np.float32)
+        T[:, self.translation_joints] = translations
+        return T
+
+    def sample(self, frames):
+        '''
+        frames: (F,) 소수 frame index. 마지막 frame 다음은 첫 frame으로 이어진다.
+        return: (F, joints, 4) 회전 quaternion (frame 사이는 slerp), (F, joints, 3) position channel 값 (lerp)
+        '''
+        frames = np.asarray(frames, dtype=np.float64)
+        base = np.floor(frames)
+        t = (frames - base)[:, None]
+        i0 = base.astype(np.int64) % self.frame_cnt
+        i1 = (i0 + 1) % self.frame_cnt
+
+        q = quaternion.slerp(self.rotations[i0], self.rotations[i1], t)
+        T = quaternion.lerp(self.local_translations(i0), self.local_translations(i1), t)
+        return q, T
+
+    def channel_nbytes(self):
+        # 원본 channel 값을 float32로 저장할 때의 크기
+        return self.frame_cnt * self.channel_cnt * 4
+
+    def mat4_list_nbytes(self):
+        '''
+        joint마다 frame마다 glm.mat4를 list에 저장하던 방식의 메모리 사용량 (비교용 추정치)
+        mat4 객체 크기 + list의 pointer 크기
+        '''
+        per_matrix = sys.getsizeof(glm.mat4()) + 8
+        return self.frame_cnt * self.joint_cnt * per_matrix
+
+    def memory_report(self):
+        mb = 1024 * 1024
+        compact = self.nbytes
+        mat4_list = self.mat4_list_nbytes()
+        return 'motion data: %.2f MB (quaternion + translation), %.2f MB as raw float32 channels, %.2f MB as per-frame glm.mat4 lists (x%.1f)' % (
+            compact / mb, self.channel_nbytes() / mb, mat4_list / mb, mat4_list / max(compact, 1))
+
+
+class PlaybackClock:
+    '''
+    wall time(glfwGetTime 등, 초)을 clip의 소수 frame index로 바꿔준다.
+    렌더링이 느려도 재생 속도는 실제 시간을 따라가고 (밀린 frame은 건너뜀),
+    렌더링이 clip FPS보다 빠르면 frame 사이의 소수 위치가 나온다.
+    '''
+    def __init__(self, frame_time, frame_cnt, speed=1.0):
+        self.frame_time = frame_time
+        self.frame_cnt = frame_cnt
+        self.speed = speed
+        # 마지막으로 멈추거나 재생을 시작한 순간의 clip 시간(초)과 그때의 wall time
+        self.__clip_time = 0.
+        self.__anchor = 0.
+        self.__is_running = False
+
+    @property
+    def is_running(self):
+        return self.__is_running
+
+    def time(self, now):
+        '''
+        now에서의 clip 시간(초). 재생 중이 아니면 멈춘 시간 그대로
+        '''
+        if not self.__is_running:
+            return self.__clip_time
+        return self.__clip_time + (now - self.__anchor) * self.speed
+
+    def frame(self, now):
+        '''
+        now에서의 소수 frame index [0, frame_cnt). clip 끝에서 처음으로 돌아간다.
+        '''
+        if self.frame_cnt <= 0:
+            return 0.
+        return (self.time(now) / self.frame_time) % self.frame_cnt
+
+    def start(self, now):
+        if not self.__is_running:
+            self.__anchor = now
+            self.__is_running = True
+
+    def pause(self, now):
+        if self.__is_running:
+            self.__clip_time = self.time(now)
+            self.__is_running = False
+
+    def toggle(self, now):
+        if self.__is_running:
+            self.pause(now)
+        else:
+            self.start(now)
+
+    def seek(self, frame, now):
+        '''
+        frame(소수 가능)으로 이동. 재생 중이면 거기서부터 계속 재생
+        '''
+        self.__clip_time = (frame % max(self.frame_cnt, 1)) * self.frame_time
+        self.__anchor = now
@@ -0,0 +1,80 @@
+'''
+animation blending benchmark
+
+같은 skeleton의 clip 두 개를 캐릭터 절반은 crossfade 중, 절반은 한 clip만 재생하게 두고
+blend.AnimationGraph.evaluate(모든 캐릭터의 blend + FK) 한 번에 걸리는 시간을 캐릭터 수별로 잰다.
+crossfade 중간 지점의 slerp / nlerp 결과 차이도 같이 출력한다.
+
+usage:
+    python bench_blend.py                  # 합성 skeleton
+    python bench_blend.py a.bvh b.bvh      # 같은 skeleton의 bvh 두 개
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import time
+import numpy as np
+from loader import Loader
+from blend import AnimationGraph, is_same_skeleton
+from bench_fk import write_bvh
+
+CHARACTER_COUNTS = [1, 10, 100, 200, 500, 1000]
+REPEAT = 20
+FADE_TIME = 1.0
+
+
+def ms_per_evaluate(graph, mode):
+    graph.evaluate(FADE_TIME / 2, mode)
+    start = time.perf_counter()
+    for i in range(REPEAT):
+        graph.evaluate(FADE_TIME / 2 + i / 1000, mode)
+    return 1000 * (time.perf_counter() - start) / REPEAT
+
+
+def run(filepath_a, filepath_b):
+    loaders = []
+    for filepath in (filepath_a, filepath_b):
+        new_loader = Loader()
+        new_loader.parse_bvh(filepath, None)
+        loaders.append(new_loader)
+    if not is_same_skeleton(*loaders):
+        print('%s and %s have different skeletons' % (filepath_a, filepath_b))
+        return False
+
+    graph = AnimationGraph(loaders[0])
+    clip_index = graph.add_clip(loaders[1].clip)
+    print('joints: %d  clips: %d, %d frames' % (
+        graph.fk.joint_cnt, loaders[0].clip.frame_cnt, loaders[1].clip.frame_cnt))
+
+    for count in CHARACTER_COUNTS:
+        graph.resize(count)
+        # 절반은 crossfade 중 (FADE_TIME / 2에서 가중치 0.5)
+        graph.crossfade(clip_index, 0., FADE_TIME, characters=np.arange(0, count, 2))
+
+        difference = np.abs(graph.evaluate(FADE_TIME / 2, 'slerp') - graph.evaluate(FADE_TIME / 2, 'nlerp')).max()
+        slerp_ms = ms_per_evaluate(graph, 'slerp')
+        nlerp_ms = ms_per_evaluate(graph, 'nlerp')
+        print('characters: %5d  slerp: %8.2f ms  nlerp: %8.2f ms  (%.0f characters x joints / ms)  max slerp-nlerp: %.2e' % (
+            count, slerp_ms, nlerp_ms, count * graph.fk.joint_cnt / slerp_ms, difference))
+    return True
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) == 2:
+        return 0 if run(*args) else 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepaths = [os.path.join(tmp_dir, 'clip%d.bvh' % i) for i in range(2)]
+        # seed만 다르게: 같은 구조, 다른 motion
+        for seed, filepath in enumerate(filepaths):
+            write_bvh(filepath, 300, 3, 3, seed)
+        return 0 if run(*filepaths) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+'''
+frame capture benchmark
+
+offscreen FBO에 crowd를 그리면서 frame마다 capture하는 비용(ms/frame)을 잰다.
+    - none: capture 없이 그리기만 (기준)
+    - sync: 매 frame glReadPixels로 바로 읽고 main thread에서 writer 호출
+    - ring N: capture.FrameCapture (PBO N개 + fence + writer thread)
+writer는 null(readback만)과 png(zlib 압축 + 파일 쓰기) 두 가지
+
+usage:
+    python bench_capture.py                # 보이지 않는 glfw window
+    python bench_capture.py --egl          # display 없는 환경 (EGL / Mesa)
+    python bench_capture.py --egl a.bvh
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import tempfile
+import time
+import numpy as np
+from OpenGL.GL import *
+import main as viewer
+from common import offline
+from common.capture import FrameCapture, ImageSequenceWriter, NullWriter
+from crowd import Crowd
+from common.camera_block import CameraBlock
+from common.lights import LightManager
+from render import fit_camera
+from bench_fk import write_bvh
+
+WIDTH, HEIGHT = 800, 600
+FRAME_CNT = 120
+CHARACTER_CNT = 100
+BUFFER_COUNTS = [1, 2, 3, 4]
+
+
+def make_scene(filepath):
+    loader = viewer.load_bvh(filepath, None)
+    loader.prepare_vaos_line()
+    loader.prepare_vaos_box()
+    loader.change_is_fill(True)
+
+    crowd = Crowd()
+    crowd.add_characters(loader, CHARACTER_CNT)
+    program = viewer.load_shaders(viewer.g_vertex_shader_crowd_src, viewer.g_fragment_shader_src)
+    locations = [program.location(name) for name in ('palette', 'bone_cnt', 'palette_offset')]
+    camera_block = CameraBlock()
+    camera_block.attach(program)
+    lights = LightManager(viewer.SCENE_LIGHTS)
+    lights.attach(program)
+    lights.update()
+
+    positions = loader.pose(np.arange(0, loader.clip.frame_cnt, 10))[..., :3, 3]
+    placements = np.concatenate([group.placements[:, :3, 3] for group in crowd.groups])
+    positions = (positions.reshape(1, -1, 3) + placements[:, None]).reshape(-1, 3)
+    P, V, eye = fit_camera(positions, WIDTH / HEIGHT)
+    camera_block.update(P, V, eye)
+
+    def draw(i):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glEnable(GL_DEPTH_TEST)
+        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        glUseProgram(program.id)
+        lights.bind_all(program)
+        crowd.update(i * loader.frame_time)
+        crowd.draw(*locations, True)
+
+    return loader, crowd, draw
+
+
+def ms_per_frame(draw, capture=None, sync_writer=None):
+    for i in range(3):
+        draw(i)
+    glFinish()
+
+    start = time.perf_counter()
+    for i in range(FRAME_CNT):
+        draw(i)
+        if capture is not None:
+            capture.capture(i)
+        elif sync_writer is not None:
+            glPixelStorei(GL_PACK_ALIGNMENT, 1)
+            glReadBuffer(GL_COLOR_ATTACHMENT0)
+            image = glReadPixels(0, 0, WIDTH, HEIGHT, GL_RGB, GL_UNSIGNED_BYTE)
+            sync_writer.write(i, np.frombuffer(image, np.uint8).reshape(HEIGHT, WIDTH, 3)[::-1])
+    if capture is not None:
+        capture.close()
+    glFinish()
+    return 1000 * (time.perf_counter() - start) / FRAME_CNT
+
+
+def run(filepath, output_dir):
+    loader, crowd, draw = make_scene(filepath)
+    target = offline.OffscreenTarget(WIDTH, HEIGHT)
+
+    # 처음 한 번은 shader compile, 캐시 등으로 느리므로 버린다
+    ms_per_frame(draw)
+    base_ms = ms_per_frame(draw)
+    print('%dx%d, %d characters, %d frames' % (WIDTH, HEIGHT, CHARACTER_CNT, FRAME_CNT))
+    print('%-10s %-6s %10s %10s %14s %14s' % ('capture', 'writer', 'ms/frame', 'overhead', 'render thread', 'writer thread'))
+    print('%-10s %-6s %10.2f %10s' % ('none', '-', base_ms, '-'))
+
+    writers = {
+        'null': NullWriter,
+        'png': lambda: ImageSequenceWriter(os.path.join(output_dir, 'frame_%05d.png')),
+    }
+    for writer_name, make_writer in writers.items():
+        ms = ms_per_frame(draw, sync_writer=make_writer())
+        print('%-10s %-6s %10.2f %10.2f' % ('sync', writer_name, ms, ms - base_ms))
+        for buffer_cnt in BUFFER_COUNTS:
+            capture = FrameCapture(WIDTH, HEIGHT, make_writer(), buffer_cnt)
+            ms = ms_per_frame(draw, capture)
+            print('%-10s %-6s %10.2f %10.2f %14.2f %14.2f' % (
+                'ring %d' % buffer_cnt, writer_name, ms, ms - base_ms,
+                1000 * capture.capture_time / capture.frame_cnt, 1000 * capture.write_time / capture.frame_cnt))
+
+    target.delete()
+    crowd.delete()
+    loader.delete_vaos()
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != '--egl']
+
+    context = offline.create_context(WIDTH, HEIGHT, 'bench_capture')
+    if context is None:
+        print('failed to create an OpenGL context')
+        return 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args:
+            filepath = args[0]
+        else:
+            filepath = os.path.join(tmp_dir, 'clip.bvh')
+            write_bvh(filepath, 300, 3, 3, 0)
+        run(filepath, os.path.join(tmp_dir, 'frames'))
+    offline.destroy_context(context)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
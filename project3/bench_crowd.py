@@ -0,0 +1,137 @@
+'''
+crowd playback benchmark
+
+캐릭터 수를 늘려가면서 한 frame(pose 계산 + palette upload + draw + glFinish)에 걸리는 시간을 잰다.
+    - instanced: crowd.Crowd (texture buffer 하나 + skeleton마다 instanced draw 한 번)
+    - per character: 캐릭터마다 SkeletonRenderer.draw를 호출 (캐릭터마다 palette upload + draw call)
+offline.create_context의 context(보이지 않는 glfw window 또는 EGL)에서 offscreen FBO에 그린다.
+
+usage:
+    python bench_crowd.py                 # 합성 skeleton
+    python bench_crowd.py a.bvh           # 지정한 bvh 파일
+    python bench_crowd.py --fill          # box mode로 그리기
+    python bench_crowd.py --egl           # display 없는 환경 (EGL / Mesa)
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import tempfile
+import time
+import glm
+import numpy as np
+from OpenGL.GL import *
+import main as viewer
+from common import offline
+from crowd import Crowd
+from common.camera_block import CameraBlock
+from common.lights import LightManager
+from bench_fk import write_bvh
+
+CHARACTER_COUNTS = [1, 10, 100, 500, 1000, 2000]
+FRAMES = 30
+WIDTH, HEIGHT = 800, 800
+
+
+def ms_per_frame(render):
+    render(0)
+    glFinish()
+    start = time.perf_counter()
+    for i in range(FRAMES):
+        render(i / 30)
+        glFinish()
+    return 1000 * (time.perf_counter() - start) / FRAMES
+
+
+def run(filepath, is_fill):
+    loader = viewer.load_bvh(filepath, None)
+    loader.prepare_vaos_line()
+    loader.prepare_vaos_box()
+
+    shader_crowd = viewer.load_shaders(viewer.g_vertex_shader_crowd_src, viewer.g_fragment_shader_src)
+    shader_skeleton = viewer.load_shaders(viewer.g_vertex_shader_skeleton_src, viewer.g_fragment_shader_src)
+    camera_block = CameraBlock()
+    camera_block.attach(shader_crowd)
+    camera_block.attach(shader_skeleton)
+    lights = LightManager(viewer.SCENE_LIGHTS)
+    lights.attach(shader_crowd)
+    lights.attach(shader_skeleton)
+    lights.update()
+
+    glEnable(GL_DEPTH_TEST)
+    glPolygonMode(GL_FRONT_AND_BACK, GL_FILL if is_fill else GL_LINE)
+
+    print('%s  joints: %d  frames: %d  mode: %s' % (
+        os.path.basename(filepath), loader.fk.joint_cnt, loader.clip.frame_cnt, 'box' if is_fill else 'line'))
+
+    crowd = Crowd()
+    for count in CHARACTER_COUNTS:
+        crowd.clear()
+        group = crowd.add_characters(loader, count)
+        spacing = crowd.default_spacing(loader)
+        side = np.ceil(np.sqrt(count)) * spacing
+        eye = glm.vec3(side / 2, side, -side)
+        camera_block.update(glm.perspective(glm.radians(45.0), 1, 0.5, 10 * side + 100),
+                            glm.lookAt(eye, glm.vec3(side / 2, 0, side / 2), glm.vec3(0, 1, 0)), eye)
+
+        def render_instanced(t):
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            glUseProgram(shader_crowd.id)
+            lights.bind_all(shader_crowd)
+            crowd.update(t)
+            crowd.draw(shader_crowd.location('palette'), shader_crowd.location('bone_cnt'),
+                       shader_crowd.location('palette_offset'), is_fill)
+
+        def render_per_character(t):
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            glUseProgram(shader_skeleton.id)
+            palette_loc = shader_skeleton.location('palette')
+            lights.bind_all(shader_skeleton)
+            for frame, placement in zip(group.frames(t), group.placements):
+                loader.renderer.draw(placement @ loader.pose_at(frame), palette_loc, is_fill)
+
+        instanced = ms_per_frame(render_instanced)
+        per_character = ms_per_frame(render_per_character)
+        print('characters: %5d  instanced: %8.2f ms/frame  per character: %8.2f ms/frame  (x%.1f)' % (
+            count, instanced, per_character, per_character / instanced))
+
+    crowd.delete()
+    camera_block.delete()
+    loader.delete_vaos()
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != '--egl']
+    is_fill = '--fill' in args
+    args = [arg for arg in args if arg != '--fill']
+
+    context = offline.create_context(WIDTH, HEIGHT, 'bench_crowd')
+    if context is None:
+        print('failed to create an OpenGL context', file=sys.stderr)
+        return 1
+    target = offline.OffscreenTarget(WIDTH, HEIGHT)
+
+    if args:
+        for filepath in args:
+            run(filepath, is_fill)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, 'skeleton.bvh')
+            write_bvh(filepath, 300, 3, 2)
+            run(filepath, is_fill)
+
+    target.delete()
+    offline.destroy_context(context)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
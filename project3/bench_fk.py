@@ -0,0 +1,149 @@
+'''
+forward kinematics benchmark
+
+joint별 재귀(Node.update_tree_global_transform)와 batched FK engine(fk.ForwardKinematics)의
+결과가 같은지 확인하고, 처리량을 joints x frames / s로 비교한다.
+
+usage:
+    python bench_fk.py                          # 합성 skeleton들
+    python bench_fk.py a.bvh b.bvh              # 지정한 bvh 파일들
+    python bench_fk.py --frames 2000            # 합성 clip의 frame 수 지정
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import time
+import numpy as np
+from loader import Loader
+
+# recursion은 느리기 때문에 이 frame 수까지만 잰다
+RECURSIVE_FRAME_LIMIT = 300
+MATCH_TOLERANCE = 1e-3
+
+
+def write_bvh(filepath, frames, depth, branch, seed=0):
+    '''
+    depth 단계, 단계마다 branch개로 갈라지는 skeleton과 random motion을 쓴다.
+    회전 순서는 level마다 바꿔서 여러 channel 순서를 섞는다.
+    '''
+    rng = np.random.default_rng(seed)
+    lines = ['HIERARCHY']
+    channel_cnt = [0]
+    orders = ['Zrotation Xrotation Yrotation', 'Xrotation Yrotation Zrotation', 'Yrotation Zrotation Xrotation']
+
+    def write_joint(kind, name, level):
+        pad = '  ' * level
+        offset = rng.uniform(-5, 5, 3) if kind != 'ROOT' else np.zeros(3)
+        lines.append(pad + '%s %s' % (kind, name))
+        lines.append(pad + '{')
+        lines.append(pad + '  OFFSET %.4f %.4f %.4f' % tuple(offset))
+        if kind == 'ROOT':
+            lines.append(pad + '  CHANNELS 6 Xposition Yposition Zposition ' + orders[0])
+            channel_cnt[0] += 6
+        else:
+            lines.append(pad + '  CHANNELS 3 ' + orders[level % 3])
+            channel_cnt[0] += 3
+
+        if level < depth:
+            for i in range(branch):
+                write_joint('JOINT', '%s_%d' % (name, i), level + 1)
+        else:
+            lines.append(pad + '  End Site')
+            lines.append(pad + '  {')
+            lines.append(pad + '    OFFSET 0.0 %.4f 0.0' % rng.uniform(1, 3))
+            lines.append(pad + '  }')
+        lines.append(pad + '}')
+
+    write_joint('ROOT', 'Hips', 0)
+
+    lines.append('MOTION')
+    lines.append('Frames: %d' % frames)
+    lines.append('Frame Time: 0.033333')
+    motion = rng.uniform(-90, 90, (frames, channel_cnt[0]))
+    with open(filepath, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+        np.savetxt(f, motion, fmt='%.4f')
+
+
+def recursive_global_transforms(loader, joints, frames):
+    G = np.empty((len(frames), len(joints), 4, 4), dtype=np.float32)
+    for i, frame in enumerate(frames):
+        loader.root.update_tree_global_transform(frame)
+        for j, joint in enumerate(joints):
+            G[i, j] = np.array(joint.global_transform)
+    return G
+
+
+def best_time(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(filepath):
+    loader = Loader()
+    loader.parse_bvh(filepath)
+    fk = loader.fk
+    joint_cnt = fk.joint_cnt
+    frame_cnt = fk.frame_cnt
+
+    frames = np.arange(min(frame_cnt, RECURSIVE_FRAME_LIMIT))
+    reference = recursive_global_transforms(loader, fk.joints, frames)
+    same = np.allclose(fk.global_transforms(frames), reference, atol=MATCH_TOLERANCE)
+
+    # recursion은 LRU cache가 채워진 상태로 재지 않도록 매번 비운다
+    def run_recursive():
+        for joint in fk.joints:
+            joint.get_joint_transform.cache_clear()
+        for frame in frames:
+            loader.root.update_tree_global_transform(int(frame))
+
+    def run_single():
+        for frame in frames:
+            fk.global_transforms(int(frame))
+
+    recursive_time = best_time(run_recursive)
+    single_time = best_time(run_single)
+    range_time = best_time(lambda: fk.global_transforms(slice(0, frame_cnt)))
+
+    print('%-24s joints: %5d  frames: %6d' % (os.path.basename(filepath), joint_cnt, frame_cnt))
+    print('    recursive          : %12.0f joints x frames/s' % (joint_cnt * len(frames) / recursive_time))
+    print('    batched (per frame): %12.0f joints x frames/s  (x%.1f)' % (
+        joint_cnt * len(frames) / single_time, recursive_time / single_time))
+    print('    batched (all frames): %11.0f joints x frames/s  (x%.1f)' % (
+        joint_cnt * frame_cnt / range_time, recursive_time / len(frames) * frame_cnt / range_time))
+    print('    same output: %s' % same)
+    return same
+
+
+def main():
+    args = sys.argv[1:]
+    frames = 1000
+    if '--frames' in args:
+        i = args.index('--frames')
+        frames = int(args[i + 1])
+        del args[i:i + 2]
+
+    all_same = True
+    if args:
+        for filepath in args:
+            all_same &= compare(filepath)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for depth, branch in [(4, 1), (3, 2), (4, 3)]:
+                filepath = os.path.join(tmp_dir, 'skeleton-d%d-b%d.bvh' % (depth, branch))
+                write_bvh(filepath, frames, depth, branch)
+                all_same &= compare(filepath)
+
+    return 0 if all_same else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+'''
+light culling benchmark
+
+crowd 위에 영향 반경이 작은 point light MAX_LIGHTS개를 grid로 깔고, 캐릭터마다 draw call 하나로 (box mode) 그린다.
+    - all lights: 모든 object가 scene의 모든 light를 계산 (LightManager.bind_all)
+    - culled: object의 bounding sphere에 닿는 light만 계산 (LightManager.bind_object)
+fragment shader의 light loop가 object에 닿는 light 수만큼만 돌기 때문에, 화면을 많이 덮을수록 차이가 커진다.
+
+usage:
+    python bench_lights.py                # 합성 skeleton
+    python bench_lights.py a.bvh          # 지정한 bvh 파일
+    python bench_lights.py --egl          # display 없는 환경 (EGL / Mesa)
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import functools
+import tempfile
+import time
+import numpy as np
+from OpenGL.GL import *
+import main as viewer
+from common import offline
+from crowd import Crowd
+from common.camera_block import CameraBlock
+from common.lights import LightManager, PointLight, MAX_LIGHTS, LIGHT_CUTOFF
+from render import fit_camera
+from bench_fk import write_bvh
+
+CHARACTER_CNT = 64
+FRAME_CNT = 30
+WIDTH, HEIGHT = 800, 800
+
+
+def grid_lights(low, high, height):
+    '''
+    (x, z) 범위 [low, high]를 MAX_LIGHTS개의 칸으로 나눠서 칸마다 하나씩, 영향 반경이 칸 크기 정도인 light
+    '''
+    side = int(np.sqrt(MAX_LIGHTS))
+    cell = (high - low) / side
+    radius = float(max(cell[0], cell[1]))
+    # 감쇠를 quadratic만으로: 1 / (1 + q * r^2) = LIGHT_CUTOFF
+    quadratic = (1 / LIGHT_CUTOFF - 1) / (radius * radius)
+    rng = np.random.default_rng(0)
+    lights = []
+    for i in range(side * side):
+        x, z = low + cell * (np.array([i % side, i // side]) + 0.5)
+        lights.append(PointLight((x, height, z), rng.uniform(0.3, 1.0, 3), 1.0, 0.0, quadratic))
+    return lights
+
+
+def ms_per_frame(draw):
+    for i in range(3):
+        draw(i)
+    glFinish()
+
+    start = time.perf_counter()
+    for i in range(FRAME_CNT):
+        draw(i)
+    glFinish()
+    return 1000 * (time.perf_counter() - start) / FRAME_CNT
+
+
+def run(filepath):
+    loader = viewer.load_bvh(filepath, None)
+    loader.prepare_vaos_line()
+    loader.prepare_vaos_box()
+    loader.change_is_fill(True)
+    target = offline.OffscreenTarget(WIDTH, HEIGHT)
+
+    crowd = Crowd()
+    group = crowd.add_characters(loader, CHARACTER_CNT)
+
+    program = viewer.load_shaders(viewer.g_vertex_shader_skeleton_src, viewer.g_fragment_shader_src)
+    palette_loc = program.location('palette')
+    camera_block = CameraBlock()
+    camera_block.attach(program)
+
+    positions = loader.pose(np.arange(0, loader.clip.frame_cnt, 10))[..., :3, 3]
+    placements = group.placements[:, :3, 3]
+    positions = (positions.reshape(1, -1, 3) + placements[:, None]).reshape(-1, 3)
+    P, V, eye = fit_camera(positions, WIDTH / HEIGHT)
+    camera_block.update(P, V, eye)
+
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    lights = LightManager(grid_lights(low[[0, 2]], high[[0, 2]], (low[1] + high[1]) / 2))
+    lights.attach(program)
+    lights.update()
+    bind_lights = functools.partial(lights.bind_object, program)
+
+    def draw(i, is_culled):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glEnable(GL_DEPTH_TEST)
+        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        glUseProgram(program.id)
+        for frame, placement in zip(group.frames(i * loader.frame_time), group.placements):
+            pose = placement @ loader.pose_at(frame)
+            if is_culled:
+                loader.draw_pose(pose, palette_loc, bind_lights)
+            else:
+                lights.bind_all(program)
+                loader.draw_pose(pose, palette_loc)
+
+    print('%s  joints: %d  characters: %d  lights: %d' % (
+        os.path.basename(filepath), loader.fk.joint_cnt, CHARACTER_CNT, lights.light_cnt))
+    for mode, is_culled in (('all lights', False), ('culled', True)):
+        lights.object_cnt = lights.object_light_sum = 0
+        ms = ms_per_frame(functools.partial(draw, is_culled=is_culled))
+        print('%-12s %8.2f ms/frame  %5.2f lights per object' % (mode, ms, lights.object_light_sum / max(lights.object_cnt, 1)))
+
+    lights.delete()
+    camera_block.delete()
+    target.delete()
+    loader.delete_vaos()
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != '--egl']
+
+    context = offline.create_context(WIDTH, HEIGHT, 'bench_lights')
+    if context is None:
+        print('failed to create an OpenGL context', file=sys.stderr)
+        return 1
+
+    if args:
+        for filepath in args:
+            run(filepath)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, 'skeleton.bvh')
+            write_bvh(filepath, 300, 3, 2)
+            run(filepath)
+
+    offline.destroy_context(context)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+'''
+shader program cache benchmark
+
+main.py의 shader program 3개를 준비하는 시간(startup)을 새 process에서 잰다.
+    - no cache: 매번 source에서 compile + link
+    - cold: cache 디렉토리가 비어있음 (compile + link + binary 저장)
+    - warm: 저장된 program binary를 glProgramBinary로 읽음
+driver 자체에도 shader cache가 있으면 (Mesa의 ~/.cache/mesa_shader_cache 등) no cache / cold도 빨라진다.
+--no-driver-cache로 끄면 실제 compile 비용을 볼 수 있다. (Mesa는 이때 program binary도 지원하지 않는다)
+
+usage:
+    python bench_shaders.py                # 보이지 않는 glfw window
+    python bench_shaders.py --egl          # display 없는 환경 (EGL / Mesa)
+    python bench_shaders.py --no-driver-cache
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import shutil
+import subprocess
+import tempfile
+import time
+
+REPEAT = 5
+
+
+def load_all(cache_dir):
+    '''
+    (child process) context를 만들고 main.py의 program을 전부 준비하는 시간(ms)을 출력
+    '''
+    from common import offline
+    import main as viewer
+    from common.shader_cache import ShaderCache
+
+    context = offline.create_context(64, 64, 'bench_shaders')
+    if context is None:
+        print('failed to create an OpenGL context', file=sys.stderr)
+        return 1
+    cache = ShaderCache(cache_dir)
+    for vertex_src in (viewer.g_vertex_shader_src, viewer.g_vertex_shader_skeleton_src, viewer.g_vertex_shader_crowd_src):
+        cache.program(vertex_src, viewer.g_fragment_shader_src)
+    print('%.3f %d %d' % (1000 * cache.load_time, cache.compiled_cnt, cache.binary_cnt))
+    offline.destroy_context(context)
+    return 0
+
+
+def measure(cache_dir, env):
+    command = [sys.executable, '-W', 'ignore', os.path.abspath(__file__), '--child', cache_dir or '-']
+    if '--egl' in sys.argv:
+        command.append('--egl')
+    start = time.perf_counter()
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout.split()
+    process_ms = 1000 * (time.perf_counter() - start)
+    return float(output[0]), int(output[1]), int(output[2]), process_ms
+
+
+def main():
+    if '--child' in sys.argv:
+        cache_dir = sys.argv[sys.argv.index('--child') + 1]
+        return load_all(None if cache_dir == '-' else cache_dir)
+
+    env = dict(os.environ)
+    if '--no-driver-cache' in sys.argv:
+        env['MESA_SHADER_CACHE_DISABLE'] = 'true'
+        env['__GL_SHADER_DISK_CACHE'] = '0'
+
+    print('%-10s %12s %10s %10s %14s' % ('mode', 'shaders ms', 'compiled', 'binary', 'process ms'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, 'shader_cache')
+        for mode in ('no cache', 'cold', 'warm'):
+            results = []
+            for _ in range(REPEAT):
+                if mode == 'cold':
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                results.append(measure(None if mode == 'no cache' else cache_dir, env))
+            shaders_ms, compiled_cnt, binary_cnt, process_ms = (sorted(column)[len(column) // 2] for column in zip(*results))
+            print('%-10s %12.2f %10d %10d %14.1f' % (mode, shaders_ms, compiled_cnt, binary_cnt, process_ms))
+        if not os.path.isdir(cache_dir) or not os.listdir(cache_dir):
+            print('program binaries are not supported by this driver: the cache only reuses programs in memory')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+'''
+animation blending / crossfade
+
+같은 skeleton(Loader의 Node hierarchy)을 쓰는 여러 clip을 섞어서 재생한다.
+    - 캐릭터마다 지금 재생 중인 clip(current)과 직전 clip(previous), crossfade 시작 시각 / 길이를 배열로 들고 있고
+    - 매 frame: clip별로 그 clip을 쓰는 캐릭터들의 local pose(quaternion, translation)를 한 번에 sample 하고
+      (캐릭터, joint) 전체에 대해 한 번에 slerp / nlerp 해서 섞은 다음
+    - FK engine으로 (캐릭터, joint, 4, 4) global transform을 계산한다.
+Python loop는 clip 개수만큼만 돌고, 캐릭터나 joint 단위로는 돌지 않는다.
+
+joint mask: clip마다 joint별 가중치를 줄 수 있다. (ex. 상체만 손 흔드는 clip으로 덮어쓰기)
+crossfade가 끝나도 mask가 0인 joint는 직전 clip의 pose를 유지한다.
+'''
+import numpy as np
+import quaternion
+
+# crossfade 기본 길이 (초)
+DEFAULT_FADE_TIME = 0.5
+
+
+def is_same_skeleton(loader_a, loader_b):
+    '''
+    두 Loader의 skeleton이 같은 joint 구성인지 (같은 graph에서 섞을 수 있는지)
+    '''
+    return loader_a.skeleton is not None and loader_b.skeleton is not None and \
+        loader_a.skeleton.is_same_structure(loader_b.skeleton)
+
+
+def joint_mask(loader, names, weight=1.0, include_children=True):
+    '''
+    names의 joint(와 그 아래 joint들)에만 weight를 주는 (joints,) 가중치 배열 (skeleton의 joint 순서)
+    '''
+    skeleton = loader.skeleton
+    mask = np.zeros(skeleton.joint_cnt, dtype=np.float32)
+    for name in names:
+        index = skeleton.index(name)
+        mask[skeleton.subtree(index) if include_children else index] = weight
+    return mask
+
+
+class AnimationGraph:
+    def __init__(self, loader, character_cnt=1, seed=0):
+        '''
+        loader: skeleton(와 renderer)을 제공하는 Loader. 그 clip이 0번 clip이 된다.
+        '''
+        self.loader = loader
+        self.fk = loader.fk
+        self.clips = []
+        # clip마다 (joints,) 가중치
+        self.masks = []
+
+        self.current = np.zeros(0, dtype=np.int64)
+        if loader.clip is not None:
+            self.add_clip(loader.clip)
+        self.resize(character_cnt, seed)
+
+    @property
+    def character_cnt(self):
+        return len(self.current)
+
+    def resize(self, character_cnt, seed=0):
+        '''
+        캐릭터 수를 바꾼다. 모든 캐릭터는 0번 캐릭터가 재생 중인 clip으로 (fade 없이) 다시 시작한다.
+        '''
+        if character_cnt == self.character_cnt:
+            return
+        clip_index = self.current[0] if self.character_cnt > 0 else 0
+
+        # 캐릭터마다: 재생 중인 clip / 직전 clip의 index와 그 clip을 시작한 시각, crossfade 시작 시각과 길이
+        self.current = np.full(character_cnt, clip_index, dtype=np.int64)
+        self.previous = self.current.copy()
+        self.current_start = np.zeros(character_cnt)
+        self.previous_start = np.zeros(character_cnt)
+        self.fade_start = np.zeros(character_cnt)
+        self.fade_duration = np.zeros(character_cnt)
+
+        # 캐릭터마다 clip 안에서의 시간 offset (모두 같은 pose가 되지 않도록)
+        self.time_offsets = np.zeros(character_cnt)
+        if character_cnt > 1 and self.clips:
+            rng = np.random.default_rng(seed)
+            clip = self.clips[0]
+            self.time_offsets = rng.uniform(0, clip.frame_cnt * clip.frame_time, character_cnt)
+
+    def add_clip(self, clip, mask=None):
+        '''
+        clip을 추가하고 그 index를 돌려준다. mask: (joints,) 이 clip이 덮어쓸 joint별 가중치 (기본: 전부 1)
+        '''
+        if clip.joint_cnt != self.fk.joint_cnt:
+            raise ValueError('clip has %d joints, skeleton has %d' % (clip.joint_cnt, self.fk.joint_cnt))
+        self.clips.append(clip)
+        self.masks.append(np.ones(clip.joint_cnt, dtype=np.float32) if mask is None else np.asarray(mask, dtype=np.float32))
+        return len(self.clips) - 1
+
+    def crossfade(self, clip_index, now, duration=DEFAULT_FADE_TIME, characters=None):
+        '''
+        characters(index 배열, 기본: 전부)를 now부터 duration초 동안 clip_index로 넘어가게 한다.
+        새 clip은 처음부터(+ 캐릭터 offset) 재생되고, 직전 clip은 fade가 끝날 때까지 계속 재생된다.
+        '''
+        if characters is None:
+            characters = slice(None)
+
+        # fade 도중에 다시 crossfade하면 지금 더 많이 보이는 쪽을 직전 clip으로 둔다
+        weight = self.fade_weights(now)[characters]
+        keep_current = weight >= 0.5
+        self.previous[characters] = np.where(keep_current, self.current[characters], self.previous[characters])
+        self.previous_start[characters] = np.where(keep_current, self.current_start[characters], self.previous_start[characters])
+
+        self.current[characters] = clip_index
+        self.current_start[characters] = now
+        self.fade_start[characters] = now
+        self.fade_duration[characters] = duration
+
+    def fade_weights(self, now):
+        '''
+        (characters,) current clip의 가중치. 0에서 시작해서 fade_duration 동안 1까지 올라간다.
+        '''
+        duration = np.maximum(self.fade_duration, 1e-9)
+        return np.clip((now - self.fade_start) / duration, 0, 1)
+
+    def sample(self, clip_indices, starts, now):
+        '''
+        캐릭터마다 clip_indices[c]를 (now - starts[c] + offset) 시각에서 sample
+        return: (characters, joints, 4), (characters, joints, 3)
+        '''
+        q = np.empty((self.character_cnt, self.fk.joint_cnt, 4), dtype=np.float32)
+        T = np.empty((self.character_cnt, self.fk.joint_cnt, 3), dtype=np.float32)
+        for clip_index in np.unique(clip_indices):
+            characters = np.flatnonzero(clip_indices == clip_index)
+            clip = self.clips[clip_index]
+            frames = ((now - starts[characters] + self.time_offsets[characters]) / clip.frame_time) % clip.frame_cnt
+            q[characters], T[characters] = clip.sample(frames)
+        return q, T
+
+    def local_pose(self, now, mode='slerp'):
+        '''
+        모든 캐릭터의 섞인 local pose: (characters, joints, 4) quaternion, (characters, joints, 3) translation
+        mode: 'slerp' 또는 'nlerp' (nlerp가 더 싸고, 가중치가 한쪽으로 치우치지 않으면 거의 같다)
+        '''
+        q_current, T_current = self.sample(self.current, self.current_start, now)
+        if np.all(self.current == self.previous):
+            return q_current, T_current
+
+        q_previous, T_previous = self.sample(self.previous, self.previous_start, now)
+
+        # (characters, joints) current 쪽 가중치 = fade 진행률 * clip의 joint mask
+        masks = np.array(self.masks)[self.current]
+        weights = (self.fade_weights(now)[:, None] * masks).astype(np.float32)
+
+        if mode == 'slerp':
+            q = quaternion.slerp(q_previous, q_current, weights)
+        else:
+            q = quaternion.nlerp(np.stack([q_previous, q_current]), np.stack([1 - weights, weights]))
+        T = quaternion.lerp(T_previous, T_current, weights)
+        return q, T
+
+    def evaluate(self, now, mode='slerp'):
+        '''
+        return: (characters, joints, 4, 4) global transform (joint 순서는 fk.joints)
+        '''
+        q, T = self.local_pose(now, mode)
+        return self.fk.compose_global(self.fk.pose_local_transforms(q, T))
@@ -0,0 +1,213 @@
+'''
+crowd playback
+
+여러 캐릭터(BVH skeleton)를 각자의 clip과 시간 offset으로 동시에 재생한다.
+    - 같은 Loader(같은 clip)를 쓰는 캐릭터들은 하나의 group으로 묶고,
+      group의 모든 캐릭터 pose를 한 번에 계산한다. (정수 frame은 baked 배열에서 꺼내고, frame 사이는 slerp 보간)
+    - 모든 캐릭터의 palette((캐릭터, joint) 순서의 global transform)는 texture buffer 하나에 upload한다.
+      GL_MAX_TEXTURE_BUFFER_SIZE를 넘는 crowd는 여러 batch로 나눠서 upload + draw 한다.
+    - group마다 glDrawArraysInstanced 한 번: instance = 캐릭터, 그 캐릭터의 bone은 palette에서
+      (palette_offset + gl_InstanceID * bone_cnt + bone)번째 행렬을 쓴다.
+skeleton이 하나뿐이면(같은 파일을 복제한 경우) crowd 전체가 draw call 한 번이다.
+group에 blend.AnimationGraph가 붙어 있으면 baked pose 대신 graph가 섞은 pose를 쓴다. (clip 사이 crossfade)
+'''
+from OpenGL.GL import *
+import numpy as np
+from skeleton_renderer import PaletteBuffer
+from loader import BONE_MARGIN
+
+
+class CharacterGroup:
+    def __init__(self, loader, time_offsets, placements, graph=None):
+        self.loader = loader
+        # 캐릭터마다 여러 clip을 섞어서 재생할 때 (None이면 loader의 clip 하나)
+        self.graph = graph
+        # (characters,) 초 단위 시간 offset
+        self.time_offsets = time_offsets
+        # (characters, 4, 4) 캐릭터마다 world에 놓이는 위치
+        self.placements = placements
+        # 전체 palette에서 이 group이 시작하는 행렬 index
+        self.palette_offset = 0
+
+    @property
+    def character_cnt(self):
+        return len(self.time_offsets)
+
+    @property
+    def bone_cnt(self):
+        return self.loader.fk.joint_cnt
+
+    def frames(self, time):
+        '''
+        time(초)에서 각 캐릭터가 보여줄 소수 frame index (clip 끝에서 처음으로 돌아감)
+        '''
+        frame_cnt = self.loader.clip.frame_cnt
+        return ((time + self.time_offsets) / self.loader.frame_time) % frame_cnt
+
+
+def split_batches(visible, max_matrix_cnt):
+    '''
+    visible: [(group, palette (C, bone_cnt, 4, 4))]
+    palette 행렬이 batch마다 max_matrix_cnt개를 넘지 않도록 나눈다. 한 group이 넘치면 캐릭터 단위로 자른다.
+    return: batch들의 list, batch는 [(group, palette, batch palette에서의 시작 위치)]
+    '''
+    batches = []
+    batch = []
+    offset = 0
+    for group, palette in visible:
+        start = 0
+        while start < len(palette):
+            # 이번 batch에 더 들어가는 캐릭터 수
+            free_cnt = (max_matrix_cnt - offset) // group.bone_cnt
+            if free_cnt <= 0 and batch:
+                batches.append(batch)
+                batch = []
+                offset = 0
+                continue
+            # bone이 아무리 많아도 batch마다 최소 1명
+            stop = min(start + max(free_cnt, 1), len(palette))
+            batch.append((group, palette[start:stop], offset))
+            offset += (stop - start) * group.bone_cnt
+            start = stop
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class Crowd:
+    def __init__(self):
+        self.__groups = []
+        self.__palette = PaletteBuffer()
+        # (전체 캐릭터의 bone 수, 4, 4)
+        self.__palette_data = np.zeros((0, 4, 4), dtype=np.float32)
+        # grid에 다음 캐릭터를 놓을 자리
+        self.__next_slot = 0
+
+    @property
+    def character_cnt(self):
+        return sum(group.character_cnt for group in self.__groups)
+
+    @property
+    def groups(self):
+        return self.__groups
+
+    def add_characters(self, loader, count, spacing=None, seed=0, graph=None):
+        '''
+        loader의 clip을 재생하는 캐릭터 count명을 grid에 추가한다.
+        시간 offset은 clip 길이 안에서 random으로 정해서 서로 다른 pose가 보이게 한다.
+        graph: 캐릭터 count명짜리 AnimationGraph를 주면 그 graph가 섞은 pose로 재생한다.
+        '''
+        if count <= 0 or loader.clip is None or loader.clip.frame_cnt == 0:
+            return None
+        if graph is not None and graph.character_cnt != count:
+            raise ValueError('graph has %d characters, expected %d' % (graph.character_cnt, count))
+
+        if graph is not None:
+            time_offsets = graph.time_offsets
+        else:
+            rng = np.random.default_rng(seed)
+            duration = loader.clip.frame_cnt * loader.frame_time
+            time_offsets = rng.uniform(0, duration, count)
+
+        if spacing is None:
+            spacing = self.default_spacing(loader)
+
+        # 정사각형에 가까운 grid로 배치 (x, z 평면)
+        slots = np.arange(self.__next_slot, self.__next_slot + count)
+        self.__next_slot += count
+        columns = max(int(np.ceil(np.sqrt(self.__next_slot))), 1)
+        placements = np.tile(np.eye(4, dtype=np.float32), (count, 1, 1))
+        placements[:, 0, 3] = (slots % columns) * spacing
+        placements[:, 2, 3] = (slots // columns) * spacing
+
+        group = CharacterGroup(loader, time_offsets, placements, graph)
+        self.__groups.append(group)
+        self.__layout()
+        return group
+
+    def default_spacing(self, loader):
+        # rest pose의 x, z 크기보다 조금 넓게
+        positions = loader.fk.rest_transforms()[:, :3, 3]
+        extent = positions.max(axis=0) - positions.min(axis=0)
+        return max(float(max(extent[0], extent[2])) * 1.5, float(extent[1]) * 0.5, 1.0)
+
+    def __layout(self):
+        offset = 0
+        for group in self.__groups:
+            group.palette_offset = offset
+            offset += group.character_cnt * group.bone_cnt
+        self.__palette_data = np.zeros((offset, 4, 4), dtype=np.float32)
+
+    def clear(self):
+        self.__groups = []
+        self.__palette_data = np.zeros((0, 4, 4), dtype=np.float32)
+        self.__next_slot = 0
+
+    def update(self, time):
+        '''
+        time(초)의 모든 캐릭터 pose를 palette 배열에 채운다.
+        '''
+        for group in self.__groups:
+            if group.graph is not None:
+                poses = group.graph.evaluate(time)
+            else:
+                poses = group.loader.pose_at(group.frames(time))
+            np.matmul(group.placements[:, None], poses, out=self.group_palette(group))
+
+    def bounding_spheres(self, group, palette=None):
+        '''
+        group의 캐릭터마다 현재 palette의 joint 위치를 다 포함하는 sphere: centers (C, 3), radii (C,)
+        palette: (C, bone_cnt, 4, 4) (없으면 group의 palette 전체)
+        '''
+        if palette is None:
+            palette = self.group_palette(group)
+        positions = palette[..., :3, 3]
+        low, high = positions.min(axis=1), positions.max(axis=1)
+        return (low + high) / 2, np.linalg.norm(high - low, axis=1) / 2 + BONE_MARGIN
+
+    def group_palette(self, group):
+        '''
+        palette 배열에서 group 부분: (C, bone_cnt, 4, 4) view
+        '''
+        start = group.palette_offset
+        stop = start + group.character_cnt * group.bone_cnt
+        return self.__palette_data[start:stop].reshape(group.character_cnt, group.bone_cnt, 4, 4)
+
+    def draw(self, palette_loc, bone_cnt_loc, palette_offset_loc, is_fill, bind_lights=None, culler=None):
+        '''
+        bind_lights: (centers, radii)를 받는 callback (LightManager.bind_object). draw call마다 그리는 캐릭터 중 하나라도 닿는 light를 쓴다.
+        culler: frustum.FrustumCuller. bone이 하나도 보이지 않는 캐릭터는 빼고 보이는 캐릭터들의 palette만 모아서 그린다.
+        palette가 texture buffer 하나의 최대 크기를 넘으면 여러 batch로 나눠서 upload + draw 한다.
+        '''
+        if not self.__groups:
+            return
+
+        # group마다 그릴 캐릭터들의 palette (C, bone_cnt, 4, 4)
+        visible = []
+        for group in self.__groups:
+            palette = self.group_palette(group)
+            if culler is not None:
+                centers, radii = group.loader.skeleton.bone_spheres(palette)
+                palette = palette[culler.visible(centers, radii)]
+            if len(palette) > 0:
+                visible.append((group, palette))
+
+        batches = split_batches(visible, self.__palette.max_matrix_cnt)
+        for batch in batches:
+            if culler is None and len(batches) == 1:
+                # 전체가 그대로 들어가면 palette 배열을 복사하지 않고 upload
+                palette_data = self.__palette_data
+            else:
+                palette_data = np.concatenate([palette.reshape(-1, 4, 4) for _, palette, _ in batch])
+            self.__palette.upload(palette_data)
+            self.__palette.bind(palette_loc)
+
+            for group, palette, offset in batch:
+                if bind_lights is not None:
+                    bind_lights(*self.bounding_spheres(group, palette))
+                glUniform1i(bone_cnt_loc, group.bone_cnt)
+                glUniform1i(palette_offset_loc, offset)
+                group.loader.renderer.draw_instanced(len(palette), is_fill)
+
+    def delete(self):
+        self.__palette.delete()
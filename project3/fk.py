@@ -0,0 +1,136 @@
+'''
+batched forward kinematics
+
+Node.update_tree_global_transform(frame)는 joint 하나씩 재귀로 내려가면서
+parent.global * link * joint_transform(frame)을 glm으로 곱한다.
+여기서는 skeleton을 DFS 순서(부모가 항상 자식보다 앞)의 parent index 배열로 펴두고,
+    1. 모든 joint의 local transform(link * joint)을 clip의 quaternion에서 frame 축까지 포함해서 numpy로 한 번에 만들고
+    2. 깊이(level)별로 G[:, level] = G[:, parent] @ local[:, level]를 stacked matmul로 계산한다.
+행렬은 glm과 같은 수학적 (row, column) 배치의 (..., 4, 4) 배열이다.
+'''
+import numpy as np
+import quaternion
+
+
+class ForwardKinematics:
+    def __init__(self, skeleton, clip=None, dtype=np.float32):
+        '''
+        skeleton: skeleton.Skeleton (DFS 순서의 joint와 parent index 배열, root의 parent는 -1)
+        '''
+        self.dtype = dtype
+        self.skeleton = skeleton
+        self.joints = skeleton.joints
+        self.parents = skeleton.parents
+        self.levels = skeleton.levels
+
+        # link transform (static)
+        self.links = np.array([np.array(joint.link_transform_from_parent) for joint in self.joints], dtype=dtype)
+        self.link_offsets = self.links[:, :3, 3].copy()
+
+        self.clip = None
+        if clip is not None:
+            self.set_clip(clip)
+
+    @property
+    def joint_cnt(self):
+        return len(self.joints)
+
+    @property
+    def frame_cnt(self):
+        return self.clip.frame_cnt if self.clip is not None else 0
+
+    def set_clip(self, clip):
+        self.clip = clip
+
+    def local_quaternions(self, frames):
+        '''
+        frames: frame index 배열 / slice
+        return: (F, N, 4) joint 회전 quaternion
+        '''
+        return self.clip.rotations[frames]
+
+    def local_translations(self, frames):
+        '''
+        frames: frame index 배열 / slice
+        return: (F, N, 3) link offset + position channel
+        link transform은 OFFSET만큼의 translation이므로 link * J는 J의 translation에 offset을 더한 것과 같다
+        '''
+        return self.clip.local_translations(frames) + self.link_offsets
+
+    def compose_local(self, R, T):
+        '''
+        R: (F, N, 3, 3), T: (F, N, 3) -> (F, N, 4, 4) link * joint transform
+        '''
+        L = np.zeros(R.shape[:2] + (4, 4), dtype=self.dtype)
+        L[:, :, :3, :3] = R
+        L[:, :, :3, 3] = T
+        L[:, :, 3, 3] = 1
+        return L
+
+    def local_transforms(self, frames):
+        '''
+        frames: frame index 배열 / slice
+        return: (F, N, 4, 4) link * joint transform
+        '''
+        R = quaternion.to_matrix(self.local_quaternions(frames))
+        return self.compose_local(R, self.local_translations(frames))
+
+    def interpolated_local_transforms(self, frames):
+        '''
+        frames: (F,) 소수 frame index. 마지막 frame 다음은 첫 frame으로 이어진다.
+        두 frame 사이의 회전은 quaternion slerp, translation은 lerp
+        return: (F, N, 4, 4)
+        '''
+        return self.pose_local_transforms(*self.clip.sample(frames))
+
+    def pose_local_transforms(self, q, T):
+        '''
+        q: (..., N, 4) 회전 quaternion, T: (..., N, 3) position channel 값 (joint 순서는 self.joints)
+        blend 등으로 만든 local pose를 (F, N, 4, 4) link * joint transform으로 바꾼다.
+        '''
+        q = q.reshape((-1,) + q.shape[-2:])
+        T = T.reshape((-1,) + T.shape[-2:])
+        return self.compose_local(quaternion.to_matrix(q), T + self.link_offsets)
+
+    def compose_global(self, L, out=None):
+        '''
+        L: (F, N, 4, 4) local transform -> level별로 부모의 global transform과 곱한 (F, N, 4, 4)
+        '''
+        G = out if out is not None else np.empty_like(L)
+
+        G[:, self.levels[0]] = L[:, self.levels[0]]
+        for level in self.levels[1:]:
+            G[:, level] = G[:, self.parents[level]] @ L[:, level]
+
+        return G
+
+    def global_transforms(self, frames, out=None):
+        '''
+        frames: frame index 하나, frame index 배열, 또는 slice
+        return: index 하나면 (N, 4, 4), 아니면 (F, N, 4, 4). joint 순서는 self.joints (DFS)
+        '''
+        single = np.ndim(frames) == 0 and not isinstance(frames, slice)
+        if single:
+            frames = [frames]
+
+        G = self.compose_global(self.local_transforms(frames), out)
+        return G[0] if single else G
+
+    def interpolated_global_transforms(self, frames):
+        '''
+        frames: 소수 frame index 하나 또는 (F,) 배열
+        return: 하나면 (N, 4, 4), 아니면 (F, N, 4, 4)
+        '''
+        single = np.ndim(frames) == 0
+        G = self.compose_global(self.interpolated_local_transforms(np.atleast_1d(frames)))
+        return G[0] if single else G
+
+    def rest_transforms(self):
+        '''
+        channel 값이 모두 0인 pose의 global transform (N, 4, 4). update_tree_global_transform_skeleton과 같은 결과
+        '''
+        G = np.empty_like(self.links)
+        G[self.levels[0]] = self.links[self.levels[0]]
+        for level in self.levels[1:]:
+            G[level] = G[self.parents[level]] @ self.links[level]
+        return G
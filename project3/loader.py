@@ -6,8 +6,40 @@ from glfw.GLFW import *
 import glm
 import ctypes
 import numpy as np
-from node import Node as Joint
+from node import Node as Joint, BONE_THICKNESS
+from animation import AnimationClip
+from fk import ForwardKinematics
+from skeleton import Skeleton
+from skeleton_renderer import SkeletonRenderer
+from common.lights import points_bounding_sphere
+import hashlib
 import os
+import tempfile
+
+# bake()에서 한 번에 계산할 frame 수
+BAKE_CHUNK_FRAMES = 1024
+# bake 결과의 형식이나 계산 방법이 바뀌면 올려서 예전 cache를 버린다
+BAKE_CACHE_VERSION = 1
+# bake cache(.npy) 옆에 두는 원본 정보 파일
+BAKE_KEY_SUFFIX = '.key'
+
+# joint 위치만으로 만든 bounding sphere에 bone box의 두께만큼 더하는 여유
+BONE_MARGIN = BONE_THICKNESS * np.sqrt(3)
+
+def _file_hash(filepath, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_atomic(path, text):
+    tmp_path = path + '.%d.tmp' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
 
 class Loader:
     def __init__(self):
@@ -19,6 +51,18 @@ class Loader:
 
         self.frames = 0
         self.frame_time = 1
+        # 한 번만 만드는 DFS 순서의 joint 목록 / parent index / channel offset / 이름 -> index
+        self.skeleton = None
+        # AnimationClip: joint 회전 quaternion + translation 배열
+        self.clip = None
+        # batched forward kinematics (DFS 순서의 parent index 배열)
+        self.fk = None
+        # 현재 그리고 있는 pose: (joints, 4, 4) global transform
+        self.current_pose = None
+        # 모든 bone을 VBO 하나, draw call 한 번으로 그리는 renderer
+        self.renderer = SkeletonRenderer()
+        # bake()로 미리 계산한 모든 frame의 global transform: (frames, joints, 4, 4) float32 (memmap일 수도 있음)
+        self.baked = None
         
         # for debugging...
         self.__total_frame_cnt = 0
@@ -37,45 +81,25 @@ class Loader:
     def is_animating(self):
         return self.__is_animating
 
-    def is_float(self, num):
-        try:
-            float(num)
-            return True
-        except ValueError:
-            return False
-
     def change_is_fill(self, new_is_fill):
         self.__is_fill = new_is_fill
 
     def change_is_animating(self):
         self.__is_animating = not self.__is_animating
 
-    def parse_channel_data(self, channel_data):
+    def parse_bvh(self, filepath, progress=None):
         '''
-        DFS로 root부터 돌면서 channel data를 파싱하여 넣어줌
-        한 프레임에 대한 channel data를 파싱
+        progress: (읽은 byte 수, 전체 byte 수)를 받는 callback (background loading에서 진행률 표시용)
         '''
-        visited = []
-        channel_stack = [self.__root]
-
-        data_cnt = 0
-
-        while channel_stack:
-            current_node = channel_stack.pop()
-            if current_node not in visited:
-                visited.append(current_node)
-                channel_data_per_frame = channel_data[data_cnt:data_cnt + len(current_node.channels)]
-                data_cnt += len(current_node.channels)
-                current_node.append_joint_transform(channel_data_per_frame)
-
-                for child in reversed(current_node.children):
-                    channel_stack.append(child)
-
-    def parse_bvh(self, filepath):
         # initialize member variables
         self.__is_animating = False
         self.__filepath = ""
         self.__root = None
+        self.skeleton = None
+        self.clip = None
+        self.fk = None
+        self.baked = None
+        self.current_pose = None
 
         self.frames = 0
         self.frame_time = 1
@@ -85,13 +109,14 @@ class Loader:
         self.__channel_cnt = 0
         self.__total_joint_cnt = 0
 
+        total_bytes = os.path.getsize(filepath)
+
         with open(filepath, 'r') as f:
-            lines = f.readlines()
-            
             parent_joint = None
             current_joint = None
 
-            for line in lines:
+            # HIERARCHY: 줄 단위로 파싱 (joint 개수만큼의 줄밖에 없음)
+            for line in iter(f.readline, ''):
                 words = line.split()
 
                 if len(words) < 1:
@@ -119,9 +144,12 @@ class Loader:
 
                 elif words[0] == 'CHANNELS':
                     total_length = int(words[1])
+                    # MOTION의 한 줄에서 이 joint의 channel이 시작하는 column
+                    current_joint.channel_offset = self.__channel_cnt
                     self.__channel_cnt += total_length
                     for i in range(total_length):
                         current_joint.channels.append(words[i + 2])
+                    current_joint.compile_channels()
 
                 elif words[0] == 'ROOT' or words[0] == 'JOINT' or words[0] == 'End':
                     joint_name = words[1]
@@ -135,95 +163,234 @@ class Loader:
                     if words[0] == 'ROOT':
                         self.__root = current_joint
 
-                # Motion에서 가능한 옵션
-                # - Frames: 총 pose의 개수
-                # - Frame Time: FPS
-                # - 이외의 숫자 옵션: 각 column의 offset을 저장함
- 
-                elif words[0] == 'Frames:':
+                elif words[0] == 'MOTION':
+                    break
+
+            # hierarchy를 다 읽었으면 DFS 순서 / parent index / channel offset을 한 번만 만든다
+            self.skeleton = Skeleton(self.__root)
+
+            # MOTION header
+            # - Frames: 총 pose의 개수
+            # - Frame Time: FPS
+            for line in iter(f.readline, ''):
+                words = line.split()
+                if len(words) < 1:
+                    continue
+
+                if words[0] == 'Frames:':
                     self.frames = int(words[1])
-                
                 elif words[0] == 'Frame' and words[1] == 'Time:':
                     self.frame_time = float(words[2])
-                
-                elif self.is_float(words[0]):
-                    self.__total_frame_cnt += 1
-                    self.parse_channel_data(words)
+                    break
+
+            # MOTION data: 모든 frame의 channel 값을 (frames, channels) float32 배열로 한 번에 읽는다
+            motion = self.read_motion(f, total_bytes, progress)
+
+        # channel -> joint column map과 회전 순서는 CHANNELS를 읽으면서 이미 정해짐 (compile_channels)
+        # 모든 frame의 Euler angle을 한 번에 quaternion으로 바꾸고, 원본 channel 배열은 버린다
+        self.clip = AnimationClip.from_channels(motion, self.skeleton.joints, self.frame_time)
+        self.__total_frame_cnt = self.clip.frame_cnt
+
+        for joint in self.skeleton.joints:
+            joint.set_motion(self.clip)
+
+        self.fk = ForwardKinematics(self.skeleton, self.clip)
 
         self.__filepath = filepath
 
+    def read_motion(self, f, total_bytes, progress=None, chunk_size=4 * 1024 * 1024):
+        '''
+        MOTION data 부분을 chunk_size 단위로 읽어서 np.fromstring으로 변환한다.
+        줄 중간에서 끊기지 않도록 chunk의 마지막 줄바꿈까지만 변환하고, 나머지는 다음 chunk에 붙인다.
+        '''
+        blocks = []
+        remainder = ''
+        read_bytes = f.tell()
+
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            read_bytes += len(chunk)
+
+            chunk = remainder + chunk
+            cut = chunk.rfind('\n') + 1
+            remainder = chunk[cut:]
+            if cut > 0:
+                blocks.append(np.fromstring(chunk[:cut], dtype=np.float32, sep=' '))
+
+            if progress is not None:
+                progress(min(read_bytes, total_bytes), total_bytes)
+
+        if remainder.strip():
+            blocks.append(np.fromstring(remainder, dtype=np.float32, sep=' '))
+
+        values = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+        if self.__channel_cnt == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        frame_cnt = len(values) // self.__channel_cnt
+        return values[:frame_cnt * self.__channel_cnt].reshape(frame_cnt, self.__channel_cnt)
+
+    def baked_nbytes(self):
+        return self.clip.frame_cnt * self.fk.joint_cnt * 16 * 4
+
+    def bake(self, cache_path=None, chunk_frames=BAKE_CHUNK_FRAMES, progress=None):
+        '''
+        모든 frame의 global transform을 한 번에 계산해서 (frames, joints, 4, 4) float32 배열로 저장한다.
+        이후 재생은 self.baked[frame]을 꺼내서 upload만 하면 되므로 skeleton 깊이와 상관없이 frame당 비용이 일정하다.
+
+        cache_path: 주어지면 .npy 파일에 memmap으로 저장한다. (메모리에 다 올리기 큰 clip)
+                    옆의 .key 파일에 적힌 bvh 파일의 크기 / mtime(다르면 sha1)과 shape, BAKE_CACHE_VERSION이
+                    모두 맞으면 다시 계산하지 않고 그대로 연다.
+        '''
+        shape = (self.clip.frame_cnt, self.fk.joint_cnt, 4, 4)
+
+        tmp_path = None
+        if cache_path is None:
+            baked = np.empty(shape, dtype=np.float32)
+        else:
+            baked = self.__load_baked(cache_path, shape)
+            if baked is not None:
+                self.baked = baked
+                return baked
+            # 다른 Loader가 기존 cache를 memmap으로 열고 있을 수 있으므로 그 자리에서 덮어쓰지 않고
+            # 같은 폴더의 임시 파일에 쓴 뒤 os.replace로 바꿔치기한다
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(cache_path) + '.',
+                                            dir=os.path.dirname(os.path.abspath(cache_path)))
+            os.close(fd)
+            baked = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=shape)
+
+        # 한 번에 전체를 계산하면 중간 배열이 커지므로 chunk_frames 단위로 계산
+        for start in range(0, shape[0], chunk_frames):
+            stop = min(start + chunk_frames, shape[0])
+            self.fk.global_transforms(slice(start, stop), out=baked[start:stop])
+            if progress is not None:
+                progress(stop, shape[0])
+
+        if cache_path is not None:
+            baked.flush()
+            self.__save_baked(cache_path, tmp_path, shape)
+        self.baked = baked
+        return baked
+
+    def __bake_key(self, shape, stat, digest):
+        return '%d %s %d %d %s\n' % (BAKE_CACHE_VERSION, 'x'.join(map(str, shape)),
+                                     stat.st_size, stat.st_mtime_ns, digest)
+
+    def __load_baked(self, cache_path, shape):
+        '''
+        cache_path의 bake 결과가 지금의 bvh 파일(크기 / mtime, 다르면 sha1)과 shape에 맞으면 read-only memmap, 아니면 None
+        '''
+        try:
+            stat = os.stat(self.__filepath)
+            with open(cache_path + BAKE_KEY_SUFFIX) as f:
+                version, cached_shape, size, mtime_ns, digest = f.read().split()
+            if int(version) != BAKE_CACHE_VERSION or cached_shape != 'x'.join(map(str, shape)) \
+                    or int(size) != stat.st_size:
+                return None
+            if int(mtime_ns) != stat.st_mtime_ns:
+                # touch 등으로 mtime만 바뀐 경우: 내용이 같으면 key만 갱신해서 계속 사용
+                if digest != _file_hash(self.__filepath):
+                    return None
+                _write_atomic(cache_path + BAKE_KEY_SUFFIX, self.__bake_key(shape, stat, digest))
+            baked = np.load(cache_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if baked.shape != shape or baked.dtype != np.float32:
+            return None
+        return baked
+
+    def __save_baked(self, cache_path, tmp_path, shape):
+        key_path = cache_path + BAKE_KEY_SUFFIX
+        try:
+            stat = os.stat(self.__filepath)
+            digest = _file_hash(self.__filepath)
+            # npy를 바꾸는 동안 다른 Loader가 예전 key로 새 파일을 믿지 않도록 key를 먼저 지운다
+            if os.path.exists(key_path):
+                os.remove(key_path)
+            os.replace(tmp_path, cache_path)
+            _write_atomic(key_path, self.__bake_key(shape, stat, digest))
+        except OSError:
+            # (Windows 등) 바꿔치기에 실패하면 이번에는 임시 파일의 memmap을 그대로 쓰고 cache는 남기지 않는다
+            pass
+
+    def pose(self, frame):
+        '''
+        frame의 모든 joint global transform (joints, 4, 4). joint 순서는 self.skeleton.joints (DFS)
+        bake 되어 있으면 배열에서 꺼내기만 한다.
+        '''
+        if self.baked is not None:
+            return self.baked[frame]
+        return self.fk.global_transforms(frame)
+
+    def pose_at(self, frame):
+        '''
+        소수 frame index(하나 또는 배열)의 pose. 정수 frame이면 pose(frame)과 같고,
+        frame 사이는 joint 회전을 quaternion slerp, translation을 lerp 해서 FK로 다시 계산한다.
+        '''
+        frame = np.asarray(frame, dtype=np.float64)
+        base = np.floor(frame)
+        if np.all(frame == base):
+            return self.pose(base.astype(np.int64) % self.clip.frame_cnt)
+        return self.fk.interpolated_global_transforms(frame)
+
     def print_bvh_data(self):
         print("---------------------------------------------")
         print("file name: " + os.path.basename(str(self.__filepath)))
         print("number of frames: " + str(self.__total_frame_cnt))
         print("FPS: " + str(1 / self.frame_time))
         print("number of joints: " + str(self.__total_joint_cnt))
+        print(self.clip.memory_report())
+        if self.baked is not None:
+            print('baked poses: %.2f MB%s' % (self.baked.nbytes / (1024 * 1024), ' (memmap)' if isinstance(self.baked, np.memmap) else ''))
 
-        visited = []
-        dfs_joint_name = []
-        joint_stack = [self.__root]
-
-        while joint_stack:
-            current_node = joint_stack.pop()
-            if current_node not in visited:
-                visited.append(current_node)
-                dfs_joint_name.append(current_node.joint_name)
-
-                for child in reversed(current_node.children):
-                    joint_stack.append(child)
-
-        print("list of all joint names: " + str(dfs_joint_name))
+        print("list of all joint names: " + str(self.skeleton.joint_names))
 
     def prepare_vaos_line(self):
-        visited = []
-        joint_stack = [self.__root]
-
-        while joint_stack:
-            current_node = joint_stack.pop()
-            if current_node not in visited:
-                visited.append(current_node)
-                current_node.prepare_vao_line()
-
-                for child in reversed(current_node.children):
-                    joint_stack.append(child)
-        
-        self.__root.update_tree_global_transform_skeleton()
+        '''
+        모든 bone의 선분을 하나의 VBO로 (joint 순서는 self.skeleton.joints)
+        '''
+        self.renderer.prepare_vao_line(self.skeleton)
+        self.current_pose = self.fk.rest_transforms()
 
     def prepare_vaos_box(self):
-        visited = []
-        channel_stack = [self.__root]
+        '''
+        모든 bone의 box를 하나의 VBO로
+        '''
+        self.renderer.prepare_vao_box(self.skeleton)
+        self.current_pose = self.fk.rest_transforms()
 
-        while channel_stack:
-            current_node = channel_stack.pop()
-            if current_node not in visited:
-                visited.append(current_node)
-                current_node.prepare_vao_box()
+    def delete_vaos(self):
+        self.renderer.delete_vaos()
 
-                for child in reversed(current_node.children):
-                    channel_stack.append(child)
-        
-        self.__root.update_tree_global_transform_skeleton()
+    def update_global_transforms(self, frame):
+        '''
+        frame: 소수 frame index (frame 사이는 보간)
+        모든 joint의 global transform을 FK engine으로 한 번에 계산해서(bake 되어 있으면 꺼내서) current_pose로 둔다.
+        (root.update_tree_global_transform(frame)과 같은 결과)
+        '''
+        self.current_pose = self.pose_at(frame)
 
-    def draw_animation(self, VP, MVP_loc, color_loc, frame, M_loc):
+    def draw_animation(self, palette_loc, frame, bind_lights=None, culler=None):
         '''
-        그려야하는 box 개수만큼(root + joint 개수만큼),
-        joint 배열을 순회하면서 해당 joint node의 draw를 호출
+        현재 pose를 palette로 upload하고 skeleton 전체를 draw call 한 번으로 그린다.
         '''
         if self.__is_animating:
-            self.__root.update_tree_global_transform(frame)
+            self.update_global_transforms(frame)
 
-        visited = []
-        channel_stack = [self.__root]
+        self.draw_pose(self.current_pose, palette_loc, bind_lights, culler)
 
-        while channel_stack:
-            current_node = channel_stack.pop()
-            if current_node not in visited:
-                visited.append(current_node)
-
-                if self.__is_fill:
-                    current_node.draw_node_box(VP, MVP_loc, color_loc, M_loc)
-                else:
-                    current_node.draw_node_line(VP, MVP_loc, color_loc)
-
-                for child in reversed(current_node.children):
-                    channel_stack.append(child)
+    def draw_pose(self, pose, palette_loc, bind_lights=None, culler=None):
+        '''
+        pose: (joints, 4, 4) 밖에서 계산한 global transform (ex. AnimationGraph가 섞은 pose)
+        bind_lights: (centers, radii)를 받는 callback (LightManager.bind_object). pose의 bounding sphere에 닿는 light만 쓴다.
+        culler: frustum.FrustumCuller. bone이 하나도 보이지 않으면 그리지 않는다.
+        '''
+        if culler is not None:
+            centers, radii = self.skeleton.bone_spheres(pose)
+            if not culler.visible(centers[None], radii)[0]:
+                return
+        if bind_lights is not None:
+            bind_lights(*points_bounding_sphere(pose[:, :3, 3], BONE_MARGIN))
+        self.renderer.draw(pose, palette_loc, self.__is_fill)
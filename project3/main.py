@@ -1,3 +1,9 @@
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from OpenGL.GL import *
 from glfw.GLFW import *
 import glm
@@ -5,13 +11,34 @@ import ctypes
 import numpy as np
 from camera import Camera as cam
 from loader import Loader as loader
-import os
+from common.async_loader import AsyncLoader
+from crowd import Crowd
+from animation import PlaybackClock
+from blend import AnimationGraph, is_same_skeleton
+from common.capture import FrameCapture, ImageSequenceWriter
+import time
+from common.shader_cache import ShaderCache
+from common.camera_block import CameraBlock, CAMERA_BLOCK_SRC
+from common.lights import LightManager, PointLight, LIGHT_BLOCK_SRC
+from common.frustum import FrustumCuller
+import functools
+
+# shader program cache: source hash -> program, 지원되면 link된 binary를 common/.shader_cache/에 저장
+g_shader_cache = ShaderCache()
 
 g_cam = cam()
 g_loader = loader()
+g_async_loader = AsyncLoader()
+
+g_window_title = 'project3: bvh viewer'
+g_is_title_changed = False
 
 g_screen_width, g_screen_height = 800, 800
 
+# R키로 녹화: 매 frame back buffer를 capture/<시각>/frame_%05d.png로 (PBO ring + writer thread, common/capture.py)
+CAPTURE_DIR = 'capture'
+g_capture = None
+
 # define mouse properties
 last_mouse_x_pos, last_mouse_y_pos = 400, 400
 mouse_pressed = {'left': False, 'right': False}
@@ -22,13 +49,40 @@ g_P = glm.mat4()
 # show frame
 g_show_frame = False
 
-# for frame counting
-g_frame = 0
-g_last_time = 0
+# wall time -> 소수 frame index (frame 사이는 보간해서 그림)
+g_clock = PlaybackClock(1, 0)
+
+# crowd mode: 현재 clip을 g_crowd_size명이 각자 다른 시간 offset으로 재생
+g_crowd = Crowd()
+g_is_crowd = False
+g_crowd_size = 100
+# 같은 skeleton의 bvh를 더 떨어뜨리면 clip으로 추가하고 crossfade (TAB: 다음 clip으로 crossfade)
+g_graph = None
+
+# scene의 point light들 (LightManager가 UBO로 올린다). L키로 EXTRA_LIGHTS를 켜고 끈다
+SCENE_LIGHTS = [
+    PointLight((50, 50, 50), (1, 1, 1), 1.0, 0.00009, 0.000035),
+]
+EXTRA_LIGHTS = [
+    PointLight((0, 10, -10), (0.9, 0.9, 0.9), 1.0, 0.00009, 0.000035),
+    PointLight((-16, 2, 20), (1, 0, 0), 1.0, 0.00009, 0.000035),
+]
+g_lights = None
+
+# 화면 밖의 skeleton / 캐릭터는 그리지 않는다 (K키로 on/off)
+g_culler = FrustumCuller()
+
+# crowd mode에서 title에 표시할 frame time 측정
+g_frame_time_sum = 0
+g_frame_time_cnt = 0
+
+# 이 크기 이하의 clip은 모든 frame의 pose를 메모리에 bake, 넘으면 bvh 옆의 .npy 파일에 memmap으로 bake
+BAKE_MEMORY_LIMIT = 256 * 1024 * 1024
+BAKE_CACHE_SUFFIX = '.poses.npy'
 
 g_vertex_shader_src = '''
 #version 330 core
-
+''' + CAMERA_BLOCK_SRC + '''
 layout (location = 0) in vec3 vin_pos;
 layout (location = 1) in vec3 vin_material_color;
 layout (location = 2) in vec3 vin_normal; 
@@ -37,15 +91,15 @@ out vec3 vout_surface_pos;
 out vec3 vout_material_color;
 out vec3 vout_normal;
 
-uniform mat4 MVP;
 uniform mat4 M;
+uniform mat3 N;     // normal matrix: transpose(inverse(mat3(M))), object마다 CPU에서 계산
 
 void main()
 {
     // 3D points in homogeneous coordinates
     vec4 p3D_in_hcoord = vec4(vin_pos.xyz, 1.0);
 
-    gl_Position = MVP * p3D_in_hcoord;
+    gl_Position = VP * M * p3D_in_hcoord;
 
     vout_surface_pos = vec3(M * vec4(vin_pos, 1));
     vout_material_color = vin_material_color;
@@ -53,26 +107,104 @@ void main()
     if(vin_normal.x == 0 && vin_normal.y == 0 && vin_normal.z == 0) {
         vout_normal = vec3(0,0,0);
     } else {
-        vout_normal = normalize( mat3(inverse(transpose(M)) ) * vin_normal);
+        vout_normal = normalize(N * vin_normal);
     }
 }
 '''
 
-g_fragment_shader_src = '''
+# skeleton batch renderer용: vertex마다 bone index, global transform은 palette(texture buffer)에서 꺼냄
+g_vertex_shader_skeleton_src = '''
+#version 330 core
+''' + CAMERA_BLOCK_SRC + '''
+layout (location = 0) in vec3 vin_pos;
+layout (location = 1) in vec3 vin_material_color;
+layout (location = 2) in vec3 vin_normal; 
+layout (location = 3) in float vin_bone;
+
+out vec3 vout_surface_pos;
+out vec3 vout_material_color;
+out vec3 vout_normal;
+
+uniform samplerBuffer palette;
+
+void main()
+{
+    // palette에는 행렬이 행 단위로 들어있음
+    int base = int(vin_bone) * 4;
+    mat4 M = transpose(mat4(texelFetch(palette, base), texelFetch(palette, base + 1), texelFetch(palette, base + 2), texelFetch(palette, base + 3)));
+
+    // 3D points in homogeneous coordinates
+    vec4 p3D_in_hcoord = vec4(vin_pos.xyz, 1.0);
+
+    gl_Position = VP * M * p3D_in_hcoord;
+
+    vout_surface_pos = vec3(M * vec4(vin_pos, 1));
+    vout_material_color = vin_material_color;
+
+    if(vin_normal.x == 0 && vin_normal.y == 0 && vin_normal.z == 0) {
+        vout_normal = vec3(0,0,0);
+    } else {
+        // palette의 행렬은 회전 + 이동뿐이라 (bvh에는 scale이 없다) inverse transpose가 mat3(M) 자기 자신
+        vout_normal = normalize(mat3(M) * vin_normal);
+    }
+}
+'''
+
+# crowd용: instance(캐릭터)마다 palette에서 자기 bone들의 행렬을 꺼냄
+g_vertex_shader_crowd_src = '''
 #version 330 core
+''' + CAMERA_BLOCK_SRC + '''
+layout (location = 0) in vec3 vin_pos;
+layout (location = 1) in vec3 vin_material_color;
+layout (location = 2) in vec3 vin_normal; 
+layout (location = 3) in float vin_bone;
+
+out vec3 vout_surface_pos;
+out vec3 vout_material_color;
+out vec3 vout_normal;
+
+uniform samplerBuffer palette;
+uniform int bone_cnt;
+uniform int palette_offset;
+
+void main()
+{
+    // palette에는 (캐릭터, bone) 순서로 행렬이 행 단위로 들어있음
+    int base = (palette_offset + gl_InstanceID * bone_cnt + int(vin_bone)) * 4;
+    mat4 M = transpose(mat4(texelFetch(palette, base), texelFetch(palette, base + 1), texelFetch(palette, base + 2), texelFetch(palette, base + 3)));
+
+    // 3D points in homogeneous coordinates
+    vec4 p3D_in_hcoord = vec4(vin_pos.xyz, 1.0);
+
+    gl_Position = VP * M * p3D_in_hcoord;
+
+    vout_surface_pos = vec3(M * vec4(vin_pos, 1));
+    vout_material_color = vin_material_color;
+
+    if(vin_normal.x == 0 && vin_normal.y == 0 && vin_normal.z == 0) {
+        vout_normal = vec3(0,0,0);
+    } else {
+        // palette의 행렬은 회전 + 이동뿐이라 (bvh에는 scale이 없다) inverse transpose가 mat3(M) 자기 자신
+        vout_normal = normalize(mat3(M) * vin_normal);
+    }
+}
+'''
 
+g_fragment_shader_src = '''
+#version 330 core
+''' + CAMERA_BLOCK_SRC + LIGHT_BLOCK_SRC + '''
 in vec3 vout_surface_pos;
 in vec3 vout_material_color;
 in vec3 vout_normal;
 
 out vec4 FragColor;
 
-uniform vec3 view_pos;
-
-vec3 calcPointLight(vec3 light_pos, vec3 light_color, vec3 normal, vec3 surface_pos, vec3 view_dir, vec3 material_color, float material_shininess){
-    float constant = 1.0f;
-    float linear = 0.00009f;
-    float quadratic = 0.000035f;
+vec3 calcPointLight(PointLight light, vec3 normal, vec3 surface_pos, vec3 view_dir, vec3 material_color, float material_shininess){
+    vec3 light_pos = light.position.xyz;
+    vec3 light_color = light.color.rgb;
+    float constant = light.attenuation.x;
+    float linear = light.attenuation.y;
+    float quadratic = light.attenuation.z;
     
     // light components
     vec3 light_ambient = 0.1 * light_color;
@@ -116,17 +248,13 @@ void main()
     }
 
     else {
-        // light and material properties
-        int light_cnt = 1;
-        vec3 light_pos[3] = {vec3(50, 50, 50), vec3(0, 10, -10), vec3(-16, 2, 20)};
-        vec3 light_color[3] = {vec3(1, 1, 1), vec3(0.9, 0.9, 0.9), vec3(1, 0, 0)};
-
         vec3 normal = normalize(vout_normal);    
         vec3 view_dir = normalize(view_pos - vout_surface_pos);
-        vec3 color = calcPointLight(light_pos[0], light_color[0], normal, vout_surface_pos, view_dir, vout_material_color, 32.0);
-        
-        for(int i = 1; i < light_cnt; i++){
-            color += calcPointLight(light_pos[i], light_color[i], normal, vout_surface_pos, view_dir, vout_material_color, 32.0);
+        vec3 color = vec3(0);
+
+        // light는 LightManager가 UBO로, 그중 이 object에 닿는 것들의 index만 object_lights로 넘어온다
+        for(int i = 0; i < object_light_cnt; i++){
+            color += calcPointLight(lights[object_lights[i]], normal, vout_surface_pos, view_dir, vout_material_color, 32.0);
         }
 
         FragColor = vec4(color, 1.);
@@ -134,50 +262,29 @@ void main()
 }
 '''
 def load_shaders(vertex_shader_source, fragment_shader_source):
-    # build and compile our shader program
-    # ------------------------------------
-    
-    # vertex shader 
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)    # create an empty shader object
-    glShaderSource(vertex_shader, vertex_shader_source) # provide shader source code
-    glCompileShader(vertex_shader)                      # compile the shader object
-    
-    # check for shader compile errors
-    success = glGetShaderiv(vertex_shader, GL_COMPILE_STATUS)
-    if (not success):
-        infoLog = glGetShaderInfoLog(vertex_shader)
-        print("ERROR::SHADER::VERTEX::COMPILATION_FAILED\n" + infoLog.decode())
-        
-    # fragment shader
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)    # create an empty shader object
-    glShaderSource(fragment_shader, fragment_shader_source) # provide shader source code
-    glCompileShader(fragment_shader)                        # compile the shader object
-    
-    # check for shader compile errors
-    success = glGetShaderiv(fragment_shader, GL_COMPILE_STATUS)
-    if (not success):
-        infoLog = glGetShaderInfoLog(fragment_shader)
-        print("ERROR::SHADER::FRAGMENT::COMPILATION_FAILED\n" + infoLog.decode())
-
-    # link shaders
-    shader_program = glCreateProgram()               # create an empty program object
-    glAttachShader(shader_program, vertex_shader)    # attach the shader objects to the program object
-    glAttachShader(shader_program, fragment_shader)
-    glLinkProgram(shader_program)                    # link the program object
-
-    # check for linking errors
-    success = glGetProgramiv(shader_program, GL_LINK_STATUS)
-    if (not success):
-        infoLog = glGetProgramInfoLog(shader_program)
-        print("ERROR::SHADER::PROGRAM::LINKING_FAILED\n" + infoLog.decode())
-        
-    glDeleteShader(vertex_shader)
-    glDeleteShader(fragment_shader)
-
-    return shader_program    # return the shader program
+    # 같은 source의 program은 한 번만 만든다 (memory / disk의 program binary, common/shader_cache.py)
+    # return: ShaderProgram (glUseProgram에는 .id, uniform location은 .location(name))
+    return g_shader_cache.program(vertex_shader_source, fragment_shader_source)
+
+def rebuild_crowd():
+    global g_crowd, g_frame_time_sum, g_frame_time_cnt
+    g_crowd.clear()
+    if g_graph is not None:
+        g_graph.resize(g_crowd_size if g_is_crowd else 1)
+    if g_is_crowd and g_loader.root is not None:
+        # clip이 하나뿐이면 graph 없이 baked pose를 그대로 쓴다
+        graph = g_graph if is_blending() else None
+        g_crowd.add_characters(g_loader, g_crowd_size, graph=graph)
+    g_frame_time_sum, g_frame_time_cnt = 0, 0
+
+def is_blending():
+    return g_graph is not None and len(g_graph.clips) > 1
+
+def crossfade_to(clip_index):
+    g_graph.crossfade(clip_index, g_clock.time(glfwGetTime()))
 
 def key_callback(window, key, scancode, action, mods):
-    global g_P, g_cam, g_screen_width, g_screen_height, g_show_frame, g_loader
+    global g_P, g_cam, g_screen_width, g_screen_height, g_show_frame, g_loader, g_clock, g_is_crowd, g_crowd_size
     if key==GLFW_KEY_ESCAPE and action==GLFW_PRESS:
         glfwSetWindowShouldClose(window, GLFW_TRUE)
     elif key == GLFW_KEY_V and action == GLFW_PRESS:
@@ -196,6 +303,12 @@ def key_callback(window, key, scancode, action, mods):
     elif key == GLFW_KEY_F and action == GLFW_PRESS:
         g_show_frame = not g_show_frame
 
+    elif key == GLFW_KEY_R and action == GLFW_PRESS:
+        if g_capture is None:
+            start_capture(window)
+        else:
+            stop_capture(window)
+
     elif key == GLFW_KEY_1 and action == GLFW_PRESS:
         g_loader.change_is_fill(False)
 
@@ -204,12 +317,53 @@ def key_callback(window, key, scancode, action, mods):
     
     elif key == GLFW_KEY_SPACE and action == GLFW_PRESS:
         g_loader.change_is_animating()
+        g_clock.toggle(glfwGetTime())
+
+    # 멈춘 상태에서 frame 단위로 앞뒤 이동 (scrub)
+    elif (key == GLFW_KEY_LEFT or key == GLFW_KEY_RIGHT) and action in (GLFW_PRESS, GLFW_REPEAT):
+        if g_loader.root is not None and not g_loader.is_animating and g_clock.frame_cnt > 0:
+            step = 1 if key == GLFW_KEY_RIGHT else -1
+            if mods & GLFW_MOD_SHIFT:
+                step *= 10
+            now = glfwGetTime()
+            frame = (round(g_clock.frame(now)) + step) % g_clock.frame_cnt
+            g_clock.seek(frame, now)
+            g_loader.update_global_transforms(frame)
+
+    # crowd mode on/off, 캐릭터 수 2배 / 절반
+    elif key == GLFW_KEY_C and action == GLFW_PRESS:
+        g_is_crowd = not g_is_crowd
+        rebuild_crowd()
+        if not g_is_crowd:
+            glfwSetWindowTitle(window, g_window_title)
+
+    elif (key == GLFW_KEY_EQUAL or key == GLFW_KEY_MINUS) and action == GLFW_PRESS and g_is_crowd:
+        g_crowd_size = g_crowd_size * 2 if key == GLFW_KEY_EQUAL else max(g_crowd_size // 2, 1)
+        rebuild_crowd()
+
+    # frustum culling on/off
+    elif key == GLFW_KEY_K and action == GLFW_PRESS:
+        g_culler.is_enabled = not g_culler.is_enabled
+
+    # 추가 light on/off
+    elif key == GLFW_KEY_L and action == GLFW_PRESS and g_lights is not None:
+        if g_lights.light_cnt > len(SCENE_LIGHTS):
+            g_lights.set_lights(SCENE_LIGHTS)
+        else:
+            g_lights.set_lights(SCENE_LIGHTS + EXTRA_LIGHTS)
+
+    elif key == GLFW_KEY_TAB and action == GLFW_PRESS and is_blending():
+        crossfade_to((g_graph.current[0] + 1) % len(g_graph.clips))
 
 def framebuffer_size_callback(window, width, height):
     global g_P, g_cam, g_screen_width, g_screen_height
 
     glViewport(0, 0, width, height)
 
+    # 녹화 중에는 frame 크기가 바뀌면 안 되므로 멈춘다
+    if g_capture is not None and (width, height) != (g_capture.width, g_capture.height):
+        stop_capture(window)
+
     g_screen_width, g_screen_height = width, height
     if height == 0:
         return
@@ -264,15 +418,101 @@ def scroll_callback(window, x_scroll, y_scroll):
     global g_cam
     g_cam.scroll(0.5, y_scroll)
 
+def load_bvh(filepath, progress):
+    # worker thread에서 실행: 파싱 + pose bake까지만 하고 VAO 생성은 main thread의 finish_loading에서
+    new_loader = loader()
+    new_loader.parse_bvh(filepath, progress)
+
+    # 모든 frame의 global transform을 미리 계산. 너무 크면 bvh 옆의 .npy 파일에 memmap으로
+    if new_loader.baked_nbytes() <= BAKE_MEMORY_LIMIT:
+        new_loader.bake()
+    else:
+        try:
+            new_loader.bake(filepath + BAKE_CACHE_SUFFIX)
+        except OSError:
+            pass
+    return new_loader
+
+def finish_loading(window):
+    global g_loader, g_clock, g_async_loader, g_is_title_changed, g_graph
+
+    for filepath, new_loader, error in g_async_loader.poll():
+        if error is not None:
+            print('failed to load ' + filepath + ': ' + str(error))
+            continue
+
+        new_loader.print_bvh_data()
+
+        # 같은 skeleton이면 현재 skeleton에 clip으로 추가하고 crossfade
+        if g_loader.root is not None and is_same_skeleton(g_loader, new_loader):
+            was_blending = is_blending()
+            clip_index = g_graph.add_clip(new_loader.clip)
+            print('added clip %d: %s' % (clip_index, filepath))
+            if not was_blending:
+                rebuild_crowd()
+            crossfade_to(clip_index)
+            continue
+
+        new_loader.prepare_vaos_line()
+        new_loader.prepare_vaos_box()
+        new_loader.change_is_fill(g_loader.is_fill)
+
+        g_crowd.clear()
+        g_loader.delete_vaos()
+        g_loader = new_loader
+        g_clock = PlaybackClock(g_loader.frame_time, g_loader.clip.frame_cnt)
+        g_graph = AnimationGraph(g_loader)
+        rebuild_crowd()
+
+    # 진행 상황은 window title에 표시
+    if g_async_loader.is_loading:
+        glfwSetWindowTitle(window, g_window_title + ' - ' + g_async_loader.progress_text())
+        g_is_title_changed = True
+    elif g_is_title_changed:
+        glfwSetWindowTitle(window, g_window_title)
+        g_is_title_changed = False
+
+def show_crowd_frame_time(window, frame_dt):
+    global g_frame_time_sum, g_frame_time_cnt
+
+    g_frame_time_sum += frame_dt
+    g_frame_time_cnt += 1
+
+    # 0.5초마다 평균을 표시
+    if g_frame_time_sum >= 0.5 and not g_async_loader.is_loading:
+        glfwSetWindowTitle(window, g_window_title + ' - crowd: %d characters (%d culled), %.2f ms/frame' % (
+            g_crowd.character_cnt, g_culler.culled_cnt, 1000 * g_frame_time_sum / g_frame_time_cnt))
+        g_frame_time_sum, g_frame_time_cnt = 0, 0
+
+def start_capture(window):
+    global g_capture
+
+    width, height = glfwGetFramebufferSize(window)
+    if width == 0 or height == 0:
+        return
+    directory = os.path.join(CAPTURE_DIR, time.strftime('%Y%m%d-%H%M%S'))
+    g_capture = FrameCapture(width, height, ImageSequenceWriter(os.path.join(directory, 'frame_%05d.png')), read_buffer=GL_BACK)
+    print('recording to ' + directory)
+
+def stop_capture(window):
+    global g_capture
+
+    capture, g_capture = g_capture, None
+    capture.close()
+    print(capture.report())
+    glfwSetWindowTitle(window, g_window_title)
+
+def show_capture_status(window):
+    # 30 frame마다 title에 녹화한 frame 수와 capture 비용 표시
+    if g_capture.frame_cnt % 30 == 0:
+        glfwSetWindowTitle(window, g_window_title + ' - recording %d frames, capture %.2f ms/frame' % (
+            g_capture.frame_cnt, 1000 * g_capture.capture_time / g_capture.frame_cnt))
+
 def drop_callback(window, filepath):
-    global g_loader, g_frame, g_last_time
+    global g_async_loader
 
-    g_loader.parse_bvh(os.path.join(filepath[0]))
-    g_loader.print_bvh_data()
-    g_loader.prepare_vaos_line()
-    g_loader.prepare_vaos_box()
-    g_last_time = glfwGetTime()
-    g_frame = 0
+    # 파싱은 background에서, 그동안 이전 animation은 계속 그려진다
+    g_async_loader.submit(os.path.join(filepath[0]), load_bvh)
 
 def prepare_vao_frame():
     # prepare vertex data (in main memory)
@@ -350,7 +590,7 @@ def draw_grid(vao):
     glDrawArrays(GL_LINES, 0, 204)
 
 def main():
-    global g_P, g_cam, g_show_frame, g_loader, g_last_time, g_frame
+    global g_P, g_cam, g_show_frame, g_loader, g_lights
 
     # initialize glfw
     if not glfwInit():
@@ -361,7 +601,7 @@ def main():
     glfwWindowHint(GLFW_OPENGL_FORWARD_COMPAT, GL_TRUE) # for macOS
 
     # create a window and OpenGL context
-    window = glfwCreateWindow(800, 800, 'project3: bvh viewer', None, None)
+    window = glfwCreateWindow(800, 800, g_window_title, None, None)
     if not window:
         glfwTerminate()
         return
@@ -378,11 +618,30 @@ def main():
     # load shaders
     shader_program = load_shaders(g_vertex_shader_src, g_fragment_shader_src)
 
-    # get uniform locations
-    MVP_loc = glGetUniformLocation(shader_program, 'MVP')
-    M_loc = glGetUniformLocation(shader_program, 'M')
-    view_pos_loc = glGetUniformLocation(shader_program, 'view_pos')
-    color_loc = glGetUniformLocation(shader_program, 'color_loc')
+    # get uniform locations (P, V, VP, view_pos는 camera UBO로)
+    M_loc = shader_program.location('M')
+    N_loc = shader_program.location('N')
+
+    shader_program_skeleton = load_shaders(g_vertex_shader_skeleton_src, g_fragment_shader_src)
+    palette_loc = shader_program_skeleton.location('palette')
+
+    shader_program_crowd = load_shaders(g_vertex_shader_crowd_src, g_fragment_shader_src)
+    palette_crowd_loc = shader_program_crowd.location('palette')
+    bone_cnt_loc = shader_program_crowd.location('bone_cnt')
+    palette_offset_loc = shader_program_crowd.location('palette_offset')
+
+    # 모든 program이 같이 쓰는 per-frame camera UBO
+    camera_block = CameraBlock()
+    for program in (shader_program, shader_program_skeleton, shader_program_crowd):
+        camera_block.attach(program)
+
+    # point light UBO, object마다 닿는 light만 고른다
+    g_lights = LightManager(SCENE_LIGHTS)
+    for program in (shader_program, shader_program_skeleton, shader_program_crowd):
+        g_lights.attach(program)
+
+    # shader 준비에 걸린 시간 (cache가 비어있으면 compile, 있으면 program binary)
+    print(g_shader_cache.report())
 
     # prepare vao
     vao_grid = prepare_vao_grid()
@@ -391,9 +650,7 @@ def main():
     # initialize projection matrix
     g_P = glm.perspective(glm.radians(45.0), 1, 0.5, 20)
 
-    # animation loader
-    last_time = glfwGetTime()
-    current_time = last_time
+    frame_start = glfwGetTime()
 
     # loop until the user closes the window
     while not glfwWindowShouldClose(window):
@@ -407,41 +664,69 @@ def main():
         else:
             glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
             
-        glUseProgram(shader_program)
-
-        M = glm.mat4()
+        # P, V, VP, 카메라 위치는 frame마다 한 번 UBO로
         V = glm.lookAt(g_cam.pos, g_cam.pos + g_cam.front, g_cam.up)
+        camera_block.update(g_P, V, g_cam.pos)
+        g_culler.update(g_P, V)
+        g_lights.update()
 
-        MVP = g_P * V * M
+        glUseProgram(shader_program.id)
 
-        glUniformMatrix4fv(MVP_loc, 1, GL_FALSE, glm.value_ptr(MVP))
+        M = glm.mat4()
+        N = glm.mat3()
         glUniformMatrix4fv(M_loc, 1, GL_FALSE, glm.value_ptr(M))
-        glUniform3f(view_pos_loc, g_cam.pos.x, g_cam.pos.y, g_cam.pos.z)
+        glUniformMatrix3fv(N_loc, 1, GL_FALSE, glm.value_ptr(N))
         
         # draw grid
         draw_grid(vao_grid)
         draw_frame(vao_frame)
 
-        if(g_loader.root is not None):
-            # last_time - current_time(dt)가 frame time 보다 길때, 새롭게 그린다.
-
-            if g_loader.is_animating:
-                current_time = glfwGetTime()
-                if current_time - g_last_time >= g_loader.frame_time:
-                    g_last_time = current_time
-                    g_frame += 1
-
-                if g_frame == g_loader.frames:
-                    g_frame = 0 # 새로운 drop callback이 실행될 때 frame 초기화
-                
-            g_loader.draw_animation(g_P*V, MVP_loc, color_loc, g_frame, M_loc)
+        now = glfwGetTime()
+
+        if g_is_crowd and g_crowd.character_cnt > 0:
+            # 캐릭터마다 clip 시간 = 재생 시간 + 자기 offset
+            g_crowd.update(g_clock.time(now))
+            glUseProgram(shader_program_crowd.id)
+            g_crowd.draw(palette_crowd_loc, bone_cnt_loc, palette_offset_loc, g_loader.is_fill,
+                         functools.partial(g_lights.bind_object, shader_program_crowd), g_culler)
+
+        elif(g_loader.root is not None):
+            # 실제 흐른 시간에 해당하는 소수 frame을 그린다. (렌더링이 느리면 frame을 건너뛰고, 빠르면 frame 사이를 보간)
+            glUseProgram(shader_program_skeleton.id)
+            bind_lights = functools.partial(g_lights.bind_object, shader_program_skeleton)
+            if is_blending():
+                g_loader.draw_pose(g_graph.evaluate(g_clock.time(now))[0], palette_loc, bind_lights, g_culler)
+            else:
+                g_loader.draw_animation(palette_loc, g_clock.frame(now), bind_lights, g_culler)
+
+        # 녹화 중이면 swap 전에 back buffer의 readback을 건다
+        if g_capture is not None:
+            g_capture.capture()
+            show_capture_status(window)
 
         # swap front and back buffers
         glfwSwapBuffers(window)
 
+        # background에서 파싱이 끝난 animation을 upload
+        finish_loading(window)
+
+        # 한 frame에 걸린 시간 (crowd mode에서는 캐릭터 수와 함께 title에 표시)
+        frame_end = glfwGetTime()
+        frame_dt = frame_end - frame_start
+        frame_start = frame_end
+        if g_is_crowd:
+            show_crowd_frame_time(window, frame_dt)
+
         # poll events
         glfwPollEvents()
 
+    if g_capture is not None:
+        stop_capture(window)
+
+    # object마다 평균 몇 개의 light를 계산했는지
+    print(g_lights.report())
+    print(g_culler.report())
+
     # terminate glfw
     glfwTerminate()
 
@@ -3,6 +3,11 @@ from glfw.GLFW import *
 import glm
 import ctypes
 import numpy as np
+import functools
+from animation import LOCAL_TRANSFORM_CACHE_SIZE
+
+# box mode에서 bone cuboid의 반 두께
+BONE_THICKNESS = 0.05
 
 class Node:
     def __init__(self, parent, node_name, color):
@@ -17,7 +22,20 @@ class Node:
         
         # joint transform (dynamic data)
         self.channels = [] 
-        self.joint_transform = []
+        # MOTION 한 줄에서 이 joint의 channel이 시작하는 column
+        self.channel_offset = 0
+        # compile_channels()에서 정해짐
+        # - translation_columns: x, y, z position channel의 MOTION column (없으면 None)
+        # - rotation_columns: 회전 channel의 MOTION column (channel 순서)
+        # - euler_order: 회전 channel의 축 순서 code (ex. 'ZXY')
+        self.translation_columns = [None, None, None]
+        self.rotation_columns = []
+        self.euler_order = ''
+        # skeleton(DFS 순서)과 clip의 joint 축에서 이 joint의 index (Skeleton이 정함)
+        self.index = 0
+        self.clip = None
+        # frame -> local transform(glm.mat4) LRU cache
+        self.get_joint_transform = functools.lru_cache(maxsize=LOCAL_TRANSFORM_CACHE_SIZE)(self.build_joint_transform)
 
         # global transformation matrix for calculating
         self.global_transform = glm.mat4()
@@ -27,35 +45,39 @@ class Node:
         # name
         self.joint_name = node_name
 
-        # calculated vao for each node
-        self.vao_line = None
-        self.vao_box = None
-
     def set_link_transformation(self, link_transformation):
         self.link_transform_from_parent = link_transformation
 
-    def append_joint_transform(self, joint_transforms):
-        T_x = 0
-        T_y = 0
-        T_z = 0
-        R = glm.mat4()
-
-        for i, joint_transform in enumerate(joint_transforms):
-            channel_i = self.channels[i].lower()
-            if channel_i == 'xposition':
-                T_x = float(joint_transform)
-            elif channel_i == 'yposition':
-                T_y = float(joint_transform)
-            elif channel_i == 'zposition':
-                T_z = float(joint_transform)
-            elif channel_i == 'xrotation':
-                R = R * glm.rotate(glm.radians(float(joint_transform)), (1, 0, 0))
-            elif channel_i == 'yrotation':
-                R = R * glm.rotate(glm.radians(float(joint_transform)), (0, 1, 0))
-            elif channel_i == 'zrotation':
-                R = R * glm.rotate(glm.radians(float(joint_transform)), (0, 0, 1))
-
-        self.joint_transform.append(glm.translate(glm.vec3(T_x, T_y, T_z)) * R)
+    def compile_channels(self):
+        '''
+        CHANNELS의 문자열을 한 번만 해석해서 MOTION column과 Euler 회전 순서 code로 바꿔둔다.
+        '''
+        self.translation_columns = [None, None, None]
+        self.rotation_columns = []
+        self.euler_order = ''
+        for i, channel in enumerate(self.channels):
+            channel_i = channel.lower()
+            axis = channel_i[:1].upper()
+            if axis not in ('X', 'Y', 'Z'):
+                continue
+            if channel_i.endswith('position'):
+                self.translation_columns['XYZ'.index(axis)] = self.channel_offset + i
+            elif channel_i.endswith('rotation'):
+                self.rotation_columns.append(self.channel_offset + i)
+                self.euler_order += axis
+
+    def set_motion(self, clip):
+        '''
+        clip: Loader가 읽은 AnimationClip
+        행렬은 필요할 때 get_joint_transform에서 clip의 quaternion으로 만든다.
+        '''
+        self.clip = clip
+        self.get_joint_transform.cache_clear()
+
+    def build_joint_transform(self, frame):
+        w, x, y, z = (float(value) for value in self.clip.rotations[frame, self.index])
+        T = glm.vec3(*(float(value) for value in self.clip.joint_translation(frame, self.index)))
+        return glm.translate(T) * glm.mat4_cast(glm.quat(w, x, y, z))
 
     def get_global_transform(self):
         return self.global_transform
@@ -74,46 +96,33 @@ class Node:
     
     def update_tree_global_transform(self, frame):
         if self.parent is not None:
-            self.global_transform = self.parent.get_global_transform() * self.link_transform_from_parent * self.joint_transform[frame]
+            self.global_transform = self.parent.get_global_transform() * self.link_transform_from_parent * self.get_joint_transform(frame)
         else:
-            self.global_transform = self.link_transform_from_parent * self.joint_transform[frame]
+            self.global_transform = self.link_transform_from_parent * self.get_joint_transform(frame)
 
         for child in self.children:
             child.update_tree_global_transform(frame)
 
-    def prepare_vao_line(self):
-        # prepare vertex data (in main memory)
-        vertices = glm.array(glm.float32,
-            # position        # color
-            0.0, 0.0, 0.0,  1.0, 0.5, 1.0, # line start
-            self.link_transform_from_parent[3].x, self.link_transform_from_parent[3].y, self.link_transform_from_parent[3].z,  1.0, 0.5, 1.0, # line end(each of them is offset, xyz value)
-        )
-
-        # create and activate VAO (vertex array object)
-        VAO = glGenVertexArrays(1)  # create a vertex array object ID and store it to VAO variable
-        glBindVertexArray(VAO)      # activate VAO
-
-        # create and activate VBO (vertex buffer object)
-        VBO = glGenBuffers(1)   # create a buffer object ID and store it to VBO variable
-        glBindBuffer(GL_ARRAY_BUFFER, VBO)  # activate VBO as a vertex buffer object
-
-        # copy vertex data to VBO
-        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices.ptr, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
-
-        # configure vertex positions
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 6 * glm.sizeof(glm.float32), None)
-        glEnableVertexAttribArray(0)
-
-        # configure vertex colors
-        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 6 * glm.sizeof(glm.float32), ctypes.c_void_p(3*glm.sizeof(glm.float32)))
-        glEnableVertexAttribArray(1)
-
-        self.vao_line = VAO
-    
-    def prepare_vao_box(self):
-        # prepare vertex data (in main memory)
+    def line_vertices(self):
+        '''
+        parent 좌표계에서 이 joint까지의 선분 (2 vertices)
+        vertex: position(3), color(3), normal(3). 선은 조명을 받지 않으므로 normal은 0
+        '''
+        offset = self.link_transform_from_parent[3]
+        color = [1.0, 0.5, 1.0]
+        return np.array([
+            # position        # color        # normal
+            [0.0, 0.0, 0.0] + color + [0.0, 0.0, 0.0], # line start
+            [offset.x, offset.y, offset.z] + color + [0.0, 0.0, 0.0], # line end(each of them is offset, xyz value)
+        ], dtype='f4')
+
+    def box_vertices(self):
+        '''
+        parent 좌표계에서 이 joint까지의 offset 방향으로 세운 cuboid (36 vertices)
+        vertex: position(3), color(3), normal(3)
+        '''
         # 36 vertices for 12 triangles
-        thickness = 0.05
+        thickness = BONE_THICKNESS
 
         offset_x = self.link_transform_from_parent[3].x
         offset_y = self.link_transform_from_parent[3].y
@@ -171,60 +180,4 @@ class Node:
             for index in cuboid_index:
                 vertices.append([cuboid_vertices[index][0], cuboid_vertices[index][1], cuboid_vertices[index][2], color[0], color[1], color[2], one_vnormal[0], one_vnormal[1], one_vnormal[2]])
 
-        vertices = np.concatenate(np.array(vertices, dtype='f4'))
-        vertices = glm.array(vertices)
-
-        # create and activate VAO (vertex array object)
-        VAO = glGenVertexArrays(1)  # create a vertex array object ID and store it to VAO variable
-        glBindVertexArray(VAO)      # activate VAO
-
-        # create and activate VBO (vertex buffer object)
-        VBO = glGenBuffers(1)   # create a buffer object ID and store it to VBO variable
-        glBindBuffer(GL_ARRAY_BUFFER, VBO)  # activate VBO as a vertex buffer object
-
-        # copy vertex data to VBO
-        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices.ptr, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
-
-        # configure vertex positions
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 9 * glm.sizeof(glm.float32), None)
-        glEnableVertexAttribArray(0)
-
-        # configure vertex color
-        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 9 * glm.sizeof(glm.float32), ctypes.c_void_p(3*glm.sizeof(glm.float32)))
-        glEnableVertexAttribArray(1)
-
-        # configure vertex normal
-        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, 9 * glm.sizeof(glm.float32), ctypes.c_void_p(6*glm.sizeof(glm.float32)))
-        glEnableVertexAttribArray(2)
-
-        self.vao_box = VAO
-
-    def draw_node_line(self, VP, MVP_loc, color_loc):
-        MVP = glm.mat4()
-
-        if self.parent is not None:
-            MVP = VP * self.parent.get_global_transform()
-        else:
-            MVP = VP * self.get_global_transform()
-        color = self.get_color()
-
-        glBindVertexArray(self.vao_line)
-        glUniformMatrix4fv(MVP_loc, 1, GL_FALSE, glm.value_ptr(MVP))
-        glUniform3f(color_loc, color.r, color.g, color.b)
-        glDrawArrays(GL_LINES, 0, 2)
-
-    def draw_node_box(self, VP, MVP_loc, color_loc, M_loc):
-        M = glm.mat4()
-        if self.parent is not None:
-            M = self.parent.get_global_transform()
-        else:
-            M = self.get_global_transform()
-
-        MVP = VP * M
-        color = self.get_color()
-
-        glBindVertexArray(self.vao_box)
-        glUniformMatrix4fv(MVP_loc, 1, GL_FALSE, glm.value_ptr(MVP))        
-        glUniformMatrix4fv(M_loc, 1, GL_FALSE, glm.value_ptr(M))
-        glUniform3f(color_loc, color.r, color.g, color.b)
-        glDrawArrays(GL_TRIANGLES, 0, 36)
\ No newline at end of file
+        return np.array(vertices, dtype='f4')
@@ -0,0 +1,138 @@
+'''
+vectorized quaternion 연산
+
+quaternion은 (..., 4) 배열의 (w, x, y, z) 순서 (glm.quat(w, x, y, z)와 같은 순서)이고,
+모든 함수는 앞쪽 축들(frame, joint, 캐릭터 ...)에 대해 broadcast 된다.
+9-Lab-Orientation-Rotation/2-slerp.py의 slerp(R1, R2, t) = R1 * exp(t * log(R1^T * R2))와 같은 회전을
+quaternion으로 계산한다.
+'''
+import numpy as np
+
+# sin(theta)가 이보다 작으면 (두 회전이 거의 같으면) slerp 대신 nlerp
+SLERP_EPSILON = 1e-6
+
+
+def normalize(q):
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def from_matrix(R):
+    '''
+    회전행렬 (..., 3, 3) -> 단위 quaternion (..., 4)
+    수치적으로 안정하도록 w, x, y, z 중 가장 큰 성분을 기준으로 나머지를 구한다.
+    '''
+    m00, m01, m02 = R[..., 0, 0], R[..., 0, 1], R[..., 0, 2]
+    m10, m11, m12 = R[..., 1, 0], R[..., 1, 1], R[..., 1, 2]
+    m20, m21, m22 = R[..., 2, 0], R[..., 2, 1], R[..., 2, 2]
+
+    # 4 * (w^2, x^2, y^2, z^2)
+    squares = np.stack([1 + m00 + m11 + m22,
+                        1 + m00 - m11 - m22,
+                        1 - m00 + m11 - m22,
+                        1 - m00 - m11 + m22], axis=-1)
+    largest = np.argmax(squares, axis=-1)
+    s = 2 * np.sqrt(np.maximum(np.take_along_axis(squares, largest[..., None], axis=-1)[..., 0], SLERP_EPSILON))
+
+    # 가장 큰 성분이 w, x, y, z일 때 각각의 (w, x, y, z)
+    candidates = np.stack([
+        np.stack([s / 4, (m21 - m12) / s, (m02 - m20) / s, (m10 - m01) / s], axis=-1),
+        np.stack([(m21 - m12) / s, s / 4, (m01 + m10) / s, (m02 + m20) / s], axis=-1),
+        np.stack([(m02 - m20) / s, (m01 + m10) / s, s / 4, (m12 + m21) / s], axis=-1),
+        np.stack([(m10 - m01) / s, (m02 + m20) / s, (m12 + m21) / s, s / 4], axis=-1),
+    ], axis=-2)
+    q = np.take_along_axis(candidates, largest[..., None, None], axis=-2)[..., 0, :]
+    return normalize(q)
+
+
+def to_matrix(q):
+    '''
+    단위 quaternion (..., 4) -> 회전행렬 (..., 3, 3)
+    '''
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    R = np.empty(q.shape[:-1] + (3, 3), dtype=q.dtype)
+    R[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    R[..., 0, 1] = 2 * (x * y - w * z)
+    R[..., 0, 2] = 2 * (x * z + w * y)
+    R[..., 1, 0] = 2 * (x * y + w * z)
+    R[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    R[..., 1, 2] = 2 * (y * z - w * x)
+    R[..., 2, 0] = 2 * (x * z - w * y)
+    R[..., 2, 1] = 2 * (y * z + w * x)
+    R[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def slerp(q1, q2, t):
+    '''
+    q1, q2: (..., 4) 단위 quaternion, t: q1.shape[:-1]과 broadcast 되는 보간 비율 (0이면 q1, 1이면 q2)
+    짧은 쪽 호를 따라 보간한다.
+    '''
+    t = np.asarray(t, dtype=q1.dtype)[..., None]
+    dot = np.sum(q1 * q2, axis=-1, keepdims=True)
+    # q와 -q는 같은 회전: 짧은 쪽으로 돌도록 부호를 맞춤
+    q2 = np.where(dot < 0, -q2, q2)
+    dot = np.abs(dot)
+
+    theta = np.arccos(np.clip(dot, -1, 1))
+    sin_theta = np.sin(theta)
+    is_small = sin_theta < SLERP_EPSILON
+    safe_sin = np.where(is_small, 1, sin_theta)
+
+    w1 = np.where(is_small, 1 - t, np.sin((1 - t) * theta) / safe_sin)
+    w2 = np.where(is_small, t, np.sin(t * theta) / safe_sin)
+    return normalize(w1 * q1 + w2 * q2)
+
+
+def lerp(a, b, t):
+    '''
+    translation 등 벡터 (..., k)의 선형 보간. t는 a.shape[:-1]과 broadcast
+    '''
+    t = np.asarray(t, dtype=a.dtype)[..., None]
+    return a + (b - a) * t
+
+
+def multiply(q1, q2):
+    '''
+    quaternion 곱 q1 * q2 (회전행렬 R1 * R2와 같은 순서)
+    '''
+    w1, x1, y1, z1 = q1[..., 0], q1[..., 1], q1[..., 2], q1[..., 3]
+    w2, x2, y2, z2 = q2[..., 0], q2[..., 1], q2[..., 2], q2[..., 3]
+    return np.stack([w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2], axis=-1)
+
+
+def from_axis_angle(axes, radians):
+    '''
+    axes: x, y, z 축 index(0, 1, 2) 배열, radians: axes와 broadcast 되는 회전각
+    return: (..., 4) 축 회전 quaternion (cos(angle / 2), sin(angle / 2) * axis)
+    '''
+    half = np.asarray(radians) / 2
+    q = np.zeros(half.shape + (4,), dtype=half.dtype)
+    q[..., 0] = np.cos(half)
+    np.put_along_axis(q, 1 + np.broadcast_to(axes, half.shape)[..., None], np.sin(half)[..., None], axis=-1)
+    return q
+
+
+def from_euler(radians, axes):
+    '''
+    radians: (..., k) channel 순서의 Euler angle, axes: (..., k) 각 channel의 회전축 index
+    return: (..., 4) q0 * q1 * ... (R = R0 * R1 * ... 와 같은 회전)
+    '''
+    q = from_axis_angle(axes, radians)
+    result = q[..., 0, :]
+    for k in range(1, q.shape[-2]):
+        result = multiply(result, q[..., k, :])
+    return result
+
+
+def nlerp(q, weights):
+    '''
+    여러 pose의 가중 평균 회전 (normalized linear interpolation)
+    q: (K, ..., 4) K개의 quaternion, weights: (K, ...) 가중치
+    q와 -q는 같은 회전이므로 모두 q[0]과 같은 반구로 부호를 맞춘 뒤 더하고 정규화한다.
+    '''
+    signs = np.where(np.sum(q * q[:1], axis=-1) < 0, -1, 1).astype(q.dtype)
+    blended = np.sum(q * (signs * weights)[..., None], axis=0)
+    return normalize(blended)
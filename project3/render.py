@@ -0,0 +1,179 @@
+'''
+headless batch renderer: bvh animation -> 이미지 sequence / raw video
+
+window 없이 offscreen FBO에 그리고 PBO ring으로 읽어서 내보낸다. (common/offline.py, common/capture.py)
+재생 시간은 wall clock이 아니라 출력 frame 번호로 정한다: 출력 frame i = clip 시간 i / fps
+(fps를 지정하지 않으면 bvh의 frame rate = bvh frame i를 그대로)
+
+usage:
+    python render.py a.bvh -o out                        # out/frame_00000.png ...
+    python render.py a.bvh -o out/%04d.ppm --box         # PPM, box mode
+    python render.py a.bvh -o - > a.rgb                  # raw rgb24 stream을 stdout으로
+    python render.py a.bvh -o "|ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - a.mp4"
+    python render.py a.bvh --egl ...                     # display 없는 CPU-only 환경 (EGL / Mesa)
+    python render.py a.bvh --crowd 100 ...               # crowd로
+'''
+import os
+import sys
+
+# project1/2/3가 같이 쓰는 module들 (repo 최상위의 common/ package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# EGL은 PyOpenGL을 import하기 전에 정해야 한다
+if '--egl' in sys.argv:
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    if 'DISPLAY' not in os.environ and 'WAYLAND_DISPLAY' not in os.environ:
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import argparse
+import time
+import glm
+import numpy as np
+from OpenGL.GL import *
+import main as viewer
+from common import offline, capture
+from crowd import Crowd
+from common.camera_block import CameraBlock
+from common.lights import LightManager
+from common.frustum import FrustumCuller
+import functools
+
+# 카메라 시야각 (main.py와 같음)
+FOV = 45.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='render a bvh animation without a window')
+    parser.add_argument('bvh')
+    parser.add_argument('-o', '--output', default='frames',
+                        help="image directory / pattern with %%d, '-' for raw rgb24 on stdout, '|command' for a raw video pipe")
+    parser.add_argument('--size', default='800x800', help='WIDTHxHEIGHT')
+    parser.add_argument('--fps', type=float, default=None, help='output frame rate (default: the bvh frame rate)')
+    parser.add_argument('--frames', type=int, default=None, help='number of output frames (default: one loop of the clip)')
+    parser.add_argument('--box', action='store_true', help='box mode instead of line mode')
+    parser.add_argument('--crowd', type=int, default=0, help='render this many characters')
+    parser.add_argument('--egl', action='store_true', help='use an EGL context instead of a hidden glfw window')
+    return parser.parse_args()
+
+
+def fit_camera(positions, aspect):
+    '''
+    positions: (..., 3) 보여야 하는 점들 -> 전부 들어오는 P, V와 카메라 위치
+    '''
+    positions = positions.reshape(-1, 3)
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    center = glm.vec3(*((low + high) / 2))
+    radius = max(float(np.linalg.norm(high - low)) / 2, 1e-3)
+
+    distance = radius / np.sin(np.radians(FOV) / 2) * 1.1
+    direction = glm.normalize(glm.vec3(1, 0.6, 1.6))
+    eye = center + direction * distance
+    P = glm.perspective(glm.radians(FOV), aspect, distance * 0.01, distance + radius * 2)
+    V = glm.lookAt(eye, center, glm.vec3(0, 1, 0))
+    return P, V, eye
+
+
+def main():
+    args = parse_args()
+    width, height = (int(value) for value in args.size.lower().split('x'))
+
+    context = offline.create_context(width, height, 'render')
+    if context is None:
+        print('failed to create an OpenGL context', file=sys.stderr)
+        return 1
+
+    loader = viewer.load_bvh(args.bvh, None)
+    loader.prepare_vaos_line()
+    loader.prepare_vaos_box()
+    loader.change_is_fill(args.box)
+
+    clip = loader.clip
+    fps = args.fps if args.fps is not None else 1 / loader.frame_time
+    duration = clip.frame_cnt * loader.frame_time
+    frame_cnt = args.frames if args.frames is not None else max(int(round(duration * fps)), 1)
+
+    shader_program = viewer.load_shaders(viewer.g_vertex_shader_src, viewer.g_fragment_shader_src)
+    M_loc = shader_program.location('M')
+    N_loc = shader_program.location('N')
+
+    crowd = None
+    if args.crowd > 0:
+        crowd = Crowd()
+        crowd.add_characters(loader, args.crowd)
+        skeleton_program = viewer.load_shaders(viewer.g_vertex_shader_crowd_src, viewer.g_fragment_shader_src)
+        bone_cnt_loc = skeleton_program.location('bone_cnt')
+        palette_offset_loc = skeleton_program.location('palette_offset')
+    else:
+        skeleton_program = viewer.load_shaders(viewer.g_vertex_shader_skeleton_src, viewer.g_fragment_shader_src)
+    palette_loc = skeleton_program.location('palette')
+
+    camera_block = CameraBlock()
+    camera_block.attach(shader_program)
+    camera_block.attach(skeleton_program)
+
+    lights = LightManager(viewer.SCENE_LIGHTS)
+    lights.attach(shader_program)
+    lights.attach(skeleton_program)
+    lights.update()
+    bind_lights = functools.partial(lights.bind_object, skeleton_program)
+
+    vao_grid = viewer.prepare_vao_grid()
+    vao_frame = viewer.prepare_vao_frame()
+
+    # clip 전체에서 joint가 지나가는 범위가 다 보이도록 카메라를 고정
+    sample_frames = np.linspace(0, clip.frame_cnt - 1, min(clip.frame_cnt, 64)).astype(np.int64)
+    positions = loader.pose(sample_frames)[..., :3, 3]
+    if crowd is not None:
+        placements = np.concatenate([group.placements[:, :3, 3] for group in crowd.groups])
+        positions = (positions.reshape(1, -1, 3) + placements[:, None]).reshape(-1, 3)
+    P, V, eye = fit_camera(positions, width / height)
+    camera_block.update(P, V, eye)
+
+    culler = FrustumCuller()
+
+    def draw(i):
+        clip_time = i / fps
+        culler.update(P, V)
+
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glEnable(GL_DEPTH_TEST)
+        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL if loader.is_fill else GL_LINE)
+
+        glUseProgram(shader_program.id)
+        M = glm.mat4()
+        N = glm.mat3()
+        glUniformMatrix4fv(M_loc, 1, GL_FALSE, glm.value_ptr(M))
+        glUniformMatrix3fv(N_loc, 1, GL_FALSE, glm.value_ptr(N))
+        viewer.draw_grid(vao_grid)
+        viewer.draw_frame(vao_frame)
+
+        glUseProgram(skeleton_program.id)
+        if crowd is not None:
+            crowd.update(clip_time)
+            crowd.draw(palette_loc, bone_cnt_loc, palette_offset_loc, loader.is_fill, bind_lights, culler)
+        else:
+            loader.draw_pose(loader.pose_at(clip_time / loader.frame_time % clip.frame_cnt), palette_loc, bind_lights, culler)
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            print('rendered %d / %d frames' % (done, total), file=sys.stderr)
+
+    writer = capture.open_writer(args.output, width, height, fps)
+    start = time.perf_counter()
+    frame_capture = offline.render_frames(frame_cnt, draw, writer, width, height, progress)
+    elapsed = time.perf_counter() - start
+    print('%d frames (%dx%d) in %.2f s, %.2f ms/frame' % (frame_cnt, width, height, elapsed, 1000 * elapsed / frame_cnt),
+          file=sys.stderr)
+    print(frame_capture.report(), file=sys.stderr)
+    print(culler.report(), file=sys.stderr)
+
+    if crowd is not None:
+        crowd.delete()
+    camera_block.delete()
+    loader.delete_vaos()
+    offline.destroy_context(context)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
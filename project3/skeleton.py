@@ -0,0 +1,106 @@
+'''
+skeleton index
+
+bvh의 HIERARCHY를 다 읽은 뒤 한 번만 만드는 joint 목록.
+    - joints: DFS 순서 (부모가 항상 자식보다 앞, bvh 파일에 joint가 나온 순서와 같음)
+    - parents: parent의 index (root는 -1), depths: root로부터의 깊이
+    - subtree_ends: joint i 아래의 joint들은 DFS 순서에서 [i, subtree_ends[i]) 구간에 연속으로 있다
+    - channel_offsets / channel_cnts: MOTION 한 줄에서 joint의 channel이 시작하는 column과 개수
+    - joint 이름 -> index
+    - bone마다 bone을 그리는 좌표계(bone_frames: parent, root는 자기 자신)에서의 bounding sphere (frustum culling용)
+visited list로 매번 DFS를 다시 도는 대신 모든 traversal(FK, renderer, blend mask, 출력)이 이 배열들을 쓴다.
+만드는 비용은 joint 수에 선형이다.
+'''
+import numpy as np
+from node import BONE_THICKNESS
+
+# 이름으로 찾을 수 없는 joint (여러 개가 같은 이름을 가짐)
+END_SITE_NAME = 'End Site'
+
+
+class Skeleton:
+    def __init__(self, root):
+        self.root = root
+
+        # 부모는 pop될 때 index가 정해지고 자식은 그 뒤에 push되므로 visited 검사가 필요 없다
+        self.joints = []
+        parents = []
+        depths = []
+        stack = [(root, -1, 0)]
+        while stack:
+            joint, parent_index, depth = stack.pop()
+            index = len(self.joints)
+            # clip 배열의 joint 축도 이 순서
+            joint.index = index
+            self.joints.append(joint)
+            parents.append(parent_index)
+            depths.append(depth)
+            for child in reversed(joint.children):
+                stack.append((child, index, depth + 1))
+
+        self.parents = np.array(parents, dtype=np.int64)
+        self.depths = np.array(depths, dtype=np.int64)
+        # depth별 joint index (level 0은 root)
+        self.levels = [np.flatnonzero(self.depths == depth) for depth in range(self.depths.max() + 1)]
+
+        # 뒤에서부터 자식의 subtree 끝을 부모에게 올린다
+        self.subtree_ends = np.arange(1, len(self.joints) + 1, dtype=np.int64)
+        for index in range(len(self.joints) - 1, 0, -1):
+            parent_index = self.parents[index]
+            self.subtree_ends[parent_index] = max(self.subtree_ends[parent_index], self.subtree_ends[index])
+
+        self.channel_offsets = np.array([joint.channel_offset for joint in self.joints], dtype=np.int64)
+        self.channel_cnts = np.array([len(joint.channels) for joint in self.joints], dtype=np.int64)
+
+        # bone = bone_frames의 joint 원점에서 이 joint의 offset까지 세운 box (node.Node.box_vertices)
+        # 가운데를 중심으로 반 길이와 두께를 덮는 sphere. global transform은 회전 + 이동뿐이라 반지름은 그대로 쓴다
+        self.bone_frames = np.where(self.parents >= 0, self.parents, np.arange(len(self.joints)))
+        offsets = np.array([joint.link_transform_from_parent[3].xyz for joint in self.joints], dtype=np.float64).reshape(-1, 3)
+        self.bone_centers = offsets / 2
+        self.bone_radii = np.sqrt(np.sum(self.bone_centers ** 2, axis=1) + 2 * BONE_THICKNESS ** 2)
+
+        self.__index_of_name = {}
+        for index, joint in enumerate(self.joints):
+            if joint.joint_name != END_SITE_NAME:
+                self.__index_of_name.setdefault(joint.joint_name, index)
+
+    @property
+    def joint_cnt(self):
+        return len(self.joints)
+
+    @property
+    def channel_cnt(self):
+        return int(self.channel_cnts.sum())
+
+    @property
+    def joint_names(self):
+        return [joint.joint_name for joint in self.joints]
+
+    def index(self, joint_name):
+        '''
+        이름의 joint index (없으면 KeyError)
+        '''
+        return self.__index_of_name[joint_name]
+
+    def has_joint(self, joint_name):
+        return joint_name in self.__index_of_name
+
+    def subtree(self, index):
+        '''
+        joint index와 그 아래 모든 joint의 index 구간
+        '''
+        return slice(index, int(self.subtree_ends[index]))
+
+    def bone_spheres(self, poses):
+        '''
+        poses: (..., joints, 4, 4) global transform -> world 좌표계의 bone bounding sphere: centers (..., joints, 3), radii (joints,)
+        '''
+        frames = poses[..., self.bone_frames, :, :]
+        centers = np.einsum('...ij,...j->...i', frames[..., :3, :3], self.bone_centers) + frames[..., :3, 3]
+        return centers, self.bone_radii
+
+    def is_same_structure(self, other):
+        '''
+        joint 이름과 parent 관계가 같은지 (같은 skeleton의 다른 clip인지)
+        '''
+        return self.joint_names == other.joint_names and np.array_equal(self.parents, other.parents)
@@ -0,0 +1,182 @@
+'''
+skeleton batch renderer
+
+joint마다 VAO를 만들고 joint마다 glBindVertexArray + uniform upload + glDrawArrays를 하는 대신
+    1. 모든 bone의 vertex를 하나의 VBO에 넣고, vertex마다 어떤 global transform을 쓸지 bone index를 붙인다.
+    2. frame의 global transform들(pose palette)은 texture buffer 하나에 통째로 upload한다.
+    3. vertex shader가 texelFetch로 palette에서 자기 bone의 행렬을 꺼내 쓰므로 skeleton 전체가 draw call 한 번이다.
+line mode와 box mode는 VBO만 다르고 palette는 같이 쓴다.
+'''
+from OpenGL.GL import *
+import glm
+import ctypes
+import numpy as np
+
+# position(3), color(3), normal(3), bone index(1)
+VERTEX_STRIDE = 10
+# palette texture가 bind될 texture unit
+PALETTE_TEXTURE_UNIT = 0
+
+
+def pack_bones(skeleton, bone_vertices):
+    '''
+    skeleton: skeleton.Skeleton (DFS 순서의 joint와 parent index)
+    bone_vertices: joint -> (k, 9) vertex 배열 (parent 좌표계 기준)
+    return: (vertices, VERTEX_STRIDE) float32
+
+    bone 모양은 parent의 global transform으로 그려진다. (root는 자기 자신)
+    '''
+    blocks = []
+    for index, joint in enumerate(skeleton.joints):
+        vertices = bone_vertices(joint)
+        parent_index = skeleton.parents[index]
+        block = np.empty((len(vertices), VERTEX_STRIDE), dtype=np.float32)
+        block[:, :9] = vertices
+        block[:, 9] = parent_index if parent_index >= 0 else index
+        blocks.append(block)
+    return np.concatenate(blocks) if blocks else np.zeros((0, VERTEX_STRIDE), dtype=np.float32)
+
+
+class PaletteBuffer:
+    '''
+    global transform 행렬들을 담는 texture buffer (GL_RGBA32F, 행렬 하나 = texel 4개)
+    '''
+    def __init__(self):
+        self.__buffer = None
+        self.__texture = None
+        self.__nbytes = 0
+        self.__max_matrix_cnt = 0
+
+    @property
+    def max_matrix_cnt(self):
+        '''
+        texture buffer 하나에 담을 수 있는 행렬 개수
+        GL_MAX_TEXTURE_BUFFER_SIZE(texel 단위, 최소 보장값 65536)를 넘으면 error 없이 잘못 그려지므로 upload 전에 확인한다.
+        '''
+        if self.__buffer is None:
+            self.prepare()
+        return self.__max_matrix_cnt
+
+    def prepare(self):
+        self.__buffer = glGenBuffers(1)
+        self.__texture = glGenTextures(1)
+        self.__max_matrix_cnt = int(glGetIntegerv(GL_MAX_TEXTURE_BUFFER_SIZE)) // 4
+
+        glBindBuffer(GL_TEXTURE_BUFFER, self.__buffer)
+        glBufferData(GL_TEXTURE_BUFFER, 0, None, GL_STREAM_DRAW)
+        glBindTexture(GL_TEXTURE_BUFFER, self.__texture)
+        glTexBuffer(GL_TEXTURE_BUFFER, GL_RGBA32F, self.__buffer)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+        self.__nbytes = 0
+
+    def upload(self, matrices):
+        '''
+        matrices: (..., 4, 4) float32 global transform. 행 단위로 그대로 upload하고 shader에서 transpose한다.
+        '''
+        matrices = np.ascontiguousarray(matrices, dtype=np.float32)
+        if self.__buffer is None:
+            self.prepare()
+
+        glBindBuffer(GL_TEXTURE_BUFFER, self.__buffer)
+        if matrices.nbytes != self.__nbytes:
+            glBufferData(GL_TEXTURE_BUFFER, matrices.nbytes, matrices, GL_STREAM_DRAW)
+            self.__nbytes = matrices.nbytes
+        else:
+            glBufferSubData(GL_TEXTURE_BUFFER, 0, matrices.nbytes, matrices)
+
+    def bind(self, palette_loc):
+        glActiveTexture(GL_TEXTURE0 + PALETTE_TEXTURE_UNIT)
+        glBindTexture(GL_TEXTURE_BUFFER, self.__texture)
+        glUniform1i(palette_loc, PALETTE_TEXTURE_UNIT)
+
+    def delete(self):
+        if self.__buffer is not None:
+            glDeleteBuffers(1, [self.__buffer])
+            glDeleteTextures(1, [self.__texture])
+        self.__buffer = None
+        self.__texture = None
+        self.__nbytes = 0
+
+
+class SkeletonRenderer:
+    def __init__(self):
+        self.__vao_line = None
+        self.__vao_box = None
+        self.__vbos = []
+        self.__line_vertex_cnt = 0
+        self.__box_vertex_cnt = 0
+
+        self.__palette = PaletteBuffer()
+
+    def prepare_vao_line(self, skeleton):
+        vertices = pack_bones(skeleton, lambda joint: joint.line_vertices())
+        self.__vao_line = self.prepare_vao(vertices)
+        self.__line_vertex_cnt = len(vertices)
+
+    def prepare_vao_box(self, skeleton):
+        vertices = pack_bones(skeleton, lambda joint: joint.box_vertices())
+        self.__vao_box = self.prepare_vao(vertices)
+        self.__box_vertex_cnt = len(vertices)
+
+    def prepare_vao(self, vertices):
+        # create and activate VAO (vertex array object)
+        VAO = glGenVertexArrays(1)
+        glBindVertexArray(VAO)
+
+        # create and activate VBO (vertex buffer object)
+        VBO = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, VBO)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        self.__vbos.append(VBO)
+
+        stride = VERTEX_STRIDE * glm.sizeof(glm.float32)
+
+        # configure vertex positions
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, stride, None)
+        glEnableVertexAttribArray(0)
+
+        # configure vertex colors
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(3*glm.sizeof(glm.float32)))
+        glEnableVertexAttribArray(1)
+
+        # configure vertex normals
+        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(6*glm.sizeof(glm.float32)))
+        glEnableVertexAttribArray(2)
+
+        # configure bone index
+        glVertexAttribPointer(3, 1, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(9*glm.sizeof(glm.float32)))
+        glEnableVertexAttribArray(3)
+
+        return VAO
+
+    def draw(self, pose, palette_loc, is_fill):
+        '''
+        skeleton 전체를 draw call 한 번으로 그린다.
+        '''
+        self.__palette.upload(pose)
+        self.__palette.bind(palette_loc)
+        self.draw_instanced(1, is_fill)
+
+    def draw_instanced(self, instance_cnt, is_fill):
+        '''
+        같은 skeleton을 instance_cnt번 그린다. palette는 호출하는 쪽에서 bind 해둔다.
+        instance i의 bone b는 palette의 (palette_offset + i * bone_cnt + b)번째 행렬을 쓴다. (uniform은 호출하는 쪽에서)
+        '''
+        if is_fill:
+            glBindVertexArray(self.__vao_box)
+            glDrawArraysInstanced(GL_TRIANGLES, 0, self.__box_vertex_cnt, instance_cnt)
+        else:
+            glBindVertexArray(self.__vao_line)
+            glDrawArraysInstanced(GL_LINES, 0, self.__line_vertex_cnt, instance_cnt)
+
+    def delete_vaos(self):
+        for vao in (self.__vao_line, self.__vao_box):
+            if vao is not None:
+                glDeleteVertexArrays(1, [vao])
+        if self.__vbos:
+            glDeleteBuffers(len(self.__vbos), self.__vbos)
+        self.__palette.delete()
+
+        self.__vao_line = None
+        self.__vao_box = None
+        self.__vbos = []